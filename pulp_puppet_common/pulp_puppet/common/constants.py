@@ -48,6 +48,14 @@ REPO_METADATA_FILENAME = 'modules.json'
 # app that implements puppet forge's API
 REPO_DEPDATA_FILENAME = '.dependency_db'
 
+# Name of the file that holds the index used by the WSGI app to answer module
+# searches
+REPO_SEARCH_INDEX_FILENAME = '.search_index'
+
+# Name of the file in which the install distributor records the modules it
+# installed, so that a publish only needs to touch modules that changed
+INSTALL_STATE_FILENAME = '.pulp_install_state'
+
 # File name inside of a module where its metadata is found
 MODULE_METADATA_FILENAME = 'metadata.json'
 
@@ -91,6 +99,26 @@ CONFIG_QUERIES = 'queries'
 CONFIG_REMOVE_MISSING = 'remove_missing'
 DEFAULT_REMOVE_MISSING = False
 
+# Number of the newest releases of each module to keep in the repository; older
+# releases are neither synchronized nor kept. Unset keeps every release.
+CONFIG_RETAIN_VERSIONS = 'retain_versions'
+
+# Lists of glob or "regex:" prefixed patterns of "author/name"; a sync only
+# downloads modules that match an include pattern, if there are any, and that
+# match no exclude pattern
+CONFIG_INCLUDE_MODULES = 'include_modules'
+CONFIG_EXCLUDE_MODULES = 'exclude_modules'
+
+# Number of uploaded modules whose metadata is read at the same time when many
+# modules are uploaded in a single call
+CONFIG_UPLOAD_WORKERS = 'upload_workers'
+DEFAULT_UPLOAD_WORKERS = 4
+
+# Whether or not copying modules into a repository also copies the modules they
+# depend on, recursively
+CONFIG_RECURSIVE = 'recursive'
+DEFAULT_RECURSIVE = False
+
 # -- distributor configuration keys -------------------------------------------
 
 # Controls if modules will be served over HTTP
@@ -121,6 +149,26 @@ CONFIG_INSTALL_PATH = 'install_path'
 
 CONFIG_SUBDIR = 'subdir'
 
+# Number of modules the install distributor extracts at the same time
+CONFIG_INSTALL_WORKERS = 'install_workers'
+DEFAULT_INSTALL_WORKERS = 4
+
+# How the install distributor replaces the modules in the install path. "in_place"
+# replaces module directories inside the install path. "symlink" makes the
+# install path a symlink to a fully built, versioned directory and swaps it atomically.
+CONFIG_INSTALL_MODE = 'install_mode'
+INSTALL_MODE_IN_PLACE = 'in_place'
+INSTALL_MODE_SYMLINK = 'symlink'
+INSTALL_MODES = (INSTALL_MODE_IN_PLACE, INSTALL_MODE_SYMLINK)
+DEFAULT_INSTALL_MODE = INSTALL_MODE_IN_PLACE
+
+# Directory of extracted modules shared by install distributors, keyed by module
+# checksum, and the size in bytes it should not exceed. There is no cache unless a
+# directory is configured.
+CONFIG_EXTRACTION_CACHE_DIR = 'extraction_cache_dir'
+CONFIG_EXTRACTION_CACHE_MAX_SIZE = 'extraction_cache_max_size'
+DEFAULT_EXTRACTION_CACHE_MAX_SIZE = 1024 ** 3
+
 # -- forge API ---------------------------------------------------------------
 
 # The puppet forge hostname/IP.
@@ -147,6 +195,11 @@ REPO_ID_OPTION = 'repo_id'
 # as its value that should have its entire contents installed
 WHOLE_REPO_OPTION = 'whole_repo'
 
+# Option key passed to an "install" consumer request with WHOLE_REPO_OPTION and a
+# boolean as its value that, if True, has the request install the newest version
+# of each module in the repository instead of letting the consumer resolve it
+PIN_LATEST_OPTION = 'pin_latest'
+
 # Option key passed to an "install" or "update" consumer request with a boolean
 # as its value that should be used for the request
 SKIP_DEP_OPTION = 'skip_dep'
@@ -155,6 +208,39 @@ SKIP_DEP_OPTION = 'skip_dep'
 # as its value that should be used for the request
 MODULEPATH_OPTION = 'module_path'
 
+# Option key passed to an "install" or "update" consumer request with the number
+# of "puppet module" operations that may run at the same time
+WORKERS_OPTION = 'workers'
+DEFAULT_WORKERS = 4
+
+# Option key passed to an "install" or "update" consumer request with the name of
+# the engine that should install the modules: either the "puppet module" tool, or
+# the handler's own installer, which talks to the Pulp forge directly
+ENGINE_OPTION = 'engine'
+ENGINE_PUPPET = 'puppet'
+ENGINE_NATIVE = 'native'
+DEFAULT_ENGINE = ENGINE_PUPPET
+
+# Option key passed to an "install" or "update" consumer request with the version
+# of puppet on the consumer, such as "3.4.2", if the caller knows it. The handler
+# then does not need to run puppet to detect it. The server does not know the
+# version, so it never sets this option itself.
+PUPPET_VERSION_OPTION = 'puppet_version'
+
+# Option keys passed to an "install" or "update" consumer request with the
+# directory in which the native engine caches downloaded module files, and the
+# size in bytes the cached files should not exceed. An empty directory disables
+# the cache.
+CACHE_DIR_OPTION = 'cache_dir'
+DEFAULT_CACHE_DIR = '/var/cache/pulp/puppet_modules'
+CACHE_MAX_SIZE_OPTION = 'cache_max_size'
+DEFAULT_CACHE_MAX_SIZE = 256 * 1024 ** 2
+
+# Key of the unit metadata of an upload that imports many modules in a single
+# call: a boolean that, if True, means the uploaded file is an archive of module
+# tarballs
+UPLOAD_BATCH_KEY = 'batch'
+
 # -- directory synchronization  ----------------------------------------------
 
 MANIFEST_FILENAME = 'PULP_MANIFEST'
@@ -0,0 +1,102 @@
+"""
+Safe extraction of puppet module tarballs, shared by the install distributor on the server
+and the module installer on consumers.
+"""
+
+from gettext import gettext as _
+import os
+import tarfile
+
+
+class UnsafeMemberError(ValueError):
+    """
+    Raised when a member of an archive would be placed, or would link to a path, outside of
+    the directory the archive is extracted to.
+    """
+    pass
+
+
+class NormalizingTarInfo(tarfile.TarInfo):
+    """
+    Use this class with a call to tarfile.open(). It ensures that the uid and gid of extracted files
+    get set to the values of the current process, and that the permissions on files and dirs get
+    the below minimum values.
+
+    Specifically, it is important to guarantee that puppet can read the extracted files.
+    """
+    min_file_perms = int('0644', base=8)
+    min_dir_perms = int('0755', base=8)
+
+    @classmethod
+    def fromtarfile(cls, *args, **kwargs):
+        """
+        This removes the uid and gid from the returned TarInfo file, causing those values to be set
+        based on the process currently running.
+
+        This also adds a basic level of filesystem permissions to each file and directory extracted,
+        to ensure that they can be accessed and moved around as required.
+
+        :return:    a new TarInfo instance representing a file in an archive
+        :rtype:     tarfile.TarInfo
+        """
+        ret = super(NormalizingTarInfo, cls).fromtarfile(*args, **kwargs)
+        # this causes the uid and gid to be set matching the process doing the extraction
+        ret.uid = 0
+        ret.gid = 0
+        if ret.isfile():
+            ret.mode |= cls.min_file_perms
+        elif ret.isdir():
+            ret.mode |= cls.min_dir_perms
+        return ret
+
+
+def safe_members(archive, destination):
+    """
+    Iterate over the members of an archive in the order they are read, checking each one
+    before it is handed on for extraction. Pass the result to TarFile.extractall(), so that
+    the archive is read only once and extraction stops at the first unsafe member.
+
+    :param archive:     tarball archive whose members should be checked
+    :type  archive:     tarfile.TarFile
+    :param destination: absolute path to the directory the archive is extracted to
+    :type  destination: str
+
+    :return:    generator of members that are safe to extract
+    :rtype:     generator of tarfile.TarInfo
+
+    :raise UnsafeMemberError: if a member has an unsafe path
+    """
+    for member in archive:
+        if not member_is_safe(destination, member):
+            raise UnsafeMemberError(_('archive member %(name)s points outside of the '
+                                      'extraction directory') % {'name': member.name})
+        yield member
+
+
+def member_is_safe(destination, member):
+    """
+    Checks an archive member for a path that includes components such as "../"
+    that would cause it to be placed outside of the destination. Links are also
+    checked for targets outside of the destination, since later members could
+    otherwise be written through them.
+
+    :param destination: absolute path to the destination the member is extracted to
+    :type  destination: str
+    :param member:      member of a tarball archive
+    :type  member:      tarfile.TarInfo
+
+    :return:    True iff the member is safe to extract, else False
+    :rtype:     bool
+    """
+    if not destination.endswith('/'):
+        destination += '/'
+    path = os.path.normpath(os.path.join(destination, member.name))
+    paths = [path]
+    if member.issym():
+        paths.append(os.path.normpath(os.path.join(os.path.dirname(path), member.linkname)))
+    elif member.islnk():
+        paths.append(os.path.normpath(os.path.join(destination, member.linkname)))
+    for path in paths:
+        if not path.startswith(destination):
+            return False
+    return True
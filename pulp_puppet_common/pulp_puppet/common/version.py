@@ -0,0 +1,119 @@
+"""
+Ordering of puppet module versions, and matching of versions against the version
+requirements of module dependencies.
+"""
+
+import re
+
+import semantic_version
+
+
+VERSION_PATTERN = re.compile(r'^v?(\d+)(?:\.(\d+))?(?:\.(\d+))?(?:-([0-9A-Za-z.-]+))?$')
+
+# one comparison of a version requirement, such as ">= 1.2.0" or "1.x"
+REQUIREMENT_TERM_PATTERN = re.compile(
+    r'(>=|<=|~>|>|<|=|~)?\s*v?((?:\d+|[xX*])(?:\.(?:\d+|[xX*])){0,2})(?:-[0-9A-Za-z.-]+)?')
+
+# a version requirement of the form "1.2.0 - 1.4.0"
+REQUIREMENT_RANGE_PATTERN = re.compile(r'^\s*(\S+)\s+-\s+(\S+)\s*$')
+
+
+def version_key(version):
+    """
+    Versions are ordered semantically. Versions that are not valid semantic versions but
+    resemble one, such as "1.2" or "v1.2.0", are ordered as the semantic version they
+    resemble.
+
+    :param version: module version, such as "1.2.0" or "1.2.0-rc1"
+    :type  version: str
+
+    :return:    key that sorts versions in release order. Pre-releases sort before the
+                release, and versions that cannot be parsed sort before all others.
+    :rtype:     tuple
+    """
+    try:
+        return 1, semantic_version.Version(version)
+    except ValueError:
+        pass
+    match = VERSION_PATTERN.match(version.strip())
+    if match:
+        coerced = '.'.join(number or '0' for number in match.group(1, 2, 3))
+        if match.group(4):
+            coerced += '-' + match.group(4)
+        try:
+            return 1, semantic_version.Version(coerced)
+        except ValueError:
+            pass
+    return 0, version
+
+
+def satisfies(version, requirement):
+    """
+    Determine whether a version meets a dependency's version requirement. Requirements are
+    comparisons such as ">= 1.2.0", "1.x", "~> 1.2" or "1.2.0 - 1.4.0", combined with spaces
+    when all of them must be met, and with "||" when any of them must be met. A requirement
+    that cannot be parsed is considered met, so that it is left for puppet to judge.
+
+    :param version:     module version
+    :type  version:     str
+    :param requirement: version requirement, or None if there is none
+    :type  requirement: str
+
+    :return:    True iff the version meets the requirement
+    :rtype:     bool
+    """
+    if not requirement:
+        return True
+    match = VERSION_PATTERN.match((version or '').strip())
+    if not match:
+        return False
+    numbers = tuple(int(number or 0) for number in match.group(1, 2, 3))
+    for alternative in requirement.split('||'):
+        range_match = REQUIREMENT_RANGE_PATTERN.match(alternative)
+        if range_match:
+            terms = [('>=', range_match.group(1)), ('<=', range_match.group(2))]
+        else:
+            terms = REQUIREMENT_TERM_PATTERN.findall(alternative)
+        if not terms or all(_matches(numbers, *term) for term in terms):
+            return True
+    return False
+
+
+def _matches(numbers, operator, spec):
+    """
+    :param numbers:     major, minor and patch number of a version
+    :type  numbers:     tuple
+    :param operator:    comparison operator, or an empty string for equality
+    :type  operator:    str
+    :param spec:        version to compare to, optionally partial such as "1" or "1.x"
+    :type  spec:        str
+
+    :return:    True iff the version meets the comparison
+    :rtype:     bool
+    """
+    parts = []
+    for part in spec.lstrip('v').split('.'):
+        if not part.isdigit():
+            break
+        parts.append(int(part))
+    if not parts:
+        # "x" and "*" match every version
+        return operator not in ('<', '>')
+    padding = [0] * (3 - len(parts))
+    # a partial version covers every version from the lower up to the upper bound
+    lower = tuple(parts + padding)
+    upper = tuple(parts[:-1] + [parts[-1] + 1] + padding)
+    if operator in ('', '='):
+        return lower <= numbers < upper
+    if operator == '>=':
+        return numbers >= lower
+    if operator == '>':
+        return numbers >= upper
+    if operator == '<':
+        return numbers < lower
+    if operator == '<=':
+        return numbers < upper
+    # "~" and "~>" allow changes below the last given number, but no less than the patch
+    if len(parts) > 1:
+        upper = (parts[0], parts[1] + 1, 0)
+    return lower <= numbers < upper
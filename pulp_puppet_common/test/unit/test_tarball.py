@@ -0,0 +1,124 @@
+import tarfile
+import unittest
+
+import mock
+
+from pulp_puppet.common import tarball
+
+
+@mock.patch('tarfile.TarInfo.fromtarfile')
+class TestNormalizingTarInfo(unittest.TestCase):
+    def setUp(self):
+        self.tarfile = mock.MagicMock()
+        self.tarinfo = tarfile.TarInfo(name='foo')
+        self.tarinfo.uid = 1000
+        self.tarinfo.gid = 1000
+        self.tarinfo.type = tarfile.REGTYPE
+
+    def test_resets_uid(self, mock_fromtarfile):
+        mock_fromtarfile.return_value = self.tarinfo
+
+        ret = tarball.NormalizingTarInfo.fromtarfile(self.tarfile)
+
+        self.assertEqual(ret.uid, 0)
+
+    def test_resets_gid(self, mock_fromtarfile):
+        mock_fromtarfile.return_value = self.tarinfo
+
+        ret = tarball.NormalizingTarInfo.fromtarfile(self.tarfile)
+
+        self.assertEqual(ret.gid, 0)
+
+    def test_adds_min_file_perms(self, mock_fromtarfile):
+        self.tarinfo.mode = 0
+        mock_fromtarfile.return_value = self.tarinfo
+
+        ret = tarball.NormalizingTarInfo.fromtarfile(self.tarfile)
+
+        self.assertEqual(ret.mode, int('0644', base=8))
+
+    def test_preserve_extra_file_perms(self, mock_fromtarfile):
+        self.tarinfo.mode = int('0700', base=8)
+        mock_fromtarfile.return_value = self.tarinfo
+
+        ret = tarball.NormalizingTarInfo.fromtarfile(self.tarfile)
+
+        self.assertEqual(ret.mode, int('0744', base=8))
+
+    def test_adds_min_dir_perms(self, mock_fromtarfile):
+        self.tarinfo.mode = 0
+        self.tarinfo.type = tarfile.DIRTYPE
+        mock_fromtarfile.return_value = self.tarinfo
+
+        ret = tarball.NormalizingTarInfo.fromtarfile(self.tarfile)
+
+        self.assertEqual(ret.mode, int('0755', base=8))
+
+    def test_preserve_extra_dir_perms(self, mock_fromtarfile):
+        self.tarinfo.mode = int('0770', base=8)
+        self.tarinfo.type = tarfile.DIRTYPE
+        mock_fromtarfile.return_value = self.tarinfo
+
+        ret = tarball.NormalizingTarInfo.fromtarfile(self.tarfile)
+
+        self.assertEqual(ret.mode, int('0775', base=8))
+
+
+class TestSafeMembers(unittest.TestCase):
+    def test_safe(self):
+        members = [tarfile.TarInfo('a/b/c'), tarfile.TarInfo('d/e/f')]
+
+        ret = list(tarball.safe_members(members, '/foo'))
+
+        self.assertEqual(ret, members)
+
+    def test_stops_at_unsafe_member(self):
+        members = [tarfile.TarInfo('a/b/c'), tarfile.TarInfo('../i'), tarfile.TarInfo('d/e/f')]
+        generator = tarball.safe_members(members, '/foo')
+
+        # members before the unsafe one are handed on as they are read
+        self.assertEqual(generator.next(), members[0])
+        self.assertRaises(tarball.UnsafeMemberError, generator.next)
+
+
+class TestMemberIsSafe(unittest.TestCase):
+    def setUp(self):
+        self.method = tarball.member_is_safe
+
+    def test_safe_names(self):
+        for name in [
+            'a/b/c',
+            'd/e/f',
+            'g/h/../i',
+            '/foo/a/b/',  # this is a terrible thing to have in a tarball, but just in case...
+        ]:
+            self.assertTrue(self.method('/foo', tarfile.TarInfo(name)))
+
+    def test_unsafe_relative_name(self):
+        self.assertFalse(self.method('/foo', tarfile.TarInfo('../i')))
+
+    def test_unsafe_absolute_name(self):
+        """
+        I'm not actually sure if this is possible with a tarball
+        """
+        self.assertFalse(self.method('/foo', tarfile.TarInfo('/i')))
+
+    def test_symlinks(self):
+        member = tarfile.TarInfo('a/b/link')
+        member.type = tarfile.SYMTYPE
+
+        member.linkname = '../c'
+        self.assertTrue(self.method('/foo', member))
+        member.linkname = '../../../etc'
+        self.assertFalse(self.method('/foo', member))
+        member.linkname = '/etc'
+        self.assertFalse(self.method('/foo', member))
+
+    def test_hardlinks(self):
+        member = tarfile.TarInfo('a/b/link')
+        member.type = tarfile.LNKTYPE
+
+        member.linkname = 'a/c'
+        self.assertTrue(self.method('/foo', member))
+        member.linkname = '../etc/passwd'
+        self.assertFalse(self.method('/foo', member))
@@ -0,0 +1,65 @@
+import unittest
+
+from pulp_puppet.common import version
+
+
+class TestSatisfies(unittest.TestCase):
+    def test_no_requirement(self):
+        self.assertTrue(version.satisfies('1.0.0', None))
+        self.assertTrue(version.satisfies('1.0.0', ''))
+
+    def test_comparisons(self):
+        self.assertTrue(version.satisfies('1.2.0', '>= 1.2.0'))
+        self.assertFalse(version.satisfies('1.1.9', '>=1.2.0'))
+        self.assertTrue(version.satisfies('1.2.1', '> 1.2.0'))
+        self.assertFalse(version.satisfies('1.2.0', '> 1.2.0'))
+        self.assertTrue(version.satisfies('1.9.9', '< 2.0.0'))
+        self.assertFalse(version.satisfies('2.0.0', '< 2.0.0'))
+        self.assertTrue(version.satisfies('2.0.0', '<= 2.0.0'))
+        self.assertTrue(version.satisfies('1.2.3', '1.2.3'))
+        self.assertFalse(version.satisfies('1.2.4', '=1.2.3'))
+
+    def test_combined(self):
+        self.assertTrue(version.satisfies('1.5.0', '>= 1.0.0 < 2.0.0'))
+        self.assertFalse(version.satisfies('2.1.0', '>= 1.0.0 < 2.0.0'))
+        self.assertTrue(version.satisfies('3.0.0', '1.x || >= 3.0.0'))
+        self.assertTrue(version.satisfies('1.4.0', '1.2.0 - 1.4.0'))
+        self.assertFalse(version.satisfies('1.4.1', '1.2.0 - 1.4.0'))
+
+    def test_partial(self):
+        self.assertTrue(version.satisfies('1.3.0', '1.x'))
+        self.assertFalse(version.satisfies('2.0.0', '1.x'))
+        self.assertTrue(version.satisfies('1.2.7', '1.2'))
+        self.assertTrue(version.satisfies('1.2.9', '<= 1.2.x'))
+        self.assertFalse(version.satisfies('1.3.0', '<= 1.2.x'))
+        self.assertTrue(version.satisfies('0.1.0', '*'))
+
+    def test_tilde(self):
+        self.assertTrue(version.satisfies('1.2.9', '~> 1.2'))
+        self.assertFalse(version.satisfies('1.3.0', '~> 1.2'))
+        self.assertTrue(version.satisfies('1.9.0', '~1'))
+        self.assertFalse(version.satisfies('1.2.2', '~1.2.3'))
+
+    def test_unparseable(self):
+        self.assertTrue(version.satisfies('1.0.0', 'latest'))
+        self.assertFalse(version.satisfies(None, '>= 1.0.0'))
+
+
+class TestVersionKey(unittest.TestCase):
+    def test_order(self):
+        versions = ['1.10.0', '1.2.0', '1.2.0-rc1', 'bogus', '0.9']
+
+        ordered = sorted(versions, key=version.version_key)
+
+        self.assertEqual(ordered, ['bogus', '0.9', '1.2.0-rc1', '1.2.0', '1.10.0'])
+
+    def test_prerelease_order(self):
+        versions = ['1.0.0', '1.0.0-rc.10', '1.0.0-rc.9', '1.0.0-beta']
+
+        ordered = sorted(versions, key=version.version_key)
+
+        self.assertEqual(ordered, ['1.0.0-beta', '1.0.0-rc.9', '1.0.0-rc.10', '1.0.0'])
+
+    def test_coerced(self):
+        self.assertEqual(version.version_key('v1.2'), version.version_key('1.2.0'))
+        self.assertTrue(version.version_key('1.2') < version.version_key('1.10.0'))
@@ -1,6 +1,7 @@
 from gettext import gettext as _
 
 from pulp.client.commands.unit import UnitCopyCommand
+from pulp.client.extensions.extensions import PulpCliFlag
 
 from pulp_puppet.common import constants
 from pulp_puppet.extensions.admin.repo import units_display
@@ -8,6 +9,10 @@ from pulp_puppet.extensions.admin.repo import units_display
 
 DESC_COPY = _('copies modules from one repository into another')
 
+DESC_RECURSIVE = _('if specified, the modules that the copied modules depend on are also '
+                   'copied, recursively, at the newest version that meets each dependency')
+FLAG_RECURSIVE = PulpCliFlag('--recursive', DESC_RECURSIVE)
+
 
 class PuppetModuleCopyCommand(UnitCopyCommand):
 
@@ -17,6 +22,21 @@ class PuppetModuleCopyCommand(UnitCopyCommand):
                                  method=self.run, type_id=constants.TYPE_PUPPET_MODULE)
 
         self.module_count_threshold = module_count_threshold
+        self.add_flag(FLAG_RECURSIVE)
+
+    def generate_override_config(self, **kwargs):
+        """
+        Pass the recursive flag to the importer.
+
+        :param kwargs: parsed from the user input
+        :type kwargs: dict
+        :return: override config for the copy
+        :rtype: dict
+        """
+        override_config = {}
+        if kwargs.get(FLAG_RECURSIVE.keyword):
+            override_config[constants.CONFIG_RECURSIVE] = True
+        return override_config
 
     @staticmethod
     def get_formatter_for_type(type_id):
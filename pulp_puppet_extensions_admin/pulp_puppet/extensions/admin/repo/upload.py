@@ -1,9 +1,14 @@
+from contextlib import closing
 import copy
 from gettext import gettext as _
 import os
 import re
+import shutil
+import tarfile
+import tempfile
 
 from pulp.client.commands.repo import upload as upload_commands
+from pulp.client.extensions.extensions import PulpCliFlag
 
 from pulp_puppet.common import constants
 
@@ -11,6 +16,13 @@ from pulp_puppet.common import constants
 DESC_FILE = _('path to a file to upload; may be specified multiple times '
               'for multiple files. File name format must be '
               'author-name-version.tar.gz')
+DESC_BATCH = _('upload the files as a single archive and import all of them in one '
+               'operation, with a single report')
+
+FLAG_BATCH = PulpCliFlag('--batch', DESC_BATCH)
+
+# name of the archive of module files uploaded by a batch upload
+BATCH_ARCHIVE_NAME = 'modules.tar'
 
 
 class UploadModuleCommand(upload_commands.UploadCommand):
@@ -24,6 +36,45 @@ class UploadModuleCommand(upload_commands.UploadCommand):
         option_file.description = DESC_FILE
         self.options.remove(upload_commands.OPTION_FILE)
         self.add_option(option_file)
+        self.add_flag(FLAG_BATCH)
+
+        # temporary directory holding the archive of a batch upload
+        self.batch_dir = None
+
+    def run(self, **kwargs):
+        try:
+            super(UploadModuleCommand, self).run(**kwargs)
+        finally:
+            if self.batch_dir is not None:
+                shutil.rmtree(self.batch_dir, ignore_errors=True)
+                self.batch_dir = None
+
+    def create_upload_list(self, file_paths, **kwargs):
+        """
+        With the batch flag, packs all of the files into a single uncompressed archive, which
+        the importer extracts and imports in one operation. The module files are already
+        compressed, so the archive is only written, not compressed again.
+
+        :param file_paths: paths to the module files to upload
+        :type  file_paths: list of str
+
+        :return: a bundle for each file to upload
+        :rtype:  list of pulp.client.commands.repo.upload.FileBundle
+        """
+        if not kwargs.get(FLAG_BATCH.keyword) or len(file_paths) < 2:
+            return super(UploadModuleCommand, self).create_upload_list(file_paths, **kwargs)
+
+        self.batch_dir = tempfile.mkdtemp(prefix='puppet-upload-')
+        archive_path = os.path.join(self.batch_dir, BATCH_ARCHIVE_NAME)
+        with closing(tarfile.open(archive_path, 'w')) as archive:
+            for file_path in file_paths:
+                archive.add(file_path, arcname=os.path.basename(file_path))
+
+        bundle = upload_commands.FileBundle(archive_path,
+                                            type_id=constants.TYPE_PUPPET_MODULE,
+                                            unit_key=self.generate_unit_key(archive_path),
+                                            metadata={constants.UPLOAD_BATCH_KEY: True})
+        return [bundle]
 
     def generate_unit_key(self, filename, **kwargs):
         # Need to return empty string and not None because CLI expects a string
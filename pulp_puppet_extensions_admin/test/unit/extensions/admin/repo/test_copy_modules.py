@@ -20,6 +20,19 @@ class CopyCommandTests(ExtensionTests):
         self.assertEqual(self.command.name, 'copy')
         self.assertEqual(self.command.description, copy_commands.DESC_COPY)
         self.assertEqual(self.command.method, self.command.run)
+        self.assertTrue(copy_commands.FLAG_RECURSIVE in self.command.options)
+
+    def test_generate_override_config(self):
+        override_config = self.command.generate_override_config(
+            **{copy_commands.FLAG_RECURSIVE.keyword: True})
+
+        self.assertEqual(override_config, {constants.CONFIG_RECURSIVE: True})
+
+    def test_generate_override_config_not_recursive(self):
+        override_config = self.command.generate_override_config(
+            **{copy_commands.FLAG_RECURSIVE.keyword: False})
+
+        self.assertEqual(override_config, {})
 
     def test_run(self):
         # Setup
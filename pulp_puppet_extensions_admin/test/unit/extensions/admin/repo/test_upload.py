@@ -0,0 +1,65 @@
+from contextlib import closing
+import os
+import shutil
+import tarfile
+import tempfile
+
+import mock
+
+from pulp.client.commands.repo import upload as upload_commands
+
+from pulp_puppet.common import constants
+from pulp_puppet.devel.base_cli import ExtensionTests
+from pulp_puppet.extensions.admin.repo import upload
+
+
+class UploadModuleCommandTests(ExtensionTests):
+
+    def setUp(self):
+        super(UploadModuleCommandTests, self).setUp()
+        self.command = upload.UploadModuleCommand(self.context, mock.MagicMock())
+        self.source_dir = tempfile.mkdtemp(prefix='puppet-upload-test')
+        self.file_paths = []
+        for filename in ('jdob-valid-1.0.0.tar.gz', 'jdob-valid-1.1.0.tar.gz'):
+            file_path = os.path.join(self.source_dir, filename)
+            with open(file_path, 'w') as module_file:
+                module_file.write(filename)
+            self.file_paths.append(file_path)
+
+    def tearDown(self):
+        super(UploadModuleCommandTests, self).tearDown()
+        shutil.rmtree(self.source_dir)
+        if self.command.batch_dir is not None:
+            shutil.rmtree(self.command.batch_dir)
+
+    def test_structure(self):
+        self.assertTrue(upload.FLAG_BATCH in self.command.options)
+
+    def test_create_upload_list_batch(self):
+        bundles = self.command.create_upload_list(self.file_paths,
+                                                  **{upload.FLAG_BATCH.keyword: True})
+
+        self.assertEqual(len(bundles), 1)
+        self.assertEqual(bundles[0].type_id, constants.TYPE_PUPPET_MODULE)
+        self.assertEqual(bundles[0].metadata, {constants.UPLOAD_BATCH_KEY: True})
+        with closing(tarfile.open(bundles[0].filename)) as archive:
+            self.assertEqual(archive.getnames(),
+                             ['jdob-valid-1.0.0.tar.gz', 'jdob-valid-1.1.0.tar.gz'])
+
+    @mock.patch.object(upload_commands.UploadCommand, 'create_upload_list')
+    def test_create_upload_list_not_batch(self, mock_create):
+        bundles = self.command.create_upload_list(self.file_paths,
+                                                  **{upload.FLAG_BATCH.keyword: False})
+
+        self.assertEqual(bundles, mock_create.return_value)
+        self.assertTrue(self.command.batch_dir is None)
+
+    @mock.patch.object(upload_commands.UploadCommand, 'run')
+    def test_run_removes_archive(self, mock_run):
+        def run(**kwargs):
+            self.command.create_upload_list(self.file_paths, **kwargs)
+        mock_run.side_effect = run
+
+        self.command.run(**{upload.FLAG_BATCH.keyword: True})
+
+        self.assertTrue(self.command.batch_dir is None)
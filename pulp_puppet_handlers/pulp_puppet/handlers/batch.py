@@ -0,0 +1,108 @@
+"""
+Dependency aware, concurrent execution of a batch of module operations.
+
+Every "puppet module" invocation pays for the start of a Ruby interpreter, so running the
+operations for a batch of modules one after another is slow. Operations can run at the same
+time as long as they do not touch the same modules. A task is therefore only started once
+the tasks for its prerequisites are finished, and while no running task holds any of the
+resources it needs. A module's dependencies are its prerequisites, and the modules an
+operation may install or change are the resources it needs.
+"""
+
+import threading
+
+
+class Task(object):
+    """
+    One operation of a batch.
+    """
+
+    __slots__ = ('key', 'item', 'prerequisites', 'resources')
+
+    def __init__(self, key, item, prerequisites=frozenset(), resources=frozenset()):
+        """
+        :param key:             unique identifier of the task in its batch
+        :type  key:             str
+        :param item:            value that is passed to the function that performs the task
+        :type  item:            object
+        :param prerequisites:   keys of tasks that must be finished before this one starts.
+                                Keys that are not in the batch are ignored.
+        :type  prerequisites:   frozenset
+        :param resources:       names of resources that no other task may hold while this
+                                one runs
+        :type  resources:       frozenset
+        """
+        self.key = key
+        self.item = item
+        self.prerequisites = frozenset(prerequisites)
+        self.resources = frozenset(resources)
+
+
+def execute(tasks, function, workers):
+    """
+    Perform every task with at most the given number of them running at the same time.
+
+    Tasks are started in the order they are given as soon as their prerequisites are finished
+    and their resources are free. A prerequisite that failed counts as finished. If no task
+    can start while none is running, which happens when prerequisites form a cycle, the
+    first remaining task is started regardless of its prerequisites.
+
+    If the function raises an exception for a task, the exception is that task's result and
+    no further tasks are started.
+
+    :param tasks:       tasks to perform
+    :type  tasks:       list of Task
+    :param function:    callable that performs a task, given the task's item
+    :type  function:    callable
+    :param workers:     maximum number of tasks to run at the same time
+    :type  workers:     int
+
+    :return:    dictionary where keys are task keys and values are what the function returned
+                for that task, or the exception it raised. Tasks that were not started are
+                missing.
+    :rtype:     dict
+    """
+    keys = set(task.key for task in tasks)
+    pending = list(tasks)
+    results = {}
+    finished = set()
+    held = set()
+    state = {'running': 0, 'aborted': False}
+    condition = threading.Condition()
+
+    def can_start(task):
+        return (task.prerequisites & keys) <= finished and not task.resources & held
+
+    def perform(task):
+        try:
+            result = function(task.item)
+        except Exception, e:
+            result = e
+        with condition:
+            results[task.key] = result
+            finished.add(task.key)
+            held.difference_update(task.resources)
+            state['running'] -= 1
+            if isinstance(result, Exception):
+                state['aborted'] = True
+            condition.notify_all()
+
+    with condition:
+        while pending and not state['aborted']:
+            task = None
+            if state['running'] < workers:
+                task = next((t for t in pending if can_start(t)), None)
+                if task is None and state['running'] == 0:
+                    task = pending[0]
+            if task is None:
+                condition.wait()
+                continue
+            pending.remove(task)
+            held.update(task.resources)
+            state['running'] += 1
+            thread = threading.Thread(target=perform, args=(task,))
+            thread.daemon = True
+            thread.start()
+        while state['running']:
+            condition.wait()
+    return results
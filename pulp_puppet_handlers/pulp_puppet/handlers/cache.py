@@ -0,0 +1,161 @@
+"""
+Cache of downloaded module files on the consumer, keyed by their MD5 checksum.
+
+The forge reports the checksum of every module file, so a file that was downloaded before,
+whether for another module path or before the module was uninstalled, can be used again
+without asking the server for it. Cached files are verified against their checksum every
+time they are used, and are evicted least recently used first once the cache exceeds its
+size limit.
+"""
+
+from gettext import gettext as _
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+
+
+logger = logging.getLogger(__name__)
+
+# size of the blocks in which cached files are read to verify them
+READ_BLOCK_SIZE = 64 * 1024
+
+# extension of cached files
+SUFFIX = '.tar.gz'
+
+
+def file_md5(path):
+    """
+    :param path:    absolute path to a file
+    :type  path:    str
+
+    :return:    hex digest of the file's MD5 checksum
+    :rtype:     str
+
+    :raise IOError: if the file cannot be read
+    """
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(READ_BLOCK_SIZE), ''):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+class TarballCache(object):
+    """
+    A directory of module files named after their checksums.
+    """
+
+    def __init__(self, path, max_size):
+        """
+        :param path:        absolute path to the cache directory
+        :type  path:        str
+        :param max_size:    size in bytes that the cached files should not exceed
+        :type  max_size:    int
+        """
+        self.path = path
+        self.max_size = max_size
+
+    def entry_path(self, checksum):
+        """
+        :param checksum:    MD5 checksum of a module file
+        :type  checksum:    str
+
+        :return:    absolute path at which the file is cached
+        :rtype:     str
+        """
+        return os.path.join(self.path, checksum + SUFFIX)
+
+    def get(self, checksum):
+        """
+        Find a cached module file and verify it. A cached file that does not match its
+        checksum is removed.
+
+        :param checksum:    MD5 checksum of the module file
+        :type  checksum:    str
+
+        :return:    absolute path to the cached file, or None if it is not cached
+        :rtype:     str
+        """
+        path = self.entry_path(checksum)
+        try:
+            actual = file_md5(path)
+        except IOError:
+            return None
+        if actual != checksum:
+            msg = _('removing cached module file %(path)s, which does not match its checksum')
+            logger.warning(msg, {'path': path})
+            self._remove(path)
+            return None
+        try:
+            # the modification time of a file records when it was last used
+            os.utime(path, None)
+        except OSError:
+            pass
+        return path
+
+    def add(self, checksum, source):
+        """
+        Add a verified module file to the cache. Failing to add it is logged, but not
+        raised, since the file can be used regardless.
+
+        :param checksum:    MD5 checksum of the module file
+        :type  checksum:    str
+        :param source:      absolute path to the module file
+        :type  source:      str
+        """
+        temp_path = None
+        try:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path)
+            fd, temp_path = tempfile.mkstemp(prefix='.adding-', dir=self.path)
+            os.close(fd)
+            shutil.copyfile(source, temp_path)
+            os.chmod(temp_path, 0644)
+            os.rename(temp_path, self.entry_path(checksum))
+        except (IOError, OSError), e:
+            msg = _('failed to add %(source)s to module file cache %(path)s: %(exc)s')
+            logger.warning(msg, {'source': source, 'path': self.path, 'exc': e})
+            if temp_path:
+                self._remove(temp_path)
+
+    def evict(self):
+        """
+        Remove least recently used files until the cached files fit the size limit.
+        """
+        try:
+            names = os.listdir(self.path)
+        except OSError:
+            return
+        entries = []
+        total = 0
+        for name in names:
+            if name.startswith('.') or not name.endswith(SUFFIX):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.path, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, name, stat.st_size))
+            total += stat.st_size
+
+        for mtime, name, size in sorted(entries):
+            if total <= self.max_size:
+                break
+            path = os.path.join(self.path, name)
+            msg = _('evicting %(path)s from module file cache')
+            logger.debug(msg, {'path': path})
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path):
+        """
+        :param path:    absolute path to a file to remove, if it exists
+        :type  path:    str
+        """
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,115 @@
+"""
+Client for the forge API that the Pulp server offers to consumers.
+"""
+
+import base64
+import httplib
+import socket
+import urllib
+import urllib2
+import urlparse
+
+from pulp.common.compat import json
+
+
+# path of the API, relative to a forge URL, that reports module releases and their dependencies
+RELEASES_PATH = 'api/v1/releases.json'
+
+# seconds to wait for the server to respond
+TIMEOUT = 30
+
+# errors that mean the forge could not be queried
+ERRORS = (urllib2.URLError, httplib.HTTPException, socket.error, ValueError)
+
+
+def normalize_name(name):
+    """
+    :param name:    module name in form "author/title" or "author-title"
+    :type  name:    str
+
+    :return:    module name in form "author/title"
+    :rtype:     str
+    """
+    return name.replace('-', '/', 1) if '/' not in name else name
+
+
+class Forge(object):
+    """
+    A forge, identified the way the "puppet module" tool is given it.
+    """
+
+    def __init__(self, url, timeout=TIMEOUT):
+        """
+        :param url:     forge URL, as generated by ModuleHandler._generate_forge_url. Before
+                        puppet 3.3 it identifies the consumer or repository with basic auth
+                        credentials, which are sent in a header instead.
+        :type  url:     str
+        :param timeout: seconds to wait for the server to respond
+        :type  timeout: int
+        """
+        parsed = urlparse.urlsplit(url)
+        self.headers = {}
+        if parsed.username is not None:
+            credentials = '%s:%s' % (urllib.unquote(parsed.username),
+                                     urllib.unquote(parsed.password or ''))
+            self.headers['Authorization'] = 'Basic %s' % base64.b64encode(credentials)
+        netloc = parsed.netloc.rpartition('@')[2]
+        self.url = urlparse.urlunsplit((parsed.scheme, netloc, parsed.path.rstrip('/'), '', ''))
+        self.timeout = timeout
+
+    @property
+    def releases_url(self):
+        """
+        :return:    URL of the releases API
+        :rtype:     str
+        """
+        return '%s/%s' % (self.url, RELEASES_PATH)
+
+    def releases(self, full_name, version=None):
+        """
+        Query the releases of a module and of every module in its dependency tree.
+
+        :param full_name:   module name in form "author/title"
+        :type  full_name:   str
+        :param version:     version of the module, or None for its newest release
+        :type  version:     str
+
+        :return:    dictionary where keys are module names in form "author/title", and values
+                    are lists of release dicts with keys "version", "file", "file_md5" and
+                    "dependencies". The dictionary is empty if the forge does not know the
+                    module.
+        :rtype:     dict
+
+        :raise ERRORS: if the forge could not be queried
+        """
+        query = {'module': full_name}
+        if version:
+            query['version'] = version
+        request = urllib2.Request('%s?%s' % (self.releases_url, urllib.urlencode(query)),
+                                  headers=self.headers)
+        try:
+            response = urllib2.urlopen(request, timeout=self.timeout)
+        except urllib2.HTTPError, e:
+            if e.code == httplib.NOT_FOUND:
+                return {}
+            raise
+        try:
+            releases = json.load(response)
+        finally:
+            response.close()
+        return dict((normalize_name(name), value) for name, value in releases.iteritems())
+
+    def open_file(self, path):
+        """
+        Start downloading a module file that the releases API referred to.
+
+        :param path:    "file" value of a release, which is the absolute path of the file's
+                        URL on the server
+        :type  path:    str
+
+        :return:    open response, which the caller must close
+        :rtype:     file-like object
+
+        :raise ERRORS: if the download could not be started
+        """
+        return urllib2.urlopen(urlparse.urljoin(self.url, path), timeout=self.timeout)
@@ -0,0 +1,532 @@
+"""
+Installs and upgrades modules without the "puppet module" tool.
+
+The "puppet module" tool starts a Ruby interpreter and resolves dependencies itself, with
+several requests to the forge for every module. This installer asks the Pulp forge once per
+requested module for its release and dependency tree, resolves the releases to install
+from that, downloads them in parallel, verifies their checksums and extracts them directly
+into the module path.
+
+Its reports have the same shape as the JSON the "puppet module" tool renders.
+"""
+
+from gettext import gettext as _
+from multiprocessing.pool import ThreadPool
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tarfile
+import tempfile
+
+from pulp.common.compat import json
+
+from pulp_puppet.common import constants
+from pulp_puppet.common.tarball import NormalizingTarInfo, UnsafeMemberError, safe_members
+from pulp_puppet.common.version import satisfies, version_key
+from pulp_puppet.handlers import forge
+
+
+logger = logging.getLogger(__name__)
+
+# size of the blocks in which module files are downloaded
+DOWNLOAD_BLOCK_SIZE = 64 * 1024
+
+MODULEFILE_PATTERN = re.compile(r'''^\s*(name|version)\s+['"]([^'"]+)['"]''', re.MULTILINE)
+
+MODULEFILE_DEPENDENCY_PATTERN = re.compile(r'''^\s*dependency\s+['"]([^'"]+)['"]''', re.MULTILINE)
+
+
+class InstallError(Exception):
+    """
+    Raised when a module cannot be installed or upgraded.
+    """
+    pass
+
+
+def installed_modules(module_path):
+    """
+    Find the modules installed in a directory.
+
+    :param module_path: absolute path to a directory of modules
+    :type  module_path: str
+
+    :return:    dictionary where keys are directory names, and values are dicts as returned
+                by read_module_metadata
+    :rtype:     dict
+    """
+    modules = {}
+    try:
+        names = os.listdir(module_path)
+    except OSError:
+        return modules
+    for name in names:
+        directory = os.path.join(module_path, name)
+        if not name.startswith('.') and os.path.isdir(directory):
+            modules[name] = read_module_metadata(directory)
+    return modules
+
+
+def read_module_metadata(directory):
+    """
+    Read a module's name, version and dependencies from its metadata.json file, or from
+    the Modulefile that older modules have instead.
+
+    :param directory:   absolute path to the module's directory
+    :type  directory:   str
+
+    :return:    dict with the keys "name", in form "author/title", and "version", which are
+                None if they could not be read, and "dependencies", a list of the names of
+                the modules it depends on in form "author/title"
+    :rtype:     dict
+    """
+    metadata = {}
+    dependency_names = []
+    try:
+        with open(os.path.join(directory, constants.MODULE_METADATA_FILENAME)) as metadata_file:
+            metadata = json.load(metadata_file)
+    except (IOError, ValueError):
+        try:
+            with open(os.path.join(directory, 'Modulefile')) as modulefile:
+                content = modulefile.read()
+        except IOError:
+            pass
+        else:
+            metadata = dict(MODULEFILE_PATTERN.findall(content))
+            dependency_names = MODULEFILE_DEPENDENCY_PATTERN.findall(content)
+    if not isinstance(metadata, dict):
+        metadata = {}
+    dependencies = metadata.get('dependencies')
+    if isinstance(dependencies, list):
+        dependency_names = [d.get('name') for d in dependencies if isinstance(d, dict)]
+    name = metadata.get('name')
+    return {'name': forge.normalize_name(name) if name else None,
+            'version': metadata.get('version'),
+            'dependencies': [forge.normalize_name(d) for d in dependency_names if d]}
+
+
+class ModuleInstaller(object):
+    """
+    Installs or upgrades a batch of modules into one module path.
+    """
+
+    def __init__(self, forge_url, module_path, workers=constants.DEFAULT_WORKERS, cache=None):
+        """
+        :param forge_url:   URL of the Pulp forge to install from
+        :type  forge_url:   str
+        :param module_path: absolute path to the directory to install modules into
+        :type  module_path: str
+        :param workers:     maximum number of forge requests and downloads to run at once
+        :type  workers:     int
+        :param cache:       cache of module files to use instead of downloading them again,
+                            or None to always download them
+        :type  cache:       pulp_puppet.handlers.cache.TarballCache
+        """
+        self.forge = forge.Forge(forge_url)
+        self.module_path = module_path
+        self.workers = workers
+        self.cache = cache
+        # modules that were installed before, keyed by directory name
+        self._installed = {}
+        # releases to install in this batch, keyed by directory name
+        self._plan = {}
+
+    def perform(self, operation, units, skip_dep=False):
+        """
+        Install or upgrade each unit, along with the dependencies it needs unless they are
+        skipped.
+
+        :param operation:   one of "install" or "upgrade"
+        :type  operation:   str
+        :param units:       list of puppet module keys
+        :type  units:       list of dicts
+        :param skip_dep:    If True, skip installation of module dependencies
+        :type  skip_dep:    boolean
+
+        :return:    dictionary where keys are full module names and values are reports in
+                    the form the "puppet module" tool renders as JSON. The report has an
+                    "error" key if the operation failed.
+        :rtype:     dict
+        """
+        reports = {}
+        try:
+            if not os.path.isdir(self.module_path):
+                os.makedirs(self.module_path)
+        except OSError, e:
+            message = _('failed to create module path %(path)s: %(exc)s') % {
+                'path': self.module_path, 'exc': e}
+            for unit in units:
+                reports[self._full_name(unit)] = self._error_report(unit, message)
+            return reports
+
+        self._installed = installed_modules(self.module_path)
+        self._plan = {}
+
+        resolved = []
+        for unit, releases in zip(units, self._map(self._query, units)):
+            try:
+                resolved.append((unit, self._resolve(operation, unit, releases, skip_dep)))
+            except InstallError, e:
+                reports[self._full_name(unit)] = self._error_report(unit, str(e))
+
+        download_dir = tempfile.mkdtemp(prefix='pulp-puppet-')
+        try:
+            steps = self._plan.values()
+            downloads = self._map(lambda step: self._download(step, download_dir), steps)
+            tarballs = dict((id(step), tarball) for step, tarball in zip(steps, downloads))
+            results = {}
+            for unit, root in resolved:
+                error = None
+                if root is not None:
+                    for step in self._in_install_order(root):
+                        if id(step) not in results:
+                            results[id(step)] = self._apply(step, tarballs[id(step)])
+                        error = results[id(step)]
+                        if error:
+                            break
+                if error:
+                    reports[self._full_name(unit)] = self._error_report(unit, error)
+                else:
+                    reports[self._full_name(unit)] = self._success_report(operation, unit, root)
+        finally:
+            shutil.rmtree(download_dir, ignore_errors=True)
+        if self.cache is not None:
+            self.cache.evict()
+        return reports
+
+    def _map(self, function, items):
+        """
+        Call a function for each item, on up to the configured number of threads. The
+        function must not raise exceptions.
+
+        :param function:    function to call
+        :type  function:    callable
+        :param items:       items to call it for
+        :type  items:       list
+
+        :return:    what the function returned for each item, in the order of the items
+        :rtype:     list
+        """
+        if self.workers < 2 or len(items) < 2:
+            return [function(item) for item in items]
+        pool = ThreadPool(min(self.workers, len(items)))
+        try:
+            return pool.map(function, items)
+        finally:
+            pool.close()
+            pool.join()
+
+    def _query(self, unit):
+        """
+        :param unit:    puppet module key
+        :type  unit:    dict
+
+        :return:    releases of the unit and of the modules in its dependency tree, as
+                    returned by Forge.releases, or the error that prevented the query
+        :rtype:     dict or Exception
+        """
+        try:
+            return self.forge.releases(self._full_name(unit), unit.get('version'))
+        except forge.ERRORS, e:
+            return e
+
+    def _resolve(self, operation, unit, releases, skip_dep):
+        """
+        Decide which release of a unit to install, and which releases of its dependencies,
+        and add them to the plan.
+
+        :param operation:   one of "install" or "upgrade"
+        :type  operation:   str
+        :param unit:        puppet module key
+        :type  unit:        dict
+        :param releases:    releases of the unit and its dependencies, as returned by _query
+        :type  releases:    dict or Exception
+        :param skip_dep:    If True, skip installation of module dependencies
+        :type  skip_dep:    boolean
+
+        :return:    plan step for the unit, or None if it is already at the requested version
+        :rtype:     dict
+
+        :raise InstallError: if the unit cannot be installed or upgraded
+        """
+        full_name = self._full_name(unit)
+        version = unit.get('version')
+        if isinstance(releases, Exception):
+            raise InstallError(_('failed to query %(url)s: %(exc)s') % {
+                'url': self.forge.releases_url, 'exc': releases})
+        candidates = [release for release in releases.get(full_name, [])
+                      if not version or release['version'] == version]
+        if not candidates:
+            raise InstallError(_('no release of %(name)s %(version)s is available') % {
+                'name': full_name, 'version': version or ''})
+        release = max(candidates, key=lambda r: version_key(r['version']))
+
+        steps = {}
+        current = self._current(unit['name'], steps)
+        if unit['name'] in self._plan and current['name'] == full_name and \
+                (not version or current['version'] == version):
+            # already being installed for another unit of this batch
+            return current
+        if operation == 'install':
+            if current is not None:
+                raise InstallError(_('%(module)s %(version)s is already installed in '
+                                     '%(path)s') % {'module': current['name'] or unit['name'],
+                                                    'version': current['version'] or '',
+                                                    'path': self.module_path})
+            root = self._step(full_name, release, 'install', None)
+        else:
+            if current is None or current['name'] != full_name:
+                raise InstallError(_('%(name)s is not installed in %(path)s') % {
+                    'name': full_name, 'path': self.module_path})
+            if current['version'] == release['version']:
+                return None
+            root = self._step(full_name, release, 'upgrade', current['version'])
+        steps[unit['name']] = root
+        if not skip_dep:
+            self._resolve_dependencies(root, releases, steps)
+        self._plan.update(steps)
+        return root
+
+    def _resolve_dependencies(self, step, releases, steps):
+        """
+        Add the releases needed to meet a step's dependencies to the unit's steps,
+        recursively. Dependencies that are met by installed modules, or by modules already
+        planned, are left alone.
+
+        :param step:        plan step whose dependencies should be resolved
+        :type  step:        dict
+        :param releases:    releases of the unit and its dependencies, as returned by _query
+        :type  releases:    dict
+        :param steps:       steps planned for the unit so far, keyed by directory name.
+                            New steps are added to it.
+        :type  steps:       dict
+
+        :raise InstallError: if a dependency cannot be met
+        """
+        for dependency in step['release'].get('dependencies', []):
+            name = forge.normalize_name(dependency[0])
+            requirement = dependency[1] if len(dependency) > 1 else None
+            directory = name.split('/', 1)[-1]
+            current = self._current(directory, steps)
+            if current is not None and current['name'] == name and \
+                    satisfies(current['version'], requirement):
+                continue
+            planned = directory in steps or directory in self._plan
+            if current is not None and (current['name'] != name or planned):
+                raise InstallError(_('%(module)s requires %(name)s %(requirement)s, which '
+                                     'conflicts with %(other)s %(version)s') % {
+                    'module': step['name'], 'name': name, 'requirement': requirement or '',
+                    'other': current['name'] or directory, 'version': current['version'] or ''})
+            candidates = [release for release in releases.get(name, [])
+                          if satisfies(release['version'], requirement)]
+            if not candidates:
+                raise InstallError(_('%(module)s requires %(name)s %(requirement)s, but no '
+                                     'matching release is available') % {
+                    'module': step['name'], 'name': name, 'requirement': requirement or ''})
+            release = max(candidates, key=lambda r: version_key(r['version']))
+            if current is None:
+                child = self._step(name, release, 'install', None)
+            else:
+                child = self._step(name, release, 'upgrade', current['version'])
+            steps[directory] = child
+            step['dependencies'].append(child)
+            self._resolve_dependencies(child, releases, steps)
+
+    def _current(self, directory, steps):
+        """
+        :param directory:   name of a module's directory in the module path
+        :type  directory:   str
+        :param steps:       steps planned for the current unit, keyed by directory name
+        :type  steps:       dict
+
+        :return:    the step or installed module that will occupy the directory once the
+                    steps planned so far are done, or None if it will be free
+        :rtype:     dict
+        """
+        return steps.get(directory) or self._plan.get(directory) or \
+            self._installed.get(directory)
+
+    @staticmethod
+    def _step(name, release, action, previous_version):
+        """
+        :return:    a plan step that installs or upgrades to a release
+        :rtype:     dict
+        """
+        return {'name': name, 'version': release['version'], 'release': release,
+                'action': action, 'previous_version': previous_version, 'dependencies': []}
+
+    def _in_install_order(self, step):
+        """
+        :param step:    plan step
+        :type  step:    dict
+
+        :return:    the step and the steps for its dependencies, dependencies first
+        :rtype:     generator of dict
+        """
+        for dependency in step['dependencies']:
+            for dependency_step in self._in_install_order(dependency):
+                yield dependency_step
+        yield step
+
+    def _download(self, step, directory):
+        """
+        Download the file of a step's release and verify its checksum, unless a verified
+        copy of it is cached.
+
+        :param step:        plan step
+        :type  step:        dict
+        :param directory:   absolute path to the directory to download into
+        :type  directory:   str
+
+        :return:    absolute path to the downloaded file, or the error that prevented it
+        :rtype:     str or Exception
+        """
+        release = step['release']
+        expected = release.get('file_md5')
+        if self.cache is not None and expected:
+            cached = self.cache.get(expected)
+            if cached:
+                return cached
+        path = os.path.join(directory, '%s-%s.tar.gz' % (step['name'].replace('/', '-'),
+                                                         step['version']))
+        md5 = hashlib.md5()
+        try:
+            response = self.forge.open_file(release['file'])
+            try:
+                with open(path, 'wb') as tarball:
+                    for block in iter(lambda: response.read(DOWNLOAD_BLOCK_SIZE), ''):
+                        md5.update(block)
+                        tarball.write(block)
+            finally:
+                response.close()
+        except forge.ERRORS + (IOError, OSError), e:
+            return e
+        if expected and md5.hexdigest() != expected:
+            return InstallError(_('checksum of %(file)s is %(actual)s instead of %(expected)s')
+                                % {'file': release['file'], 'actual': md5.hexdigest(),
+                                   'expected': expected})
+        if self.cache is not None and expected:
+            self.cache.add(expected, path)
+        return path
+
+    def _apply(self, step, tarball):
+        """
+        Extract a step's release into the module path, replacing the module's directory.
+
+        :param step:    plan step
+        :type  step:    dict
+        :param tarball: absolute path to the release's file, or the error that prevented
+                        downloading it
+        :type  tarball: str or Exception
+
+        :return:    an error message if the release could not be extracted, else None
+        :rtype:     str
+        """
+        if isinstance(tarball, Exception):
+            return _('failed to download %(file)s: %(exc)s') % {
+                'file': step['release']['file'], 'exc': tarball}
+        target = os.path.join(self.module_path, step['name'].split('/', 1)[-1])
+        try:
+            staging = tempfile.mkdtemp(prefix='.pulp-install-', dir=self.module_path)
+        except OSError, e:
+            return _('failed to extract %(name)s: %(exc)s') % {'name': step['name'], 'exc': e}
+        try:
+            archive = tarfile.open(tarball, tarinfo=NormalizingTarInfo)
+            try:
+                archive.extractall(staging, members=safe_members(archive, staging))
+            finally:
+                archive.close()
+            extracted = os.listdir(staging)
+            if len(extracted) != 1 or not os.path.isdir(os.path.join(staging, extracted[0])):
+                raise InstallError(_('%(file)s does not contain exactly one module directory')
+                                   % {'file': step['release']['file']})
+            previous = os.path.join(staging, '.previous')
+            if os.path.lexists(target):
+                os.rename(target, previous)
+            try:
+                os.rename(os.path.join(staging, extracted[0]), target)
+            except OSError:
+                # put the installed module back before the staging directory is removed
+                if os.path.lexists(previous):
+                    os.rename(previous, target)
+                raise
+        except (InstallError, UnsafeMemberError, tarfile.TarError, IOError, OSError), e:
+            return _('failed to extract %(name)s: %(exc)s') % {'name': step['name'], 'exc': e}
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        msg = _('%(action)s of module %(module)s %(version)s')
+        logger.debug(msg, {'action': step['action'], 'module': step['name'],
+                           'version': step['version']})
+        return None
+
+    @staticmethod
+    def _full_name(unit):
+        """
+        :param unit:    puppet module key
+        :type  unit:    dict
+
+        :return:    full name of the unit in form "author/title"
+        :rtype:     str
+        """
+        return '%s/%s' % (unit['author'], unit['name'])
+
+    def _success_report(self, operation, unit, root):
+        """
+        :param operation:   one of "install" or "upgrade"
+        :type  operation:   str
+        :param unit:        puppet module key
+        :type  unit:        dict
+        :param root:        plan step for the unit, or None if nothing was changed
+        :type  root:        dict
+
+        :return:    report in the form the "puppet module" tool renders
+        :rtype:     dict
+        """
+        key = 'installed_modules' if operation == 'install' else 'affected_modules'
+        return {
+            'module_name': self._full_name(unit).replace('/', '-'),
+            'module_version': unit.get('version'),
+            'install_dir': self.module_path,
+            'result': 'success' if root else 'noop',
+            key: [self._module_report(root)] if root else [],
+        }
+
+    def _module_report(self, step):
+        """
+        :param step:    plan step
+        :type  step:    dict
+
+        :return:    inner report about one module, in the form the "puppet module" tool
+                    renders
+        :rtype:     dict
+        """
+        return {
+            'module': step['name'].replace('/', '-'),
+            'version': {'vstring': step['version'], 'semver': 'v%s' % step['version']},
+            'action': step['action'],
+            'previous_version': step['previous_version'],
+            'file': step['release'].get('file'),
+            'path': self.module_path,
+            'dependencies': [self._module_report(child) for child in step['dependencies']],
+        }
+
+    def _error_report(self, unit, message):
+        """
+        :param unit:    puppet module key
+        :type  unit:    dict
+        :param message: description of the error
+        :type  message: str
+
+        :return:    report in the form the "puppet module" tool renders
+        :rtype:     dict
+        """
+        logger.error(_('failed to install %(module)s: %(msg)s') % {
+            'module': self._full_name(unit), 'msg': message})
+        return {
+            'module_name': self._full_name(unit).replace('/', '-'),
+            'module_version': unit.get('version'),
+            'install_dir': self.module_path,
+            'result': 'failure',
+            'error': {'oneline': message, 'multiline': message},
+        }
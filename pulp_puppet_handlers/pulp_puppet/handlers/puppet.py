@@ -1,3 +1,4 @@
+from distutils.spawn import find_executable
 from gettext import gettext as _
 import logging
 import urlparse
@@ -5,10 +6,11 @@ import os
 import subprocess
 
 from pulp.agent.lib import handler
-from pulp.agent.lib.report import BindReport, CleanReport, ContentReport
+from pulp.agent.lib.report import BindReport, CleanReport, ContentReport, ProfileReport
 from pulp.common.compat import json
 
 from pulp_puppet.common import constants
+from pulp_puppet.handlers import batch, cache, forge, installer, scanner
 
 
 logger = logging.getLogger(__name__)
@@ -16,16 +18,57 @@ logger = logging.getLogger(__name__)
 
 class ModuleHandler(handler.ContentHandler):
     VERSION_ARGS = ('puppet', '--version')
+    MODULEPATH_ARGS = ('puppet', 'config', 'print', 'modulepath')
+    # configuration files that may set puppet's modulepath
+    PUPPET_CONF_PATHS = ('/etc/puppet/puppet.conf', '/etc/puppetlabs/puppet/puppet.conf')
+
+    # detected puppet versions, keyed by the path and modification time of the
+    # puppet executable, so that an upgrade of puppet is noticed
+    _puppet_versions = {}
+    # detected module paths, keyed like the versions and by the modification
+    # times of puppet's configuration files
+    _module_paths = {}
+
+    def __init__(self, cfg):
+        handler.ContentHandler.__init__(self, cfg)
+        self.scanner = scanner.ModulePathScanner()
+
+    @classmethod
+    def _puppet_key(cls, *paths):
+        """
+        :param paths:   absolute paths to files that affect the value to be cached
+        :type  paths:   list of str
+
+        :return:    key under which a value detected by running puppet can be cached,
+                    which changes when the puppet executable or one of the files changes,
+                    or None if the puppet executable cannot be found
+        :rtype:     tuple
+        """
+        executable = find_executable(cls.VERSION_ARGS[0])
+        if not executable:
+            return None
+        key = []
+        for path in (executable,) + paths:
+            try:
+                key.append((path, os.stat(path).st_mtime))
+            except OSError:
+                key.append((path, None))
+        return tuple(key)
 
     @classmethod
     def _detect_puppet_version(cls):
         """
         Detects and returns the version of puppet current available by running
-        "puppet --version".
+        "puppet --version". The result is remembered until the puppet executable
+        changes.
 
         :return:    version of puppet currently available, as a tuple of int
         :rtype:     tuple
         """
+        key = cls._puppet_key()
+        if key is not None and key in cls._puppet_versions:
+            return cls._puppet_versions[key]
+
         try:
             popen = subprocess.Popen(cls.VERSION_ARGS, stdout=subprocess.PIPE)
         except OSError:
@@ -34,11 +77,63 @@ class ModuleHandler(handler.ContentHandler):
 
         stdout, stderr = popen.communicate()
 
+        version = cls._parse_puppet_version(stdout)
+        if key is not None:
+            cls._puppet_versions[key] = version
+        return version
+
+    @staticmethod
+    def _parse_puppet_version(version):
+        """
+        :param version: puppet version, such as "3.4.2"
+        :type  version: str
+
+        :return:    version as a tuple of int
+        :rtype:     tuple
+        """
         # turns "3.4.2\n" into (3, 4, 2)
-        return tuple(map(int, stdout.strip().split('.')))
+        return tuple(map(int, version.strip().split('.')))
+
+    @classmethod
+    def _detect_module_path(cls):
+        """
+        Detects and returns the directory that the "puppet module" tool installs into by
+        default, which is the first directory of puppet's modulepath setting.
+
+        :return:    absolute path to a directory of modules
+        :rtype:     str
+        """
+        return cls._detect_module_paths()[0]
+
+    @classmethod
+    def _detect_module_paths(cls):
+        """
+        Detects and returns the directories of puppet's modulepath setting by running
+        "puppet config print modulepath". The result is remembered until the puppet
+        executable or its configuration changes.
+
+        :return:    absolute paths to directories of modules
+        :rtype:     list of str
+        """
+        key = cls._puppet_key(*cls.PUPPET_CONF_PATHS)
+        if key is not None and key in cls._module_paths:
+            return cls._module_paths[key]
+
+        try:
+            popen = subprocess.Popen(cls.MODULEPATH_ARGS, stdout=subprocess.PIPE)
+        except OSError:
+            logger.error(_('"puppet" tool not found'))
+            raise
+
+        stdout, stderr = popen.communicate()
+
+        module_paths = stdout.strip().split(':')
+        if key is not None:
+            cls._module_paths[key] = module_paths
+        return module_paths
 
     @classmethod
-    def _generate_forge_url(cls, conduit, host, repo_id=None):
+    def _generate_forge_url(cls, conduit, host, repo_id=None, puppet_version=None):
         """
         Generate a URL for the forge to use, and encode consumer ID or repo ID
         as appropriate with basic auth credentials.
@@ -47,12 +142,24 @@ class ModuleHandler(handler.ContentHandler):
         :type  conduit: pulp.agent.gofer.pulp.Conduit
         :param repo_id: unique ID of a repo to which this operation should
                         be scoped
+        :param puppet_version: version of puppet on the consumer, such as "3.4.2",
+                               if it is known. Otherwise it is detected.
+        :type  puppet_version: str
         :return: URL
         :rtype:  str
         """
+        if puppet_version:
+            try:
+                version = cls._parse_puppet_version(puppet_version)
+            except ValueError:
+                msg = _('ignoring invalid puppet version %(version)s')
+                logger.warning(msg, {'version': puppet_version})
+                version = cls._detect_puppet_version()
+        else:
+            version = cls._detect_puppet_version()
         # the "puppet module" tool does not seem to support HTTPS, unfortunately.
         # although v3.4 might, if given a trusted cert on the server
-        if cls._detect_puppet_version() < (3, 3):
+        if version < (3, 3):
             # puppet < 3.3 does not honor the path component of a URL, so we must
             # do this basic auth silliness
             logger.debug(_('detected puppet version less than 3.3'))
@@ -64,14 +171,29 @@ class ModuleHandler(handler.ContentHandler):
 
             return 'http://%s:%s@%s' % (username, password, host)
         else:
-            # puppet 3.3+ honors the path component, so we can embed the repo
-            # or consumer id there
             logger.debug(_('detected puppet version 3.3 or greater'))
-            if repo_id:
-                path = os.path.join(constants.FORGE_PATH_REPO, repo_id)
-            else:
-                path = os.path.join(constants.FORGE_PATH_CONSUMER, conduit.consumer_id)
-            return urlparse.urlunparse(('http', host, path, '', '', ''))
+            return cls._generate_forge_path_url(conduit, host, repo_id)
+
+    @staticmethod
+    def _generate_forge_path_url(conduit, host, repo_id=None):
+        """
+        Generate a URL for the forge that encodes the consumer ID or repo ID in its
+        path. Puppet 3.3+ and the native installer support this form.
+
+        :param conduit: A handler conduit
+        :type  conduit: pulp.agent.gofer.pulp.Conduit
+        :param repo_id: unique ID of a repo to which this operation should
+                        be scoped
+        :return: URL
+        :rtype:  str
+        """
+        # puppet 3.3+ honors the path component, so we can embed the repo
+        # or consumer id there
+        if repo_id:
+            path = os.path.join(constants.FORGE_PATH_REPO, repo_id)
+        else:
+            path = os.path.join(constants.FORGE_PATH_CONSUMER, conduit.consumer_id)
+        return urlparse.urlunparse(('http', host, path, '', '', ''))
 
     @classmethod
     def install(cls, conduit, units, options):
@@ -92,13 +214,8 @@ class ModuleHandler(handler.ContentHandler):
                     tool indicated an error. Everything else is in "successes".
         :rtype:     pulp.agent.lib.report.ContentReport
         """
-        host = options[constants.FORGE_HOST]
-        repo_id = options.get(constants.REPO_ID_OPTION)
-        skip_dep = options.get(constants.SKIP_DEP_OPTION)
-        module_path = options.get(constants.MODULEPATH_OPTION)
-        successes, errors, num_changes = cls._perform_operation(
-            'install', units, cls._generate_forge_url(conduit, host, repo_id), skip_dep,
-            module_path)
+        successes, errors, num_changes = cls._perform_install_operation(
+            'install', conduit, units, options)
         report = ContentReport()
         report.set_succeeded({'successes': successes, 'errors': errors}, num_changes)
         return report
@@ -121,13 +238,8 @@ class ModuleHandler(handler.ContentHandler):
                     tool indicated an error. Everything else is in "successes".
         :rtype:     pulp.agent.lib.report.ContentReport
         """
-        host = options[constants.FORGE_HOST]
-        repo_id = options.get(constants.REPO_ID_OPTION)
-        skip_dep = options.get(constants.SKIP_DEP_OPTION)
-        module_path = options.get(constants.MODULEPATH_OPTION)
-        successes, errors, num_changes = cls._perform_operation(
-            'upgrade', units, cls._generate_forge_url(conduit, host, repo_id), skip_dep,
-            module_path)
+        successes, errors, num_changes = cls._perform_install_operation(
+            'upgrade', conduit, units, options)
         report = ContentReport()
         report.set_succeeded({'successes': successes, 'errors': errors}, num_changes)
         return report
@@ -135,9 +247,11 @@ class ModuleHandler(handler.ContentHandler):
     @classmethod
     def uninstall(cls, conduit, units, options):
         """
-        Uninstall content unit(s). In case dependency conflicts cause an
-        uninstall to fail, this will continue to retry the entire collection of
-        failed operations until an entire pass results in no successes.
+        Uninstall content unit(s). The "puppet module" tool refuses to uninstall a
+        module that another installed module depends on, so each unit is only
+        uninstalled once the units that depend on it are, according to the metadata
+        of the installed modules. Units that do not depend on each other are
+        uninstalled at the same time.
 
         :param  conduit: A handler conduit
         :type   conduit: pulp.agent.gofer.pulp.Conduit
@@ -153,53 +267,185 @@ class ModuleHandler(handler.ContentHandler):
         :rtype:     pulp.agent.lib.report.ContentReport
         """
         module_path = options.get(constants.MODULEPATH_OPTION)
-        previous_failure_count = 0
-        successes, errors, num_changes = cls._perform_operation('uninstall', units, None, None,
-                                                                module_path)
-
-        # need this so we can easily access original unit objects when constructing
-        # new requests below
-        units_by_full_name = dict(('%s/%s' % (u['author'], u['name']), u) for u in units)
-
-        # loop over the results, and keep trying to uninstall failed attempts as
-        # a dumb but effective way of dealing with dependency-related failures.
-        # keep trying until we get to an iteration where no more modules are
-        # uninstalled.
-        while True:
-            failed_names = errors.keys()
-            if len(failed_names) == 0:
-                # success all around! no need to retry
-                break
-            elif previous_failure_count == 0 or len(failed_names) < previous_failure_count:
-                previous_failure_count = len(failed_names)
-                failed_units = [units_by_full_name[full_name] for full_name in failed_names]
-                # retry the failed attempts
-                new_successes, new_errors, new_num_changes = \
-                    cls._perform_operation('uninstall', failed_units, None, None, module_path)
-                num_changes += new_num_changes
-                # move new successes from "errors" to "successes"
-                successes.update(new_successes)
-                for full_name in new_successes.keys():
-                    del errors[full_name]
-            else:
-                # non-zero failure count didn't change, so it's time to give up.
-                break
-
+        workers = options.get(constants.WORKERS_OPTION, constants.DEFAULT_WORKERS)
+        successes, errors, num_changes = cls._perform_uninstall_operation(units, module_path,
+                                                                          workers)
         report = ContentReport()
         report.set_succeeded({'successes': successes, 'errors': errors}, num_changes)
         return report
 
+    @classmethod
+    def _perform_uninstall_operation(cls, units, module_path=None,
+                                     workers=constants.DEFAULT_WORKERS):
+        """
+        Uninstall units in reverse dependency order, with up to the given number of
+        "puppet module" processes running at the same time.
+
+        :param units:       list of puppet module keys
+        :type  units:       list of dicts
+        :param module_path: option to manually specify which directory to uninstall from
+        :type  module_path: str
+        :param workers:     maximum number of "puppet module" processes to run at once
+        :type  workers:     int
+
+        :return:    three-member tuple of successes, errors, and num_changes, as
+                    returned by _perform_operation
+        :rtype:     tuple(dict, dict, int)
+        """
+        dependents = cls._installed_dependents(module_path)
+        tasks = []
+        for unit in units:
+            full_name = '%s/%s' % (unit['author'], unit['name'])
+            # an uninstall only touches its own module
+            tasks.append(batch.Task(full_name, unit, dependents.get(full_name, frozenset()),
+                                    [full_name]))
+        return cls._execute_batch('uninstall', tasks, None, None, module_path, max(workers, 1))
+
+    @classmethod
+    def _installed_dependents(cls, module_path=None):
+        """
+        Find which installed modules depend on each module, according to their
+        metadata.json files, or the Modulefiles of older modules.
+
+        :param module_path: directories of modules separated by colons, or None for
+                            puppet's modulepath setting
+        :type  module_path: str
+
+        :return:    dictionary where keys are module names in form "author/title", and
+                    values are sets of the names of the installed modules that directly
+                    depend on them
+        :rtype:     dict
+        """
+        if module_path:
+            module_paths = module_path.split(':')
+        else:
+            try:
+                module_paths = cls._detect_module_paths()
+            except OSError:
+                # the uninstall operations report that the tool is missing
+                return {}
+
+        dependents = {}
+        for path in module_paths:
+            for metadata in installer.installed_modules(path).itervalues():
+                if not metadata['name']:
+                    continue
+                for dependency in metadata['dependencies']:
+                    dependents.setdefault(dependency, set()).add(metadata['name'])
+        return dependents
+
+    @classmethod
+    def _perform_install_operation(cls, operation, conduit, units, options):
+        """
+        Install or upgrade units with the engine that the options select.
+
+        :param operation:   one of "install" or "upgrade"
+        :type  operation:   str
+        :param  conduit:    A handler conduit
+        :type   conduit:    pulp.agent.gofer.pulp.Conduit
+        :param  units:      A list of content unit (keys)
+        :type   units:      list
+        :param  options:    Unit install or update options.
+        :type   options:    dict
+
+        :return:    three-member tuple of successes, errors, and num_changes, as
+                    returned by _perform_operation
+        :rtype:     tuple(dict, dict, int)
+        """
+        host = options[constants.FORGE_HOST]
+        repo_id = options.get(constants.REPO_ID_OPTION)
+        skip_dep = options.get(constants.SKIP_DEP_OPTION)
+        module_path = options.get(constants.MODULEPATH_OPTION)
+        workers = options.get(constants.WORKERS_OPTION, constants.DEFAULT_WORKERS)
+        puppet_version = options.get(constants.PUPPET_VERSION_OPTION)
+        if options.get(constants.ENGINE_OPTION) == constants.ENGINE_NATIVE:
+            cache_dir = options.get(constants.CACHE_DIR_OPTION, constants.DEFAULT_CACHE_DIR)
+            tarball_cache = None
+            if cache_dir:
+                tarball_cache = cache.TarballCache(
+                    cache_dir,
+                    options.get(constants.CACHE_MAX_SIZE_OPTION, constants.DEFAULT_CACHE_MAX_SIZE))
+            return cls._perform_native_operation(
+                operation, units, cls._generate_forge_path_url(conduit, host, repo_id),
+                skip_dep, module_path, workers, tarball_cache)
+        return cls._perform_batch_operation(
+            operation, units, cls._generate_forge_url(conduit, host, repo_id, puppet_version),
+            skip_dep, module_path, workers)
+
+    @classmethod
+    def _perform_native_operation(cls, operation, units, forge_url, skip_dep=None,
+                                  module_path=None, workers=constants.DEFAULT_WORKERS,
+                                  tarball_cache=None):
+        """
+        Like _perform_operation, but installs or upgrades the units with the native
+        installer instead of the "puppet module" tool.
+
+        :param operation:   one of "install" or "upgrade"
+        :type  operation:   str
+        :param units:       list of puppet module keys
+        :type  units:       list of dicts
+        :param forge_url:   URL of the forge to install from
+        :type  forge_url:   str
+        :param skip_dep:    If True, skip installation of module dependencies
+        :type  skip_dep:    boolean
+        :param module_path: option to manually specify which directory to install into.
+                            Like the "puppet module" tool, only the first directory of a
+                            colon-separated list is installed into. By default, puppet is
+                            asked for the directory it would use.
+        :type  module_path: str
+        :param workers:     maximum number of forge requests and downloads to run at once
+        :type  workers:     int
+        :param tarball_cache: cache of downloaded module files, or None to not cache them
+        :type  tarball_cache: pulp_puppet.handlers.cache.TarballCache
+
+        :return:    three-member tuple of successes, errors, and num_changes, as
+                    returned by _perform_operation
+        :rtype:     tuple(dict, dict, int)
+        """
+        errors = {}
+        successes = {}
+        num_changes = 0
+        if units:
+            if module_path:
+                module_path = module_path.split(':')[0]
+            else:
+                try:
+                    module_path = cls._detect_module_path()
+                except OSError:
+                    full_name = '%s/%s' % (units[0]['author'], units[0]['name'])
+                    errors[full_name] = {'error': '"puppet" tool not found'}
+                    return successes, errors, num_changes
+            module_installer = installer.ModuleInstaller(forge_url, module_path, workers,
+                                                         tarball_cache)
+            reports = module_installer.perform(operation, units, skip_dep)
+            for unit in units:
+                full_name = '%s/%s' % (unit['author'], unit['name'])
+                num_changes += cls._record_result(operation, full_name, (0, reports[full_name]),
+                                                  successes, errors)
+        cls._clean_successful_reports(successes.values(), operation)
+        return successes, errors, num_changes
+
     def profile(self, conduit):
         """
         Request the installed content profile be sent
         to the pulp server.
 
+        The profile is a dict where keys are the full names of the modules installed in
+        puppet's module path, in form "author/title", and values are their versions.
+
         :param  conduit: A handler conduit.
         :type   conduit: pulp.agent.lib.conduit.Conduit
         :return:    A profile report.
         :rtype:     pulp.agent.lib.report.ProfileReport
         """
-        raise NotImplementedError()
+        report = ProfileReport()
+        try:
+            module_paths = self._detect_module_paths()
+        except OSError:
+            report.set_failed({'error': '"puppet" tool not found'})
+            return report
+        report.set_succeeded(self.scanner.scan(module_paths))
+        return report
 
     @classmethod
     def _perform_operation(cls, operation, units, forge_url=None, skip_dep=None, module_path=None):
@@ -237,43 +483,216 @@ class ModuleHandler(handler.ContentHandler):
         num_changes = 0
 
         for unit in units:
-            # prepare the command
             full_name = '%s/%s' % (unit['author'], unit['name'])
-            args = ['puppet', 'module', operation, '--render-as', 'json']
-            if forge_url:
-                args.extend(['--module_repository', forge_url])
-            if unit.get('version'):
-                args.extend(['--version', unit['version']])
-            args.append(full_name)
-            if skip_dep:
-                args.extend(['--ignore-dependencies'])
-            if module_path:
-                args.extend(['--modulepath', module_path])
-
-            # execute the command
             try:
-                popen = subprocess.Popen(args, stdout=subprocess.PIPE)
+                result = cls._run_module_tool(operation, unit, forge_url, skip_dep, module_path)
             except OSError:
                 logger.error(_('"puppet module" tool not found'))
                 errors[full_name] = {'error': '"puppet module" tool not found'}
                 break
+            num_changes += cls._record_result(operation, full_name, result, successes, errors)
+        cls._clean_successful_reports(successes.values(), operation)
+        return successes, errors, num_changes
+
+    @classmethod
+    def _perform_batch_operation(cls, operation, units, forge_url, skip_dep=None,
+                                 module_path=None, workers=constants.DEFAULT_WORKERS):
+        """
+        Like _perform_operation, but runs the "puppet module" tool for up to the given number
+        of units at the same time. A unit's operation is only started once the operations
+        for any of its dependencies that are also in the batch are finished, and never at the
+        same time as the operation for another unit that shares a dependency with it, since
+        both could try to install or upgrade that dependency.
+
+        Dependencies are looked up in the forge, unless they are skipped. If that fails, the
+        operations are performed one at a time by _perform_operation.
+
+        :param operation:   one of "install" or "upgrade"
+        :type  operation:   str
+        :param units:       list of puppet module keys
+        :type  units:       list of dicts
+        :param forge_url:   URL of the forge to install from
+        :type  forge_url:   str
+        :param skip_dep:    If True, skip installation of module dependencies
+        :type  skip_dep:    boolean
+        :param module_path: option to manually specify which directory to install into
+        :type  module_path: str
+        :param workers:     maximum number of "puppet module" processes to run at once
+        :type  workers:     int
+
+        :return:    three-member tuple of successes, errors, and num_changes, as
+                    returned by _perform_operation
+        :rtype:     tuple(dict, dict, int)
+        """
+        if workers < 2 or len(units) < 2:
+            return cls._perform_operation(operation, units, forge_url, skip_dep, module_path)
+        if skip_dep:
+            # every operation only touches its own module
+            dependencies = {}
+        else:
+            dependencies = cls._fetch_dependencies(forge_url, units)
+            if dependencies is None:
+                return cls._perform_operation(operation, units, forge_url, skip_dep,
+                                              module_path)
+
+        tasks = []
+        for unit in units:
+            full_name = '%s/%s' % (unit['author'], unit['name'])
+            unit_dependencies = dependencies.get(full_name, frozenset())
+            resources = unit_dependencies | set([full_name])
+            tasks.append(batch.Task(full_name, unit, unit_dependencies, resources))
+        return cls._execute_batch(operation, tasks, forge_url, skip_dep, module_path, workers)
+
+    @classmethod
+    def _execute_batch(cls, operation, tasks, forge_url, skip_dep, module_path, workers):
+        """
+        Run the "puppet module" tool for a batch of units in the order their tasks allow.
+
+        :param operation:   one of "install", "upgrade", or "uninstall"
+        :type  operation:   str
+        :param tasks:       tasks whose keys are the units' full names, and whose items are
+                            the puppet module keys
+        :type  tasks:       list of pulp_puppet.handlers.batch.Task
+        :param forge_url:   optional URL for a forge
+        :type  forge_url:   str
+        :param skip_dep:    If True, skip installation of module dependencies
+        :type  skip_dep:    boolean
+        :param module_path: option to manually specify which directory to operate on
+        :type  module_path: str
+        :param workers:     maximum number of "puppet module" processes to run at once
+        :type  workers:     int
 
-            stdout, stderr = popen.communicate()
-            operation_report = cls._interpret_operation_report(stdout, operation, full_name)
-
-            # 'success' means a change took place, so count it for the final report
-            if operation_report.get('result') == 'success':
-                num_changes += 1
-            if popen.returncode == 0 and 'error' not in operation_report:
-                msg_dict = {'operation': operation, 'module': full_name}
-                msg = _('%(operation)s of module %(module)s')
-                logger.info(msg, msg_dict)
-                successes[full_name] = operation_report
+        :return:    three-member tuple of successes, errors, and num_changes, as
+                    returned by _perform_operation
+        :rtype:     tuple(dict, dict, int)
+        """
+        def run(unit):
+            return cls._run_module_tool(operation, unit, forge_url, skip_dep, module_path)
+
+        results = batch.execute(tasks, run, workers)
+
+        errors = {}
+        successes = {}
+        num_changes = 0
+        for task in tasks:
+            if task.key not in results:
+                # not started, because an earlier operation failed to run at all
+                continue
+            result = results[task.key]
+            if isinstance(result, OSError):
+                logger.error(_('"puppet module" tool not found'))
+                errors[task.key] = {'error': '"puppet module" tool not found'}
+            elif isinstance(result, Exception):
+                raise result
             else:
-                errors[full_name] = operation_report
+                num_changes += cls._record_result(operation, task.key, result, successes,
+                                                  errors)
         cls._clean_successful_reports(successes.values(), operation)
         return successes, errors, num_changes
 
+    @classmethod
+    def _run_module_tool(cls, operation, unit, forge_url=None, skip_dep=None, module_path=None):
+        """
+        Run the "puppet module" tool to perform an operation on one unit.
+
+        :param operation:   one of "install", "upgrade", or "uninstall"
+        :type  operation:   str
+        :param unit:        puppet module key
+        :type  unit:        dict
+        :param forge_url:   optional URL for a forge
+        :type  forge_url:   str
+        :param skip_dep:    If True, skip installation of module dependencies
+        :type  skip_dep:    boolean
+        :param module_path: option to manually specify which directory to install into
+        :type  module_path: str
+
+        :return:    two-member tuple of the tool's exit code and its deserialized report
+        :rtype:     tuple(int, dict)
+
+        :raise OSError: if the "puppet module" tool cannot be run
+        """
+        # prepare the command
+        full_name = '%s/%s' % (unit['author'], unit['name'])
+        args = ['puppet', 'module', operation, '--render-as', 'json']
+        if forge_url:
+            args.extend(['--module_repository', forge_url])
+        if unit.get('version'):
+            args.extend(['--version', unit['version']])
+        args.append(full_name)
+        if skip_dep:
+            args.extend(['--ignore-dependencies'])
+        if module_path:
+            args.extend(['--modulepath', module_path])
+
+        # execute the command
+        popen = subprocess.Popen(args, stdout=subprocess.PIPE)
+        stdout, stderr = popen.communicate()
+        return popen.returncode, cls._interpret_operation_report(stdout, operation, full_name)
+
+    @staticmethod
+    def _record_result(operation, full_name, result, successes, errors):
+        """
+        Add the result of running the "puppet module" tool for one unit to either the
+        successes or the errors.
+
+        :param operation:   one of "install", "upgrade", or "uninstall"
+        :type  operation:   str
+        :param full_name:   full name of the unit in form "author/title"
+        :type  full_name:   str
+        :param result:      exit code and report, as returned by _run_module_tool
+        :type  result:      tuple(int, dict)
+        :param successes:   successful reports keyed by full name, updated in place
+        :type  successes:   dict
+        :param errors:      failed reports keyed by full name, updated in place
+        :type  errors:      dict
+
+        :return:    1 if the operation changed anything, else 0
+        :rtype:     int
+        """
+        returncode, operation_report = result
+        if returncode == 0 and 'error' not in operation_report:
+            msg_dict = {'operation': operation, 'module': full_name}
+            msg = _('%(operation)s of module %(module)s')
+            logger.info(msg, msg_dict)
+            successes[full_name] = operation_report
+        else:
+            errors[full_name] = operation_report
+        # 'success' means a change took place, so count it for the final report
+        return 1 if operation_report.get('result') == 'success' else 0
+
+    @classmethod
+    def _fetch_dependencies(cls, forge_url, units):
+        """
+        Ask the forge which modules each unit depends on, directly or indirectly. This is
+        the same dependency data the "puppet module" tool resolves an install with.
+
+        :param forge_url:   URL of the forge, as returned by _generate_forge_url
+        :type  forge_url:   str
+        :param units:       list of puppet module keys
+        :type  units:       list of dicts
+
+        :return:    dictionary where keys are full names of the units and values are sets of
+                    the full names of their dependencies, or None if the forge could not be
+                    queried. Units the forge does not know about have no dependencies.
+        :rtype:     dict or None
+        """
+        client = forge.Forge(forge_url)
+        dependencies = {}
+        for unit in units:
+            full_name = '%s/%s' % (unit['author'], unit['name'])
+            try:
+                releases = client.releases(full_name, unit.get('version'))
+            except forge.ERRORS, e:
+                msg = _('failed to query module dependencies from %(url)s, operations '
+                        'will be performed one at a time: %(exc)s')
+                logger.warning(msg, {'url': client.releases_url, 'exc': e})
+                return None
+            # the forge reports every module in the dependency tree of the unit
+            names = set(releases)
+            names.discard(full_name)
+            dependencies[full_name] = names
+        return dependencies
+
     @staticmethod
     def _interpret_operation_report(output, operation, full_name):
         """
@@ -0,0 +1,112 @@
+"""
+Incremental scanner of the modules installed in module paths.
+
+Scanning every module's metadata on each profile request would read and parse a file per
+installed module. The scanner instead remembers what it read, along with the modification
+times it read it at. A module path whose directory has not changed still has the same
+modules in it, and a module whose metadata file has not changed still has the same name
+and version, so a repeated scan only costs a stat per module.
+"""
+
+import os
+
+from pulp_puppet.common import constants
+from pulp_puppet.handlers import installer
+
+
+# files that describe a module, in the order they are preferred
+METADATA_FILENAMES = (constants.MODULE_METADATA_FILENAME, 'Modulefile')
+
+
+class ModulePathScanner(object):
+    """
+    Remembers the modules found in module paths between scans.
+    """
+
+    def __init__(self):
+        # module path -> (modification time of the module path, list of directory names)
+        self._listings = {}
+        # module directory -> (stat signature of its metadata file, metadata dict)
+        self._metadata = {}
+
+    def scan(self, module_paths):
+        """
+        Find the modules installed in the module paths. Like puppet, a module in an earlier
+        module path hides modules of the same name in later ones.
+
+        :param module_paths:    absolute paths to directories of modules
+        :type  module_paths:    list of str
+
+        :return:    dictionary where keys are module names in form "author/title", and values
+                    are their versions. Directories that do not describe the module they
+                    contain are omitted.
+        :rtype:     dict
+        """
+        modules = {}
+        seen = set()
+        scanned = set()
+        for module_path in module_paths:
+            for name in self._list(module_path):
+                directory = os.path.join(module_path, name)
+                scanned.add(directory)
+                if name in seen:
+                    continue
+                seen.add(name)
+                metadata = self._read(directory)
+                if metadata['name'] and metadata['name'] not in modules:
+                    modules[metadata['name']] = metadata['version']
+
+        # forget modules that were removed
+        for directory in set(self._metadata) - scanned:
+            del self._metadata[directory]
+        for module_path in set(self._listings) - set(module_paths):
+            del self._listings[module_path]
+        return modules
+
+    def _list(self, module_path):
+        """
+        :param module_path: absolute path to a directory of modules
+        :type  module_path: str
+
+        :return:    names of the module directories in the module path
+        :rtype:     list of str
+        """
+        try:
+            mtime = os.stat(module_path).st_mtime
+        except OSError:
+            self._listings.pop(module_path, None)
+            return []
+        cached = self._listings.get(module_path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        try:
+            names = os.listdir(module_path)
+        except OSError:
+            return []
+        names = [name for name in names if not name.startswith('.')]
+        names = sorted(name for name in names if os.path.isdir(os.path.join(module_path, name)))
+        self._listings[module_path] = (mtime, names)
+        return names
+
+    def _read(self, directory):
+        """
+        :param directory:   absolute path to a module's directory
+        :type  directory:   str
+
+        :return:    dict with the keys "name", in form "author/title", and "version"
+        :rtype:     dict
+        """
+        signature = None
+        for filename in METADATA_FILENAMES:
+            try:
+                stat = os.stat(os.path.join(directory, filename))
+            except OSError:
+                continue
+            signature = (filename, stat.st_mtime, stat.st_size)
+            break
+        cached = self._metadata.get(directory)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        metadata = installer.read_module_metadata(directory)
+        self._metadata[directory] = (signature, metadata)
+        return metadata
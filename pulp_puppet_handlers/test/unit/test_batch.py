@@ -0,0 +1,101 @@
+import threading
+import time
+import unittest
+
+from pulp_puppet.handlers import batch
+
+
+class Recorder(object):
+    """
+    Performs tasks by recording when each one started and finished.
+    """
+
+    def __init__(self, delay=0.01, fail=()):
+        self.delay = delay
+        self.fail = fail
+        self.lock = threading.Lock()
+        self.events = []
+        self.running = 0
+        self.max_running = 0
+
+    def __call__(self, item):
+        with self.lock:
+            self.events.append(('start', item))
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.delay)
+        with self.lock:
+            self.events.append(('finish', item))
+            self.running -= 1
+        if item in self.fail:
+            raise OSError()
+        return item.upper()
+
+    def index(self, event, item):
+        return self.events.index((event, item))
+
+
+class TestExecute(unittest.TestCase):
+    def test_results(self):
+        tasks = [batch.Task(name, name) for name in ('a', 'b', 'c')]
+
+        results = batch.execute(tasks, Recorder(), 2)
+
+        self.assertEqual(results, {'a': 'A', 'b': 'B', 'c': 'C'})
+
+    def test_no_tasks(self):
+        self.assertEqual(batch.execute([], Recorder(), 2), {})
+
+    def test_bounded_workers(self):
+        recorder = Recorder()
+        tasks = [batch.Task(str(i), str(i)) for i in range(8)]
+
+        batch.execute(tasks, recorder, 3)
+
+        self.assertEqual(recorder.max_running, 3)
+
+    def test_prerequisites(self):
+        recorder = Recorder()
+        tasks = [
+            batch.Task('app', 'app', prerequisites=['lib', 'missing']),
+            batch.Task('lib', 'lib'),
+            batch.Task('other', 'other'),
+        ]
+
+        batch.execute(tasks, recorder, 4)
+
+        self.assertTrue(recorder.index('finish', 'lib') < recorder.index('start', 'app'))
+        # an independent task does not wait
+        self.assertTrue(recorder.index('start', 'other') < recorder.index('finish', 'lib'))
+
+    def test_resources(self):
+        recorder = Recorder()
+        tasks = [
+            batch.Task('a', 'a', resources=['a', 'shared']),
+            batch.Task('b', 'b', resources=['b', 'shared']),
+        ]
+
+        batch.execute(tasks, recorder, 4)
+
+        self.assertEqual(recorder.max_running, 1)
+
+    def test_cycle(self):
+        tasks = [
+            batch.Task('a', 'a', prerequisites=['b']),
+            batch.Task('b', 'b', prerequisites=['a']),
+        ]
+
+        results = batch.execute(tasks, Recorder(), 4)
+
+        self.assertEqual(results, {'a': 'A', 'b': 'B'})
+
+    def test_exception_stops_scheduling(self):
+        tasks = [
+            batch.Task('a', 'a'),
+            batch.Task('b', 'b', prerequisites=['a']),
+        ]
+
+        results = batch.execute(tasks, Recorder(fail=['a']), 4)
+
+        self.assertEqual(results.keys(), ['a'])
+        self.assertTrue(isinstance(results['a'], OSError))
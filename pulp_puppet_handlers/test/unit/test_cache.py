@@ -0,0 +1,73 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import mock
+
+from pulp_puppet.handlers import cache
+
+
+class TestTarballCache(unittest.TestCase):
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.cache = cache.TarballCache(os.path.join(self.working_dir, 'cache'), 100)
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def _add(self, content):
+        source = os.path.join(self.working_dir, 'download.tar.gz')
+        with open(source, 'w') as f:
+            f.write(content)
+        checksum = hashlib.md5(content).hexdigest()
+        self.cache.add(checksum, source)
+        return checksum
+
+    def test_add_and_get(self):
+        checksum = self._add('module')
+
+        path = self.cache.get(checksum)
+
+        self.assertEqual(path, os.path.join(self.cache.path, checksum + '.tar.gz'))
+        self.assertEqual(open(path).read(), 'module')
+
+    def test_get_missing(self):
+        self.assertTrue(self.cache.get('abc') is None)
+
+    def test_get_corrupt(self):
+        checksum = self._add('module')
+        with open(self.cache.entry_path(checksum), 'w') as f:
+            f.write('modified')
+
+        self.assertTrue(self.cache.get(checksum) is None)
+        self.assertFalse(os.path.exists(self.cache.entry_path(checksum)))
+
+    @mock.patch('shutil.copyfile', side_effect=IOError('disk full'))
+    def test_add_failure(self, mock_copyfile):
+        # does not raise, and leaves nothing behind
+        self._add('module')
+
+        self.assertEqual(os.listdir(self.cache.path), [])
+
+    def test_evict_least_recently_used(self):
+        old = self._add('o' * 40)
+        used = self._add('u' * 40)
+        new = self._add('n' * 40)
+        now = time.time()
+        os.utime(self.cache.entry_path(old), (now - 300, now - 300))
+        os.utime(self.cache.entry_path(used), (now - 200, now - 200))
+        os.utime(self.cache.entry_path(new), (now - 100, now - 100))
+        # using a file makes it the most recently used one
+        self.cache.get(used)
+
+        self.cache.evict()
+
+        self.assertEqual(sorted(os.listdir(self.cache.path)),
+                         sorted([new + '.tar.gz', used + '.tar.gz']))
+
+    def test_evict_missing_cache(self):
+        # does not raise
+        self.cache.evict()
@@ -0,0 +1,66 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from pulp_puppet.handlers import installer, scanner
+
+
+class TestModulePathScanner(unittest.TestCase):
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.first = os.path.join(self.working_dir, 'first')
+        self.second = os.path.join(self.working_dir, 'second')
+        self.scanner = scanner.ModulePathScanner()
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def _install(self, module_path, name, version):
+        directory = os.path.join(module_path, name.split('-', 1)[1])
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(os.path.join(directory, 'metadata.json'), 'w') as f:
+            json.dump({'name': name, 'version': version}, f)
+        return directory
+
+    def test_scan(self):
+        self._install(self.first, 'puppetlabs-stdlib', '4.1.0')
+        self._install(self.second, 'puppetlabs-stdlib', '3.2.0')
+        self._install(self.second, 'puppetlabs-java', '0.2.0')
+        os.mkdir(os.path.join(self.second, 'unknown'))
+
+        modules = self.scanner.scan([self.first, self.second, '/does/not/exist'])
+
+        # the first module path takes precedence
+        self.assertEqual(modules, {'puppetlabs/stdlib': '4.1.0', 'puppetlabs/java': '0.2.0'})
+
+    @mock.patch.object(installer, 'read_module_metadata', wraps=installer.read_module_metadata)
+    def test_unchanged_modules_not_read_again(self, mock_read):
+        self._install(self.first, 'puppetlabs-stdlib', '4.1.0')
+        self._install(self.first, 'puppetlabs-java', '0.2.0')
+        self.scanner.scan([self.first])
+
+        modules = self.scanner.scan([self.first])
+
+        self.assertEqual(mock_read.call_count, 2)
+        self.assertEqual(modules, {'puppetlabs/stdlib': '4.1.0', 'puppetlabs/java': '0.2.0'})
+
+    def test_changes_detected(self):
+        directory = self._install(self.first, 'puppetlabs-stdlib', '4.1.0')
+        self._install(self.first, 'puppetlabs-java', '0.2.0')
+        self.scanner.scan([self.first])
+        metadata = os.path.join(directory, 'metadata.json')
+        stat = os.stat(metadata)
+
+        self._install(self.first, 'puppetlabs-stdlib', '4.10.0')
+        os.utime(metadata, (stat.st_atime, stat.st_mtime + 10))
+        shutil.rmtree(os.path.join(self.first, 'java'))
+        os.utime(self.first, (stat.st_atime, stat.st_mtime + 10))
+
+        modules = self.scanner.scan([self.first])
+
+        self.assertEqual(modules, {'puppetlabs/stdlib': '4.10.0'})
@@ -0,0 +1,163 @@
+"""
+Per-process caches used by the forge WSGI application.
+
+A forge worker answers many requests against the same few repositories. These caches let it
+keep the index of published repositories and open dependency databases between requests,
+instead of querying the database and opening gdbm files on every request.
+"""
+
+from collections import OrderedDict
+import gdbm
+import os
+import threading
+import time
+
+from pulp_puppet.forge import metrics
+
+
+class RepoPathIndex(object):
+    """
+    Index of where each repository's dependency database is published, and over which
+    protocol. The whole index is loaded at once and reloaded after it expires. Repositories
+    that are not in the index yet, for example because they were created since it was
+    loaded, are looked up individually and added to it.
+    """
+
+    def __init__(self, query, ttl):
+        """
+        :param query:   callable that accepts a list of repo IDs, or None for all repos, and
+                        returns a dictionary where keys are repo IDs and values are dicts
+                        that contain the database path under key "path" and a protocol
+                        under key "protocol"
+        :type  query:   callable
+        :param ttl:     number of seconds after which the index is reloaded
+        :type  ttl:     int
+        """
+        self.query = query
+        self.ttl = ttl
+        self.repos = {}
+        self.loaded = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        Load the index of all published repositories.
+        """
+        repos = self.query(None)
+        with self._lock:
+            self.repos = repos
+            self.loaded = time.time()
+
+    def get(self, repo_ids):
+        """
+        :param repo_ids: list of repository IDs.
+        :type  repo_ids: list
+
+        :return:    dictionary where keys are repo IDs, and values are dicts that contain
+                    the path to the gdbm database under key "path", and a protocol under
+                    key "protocol".
+        :rtype:     dict
+        """
+        if self.loaded is None or time.time() - self.loaded > self.ttl:
+            self.load()
+
+        repos = self.repos
+        ret = dict((repo_id, repos[repo_id]) for repo_id in repo_ids if repo_id in repos)
+        missing = [repo_id for repo_id in repo_ids if repo_id not in ret]
+        metrics.count_cache_lookup('repo_index', True, len(ret))
+        metrics.count_cache_lookup('repo_index', False, len(missing))
+        if missing:
+            found = self.query(missing)
+            with self._lock:
+                self.repos.update(found)
+            ret.update(found)
+        return ret
+
+
+class DatabaseCache(object):
+    """
+    Least recently used cache of open, read-only gdbm databases keyed by path. A database is
+    re-opened when the file at its path has been replaced, as happens when a repository is
+    re-published.
+
+    Handles are never closed explicitly by the cache, since a request in another thread may
+    still be reading from one that was just evicted. Each handle is closed when its last
+    reference goes away.
+    """
+
+    def __init__(self, size):
+        """
+        :param size:    maximum number of databases to keep open
+        :type  size:    int
+        """
+        self.size = size
+        self.databases = OrderedDict()
+        self._lock = threading.Lock()
+
+    def open(self, path):
+        """
+        Return an open handle on the gdbm database at the given path.
+
+        :param path:    path to a gdbm database
+        :type  path:    str
+
+        :return:    open database whose close() method leaves it open for later requests
+        :rtype:     SharedDatabase
+
+        :raise gdbm.error: if the database cannot be opened
+        """
+        try:
+            stat = os.stat(path)
+        except OSError, e:
+            raise gdbm.error(str(e))
+        identity = (stat.st_ino, stat.st_mtime, stat.st_size)
+
+        with self._lock:
+            cached = self.databases.pop(path, None)
+            if cached is not None and cached.identity == identity:
+                self.databases[path] = cached
+                metrics.count_cache_lookup('database', True)
+                return cached
+
+        metrics.count_cache_lookup('database', False)
+        database = SharedDatabase(gdbm.open(path, 'r'), identity)
+        with self._lock:
+            self.databases[path] = database
+            while len(self.databases) > self.size:
+                self.databases.popitem(last=False)
+        return database
+
+    def __contains__(self, path):
+        return path in self.databases
+
+    def __len__(self):
+        return len(self.databases)
+
+
+class SharedDatabase(object):
+    """
+    Read-only view of a gdbm database that is shared between requests. Callers treat it like
+    any other database they opened, but closing it is a no-op.
+    """
+
+    def __init__(self, db, identity):
+        """
+        :param db:          open gdbm database
+        :type  db:          gdbm.gdbm
+        :param identity:    inode, modification time and size of the file that was opened
+        :type  identity:    tuple
+        """
+        self.db = db
+        self.identity = identity
+
+    def __getitem__(self, key):
+        return self.db[key]
+
+    def keys(self):
+        return self.db.keys()
+
+    def close(self):
+        """
+        Leave the database open so that later requests can reuse it.
+        """
+        pass
@@ -0,0 +1,227 @@
+"""
+Merged dependency index for consumers that are bound to more than one puppet repository.
+
+Each published repository carries its own gdbm dependency database. A consumer-scoped
+forge request would otherwise open and query every one of them. The merged index combines
+the dependency databases of a set of repositories into a single gdbm file, so that a lookup
+against the whole binding set costs one key fetch and one JSON decode.
+
+Every entry in the merged index is tagged with the ID of the repository it was published
+in, so that dependency resolution for a unit still only considers the repository that
+provided it. The index file is named after the set of repository IDs it covers and records
+the identity of every member database it was built from. It is rebuilt lazily the first
+time it is requested after any member repository is re-published or the set changes.
+Writing an index also removes the other indexes that were built from an older publish of
+one of its member repositories, so indexes of sets that are no longer requested do not pile
+up.
+"""
+
+import gdbm
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from gettext import gettext as _
+
+from pulp_puppet.forge import metrics
+
+
+_LOGGER = logging.getLogger(__name__)
+
+# key under which the identity of each member database is stored in a merged index. Module
+# names are always in the form "author/name", so they can never collide with this key.
+SOURCES_KEY = '.sources'
+
+# key that entries of a merged index use to record the repository they came from
+REPO_ID_KEY = 'repo_id'
+
+
+def index_path(index_dir, repo_ids):
+    """
+    Return the path of the merged index covering exactly the given repositories.
+
+    :param index_dir:   directory in which merged indexes are kept
+    :type  index_dir:   str
+    :param repo_ids:    IDs of the repositories covered by the index
+    :type  repo_ids:    iterable
+
+    :return:    absolute path to the merged index file
+    :rtype:     str
+    """
+    digest = hashlib.sha1('\n'.join(sorted(repo_ids))).hexdigest()
+    return os.path.join(index_dir, '%s.db' % digest)
+
+
+def open_index(index_dir, db_paths):
+    """
+    Open the merged index for the given repositories, building it first if it does not
+    exist or if any member dependency database changed since it was built.
+
+    :param index_dir:   directory in which merged indexes are kept
+    :type  index_dir:   str
+    :param db_paths:    dictionary where keys are repo IDs and values are the paths to each
+                        repository's published dependency database
+    :type  db_paths:    dict
+
+    :return:    open gdbm database containing the merged index, or None if none of the
+                repositories have a published dependency database
+    :rtype:     gdbm.gdbm
+    """
+    sources = _read_sources(db_paths)
+    if not sources:
+        return None
+
+    path = index_path(index_dir, sources.keys())
+    db = _open_if_current(path, sources)
+    metrics.count_cache_lookup('merged_index', db is not None)
+    if db is None:
+        build_index(path, db_paths, sources)
+        db = gdbm.open(path, 'r')
+    return db
+
+
+def build_index(path, db_paths, sources):
+    """
+    Write a new merged index at the given path. The index is assembled in a temporary file
+    next to the destination and renamed into place, so that concurrent readers only ever
+    see a complete index. Other indexes that were built from an older publish of one of the
+    member databases are then removed.
+
+    :param path:        path at which the merged index should be written
+    :type  path:        str
+    :param db_paths:    dictionary where keys are repo IDs and values are the paths to each
+                        repository's published dependency database
+    :type  db_paths:    dict
+    :param sources:     identity of each member database, as returned by _read_sources
+    :type  sources:     dict
+    """
+    msg = _('building merged dependency index %(path)s for repos %(repo_ids)s')
+    msg_dict = {'path': path, 'repo_ids': ', '.join(sorted(sources))}
+    _LOGGER.debug(msg, msg_dict)
+
+    merged = {}
+    for repo_id in sorted(sources):
+        db = gdbm.open(db_paths[repo_id], 'r')
+        try:
+            key = db.firstkey()
+            while key is not None:
+                entries = json.loads(db[key])
+                for entry in entries:
+                    entry[REPO_ID_KEY] = repo_id
+                merged.setdefault(key, []).extend(entries)
+                key = db.nextkey(key)
+        finally:
+            db.close()
+
+    index_dir = os.path.dirname(path)
+    if not os.path.isdir(index_dir):
+        os.makedirs(index_dir)
+    fd, tmp_path = tempfile.mkstemp(prefix='.merging-', dir=index_dir)
+    os.close(fd)
+    try:
+        db = gdbm.open(tmp_path, 'n')
+        try:
+            for name, entries in merged.iteritems():
+                db[name] = json.dumps(entries)
+            db[SOURCES_KEY] = json.dumps(sources)
+        finally:
+            db.close()
+        os.rename(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+    _remove_stale(index_dir, path, sources)
+
+
+def _remove_stale(index_dir, path, sources):
+    """
+    Remove the merged indexes in the directory that were built from a different publish of
+    any of the given member databases. Such an index would be rebuilt anyway the next time
+    it is requested, and it may never be requested again if its set of repositories is no
+    longer bound by any consumer.
+
+    :param index_dir:   directory in which merged indexes are kept
+    :type  index_dir:   str
+    :param path:        path of the index that was just written, which is kept
+    :type  path:        str
+    :param sources:     current identity of each member database, as returned by
+                        _read_sources
+    :type  sources:     dict
+    """
+    current = json.loads(json.dumps(sources))
+    for filename in os.listdir(index_dir):
+        other_path = os.path.join(index_dir, filename)
+        if not filename.endswith('.db') or other_path == path:
+            continue
+        try:
+            db = gdbm.open(other_path, 'r')
+        except gdbm.error:
+            continue
+        try:
+            built_from = json.loads(db[SOURCES_KEY])
+        except (KeyError, ValueError):
+            built_from = {}
+        finally:
+            db.close()
+        if any(repo_id in current and identity != current[repo_id]
+               for repo_id, identity in built_from.iteritems()):
+            msg = _('removing stale merged dependency index %(path)s')
+            _LOGGER.debug(msg, {'path': other_path})
+            try:
+                os.remove(other_path)
+            except OSError:
+                # already removed by another process
+                pass
+
+
+def _read_sources(db_paths):
+    """
+    Describe the identity of each member dependency database, so that a re-published
+    database can be detected. Repositories whose database does not exist are omitted.
+
+    :param db_paths:    dictionary where keys are repo IDs and values are the paths to each
+                        repository's published dependency database
+    :type  db_paths:    dict
+
+    :return:    dictionary where keys are repo IDs and values are lists of inode,
+                modification time and size
+    :rtype:     dict
+    """
+    sources = {}
+    for repo_id, db_path in db_paths.iteritems():
+        try:
+            stat = os.stat(db_path)
+        except OSError:
+            msg = _('failed to find dependency database for repo %s. re-publish to fix.')
+            _LOGGER.error(msg % repo_id)
+            continue
+        sources[repo_id] = [stat.st_ino, stat.st_mtime, stat.st_size]
+    return sources
+
+
+def _open_if_current(path, sources):
+    """
+    Open an existing merged index if it was built from exactly the given member databases.
+
+    :param path:    path to the merged index
+    :type  path:    str
+    :param sources: identity of each member database, as returned by _read_sources
+    :type  sources: dict
+
+    :return:    open gdbm database, or None if the index is missing or out of date
+    :rtype:     gdbm.gdbm
+    """
+    try:
+        db = gdbm.open(path, 'r')
+    except gdbm.error:
+        return None
+    try:
+        built_from = json.loads(db[SOURCES_KEY])
+    except (KeyError, ValueError):
+        built_from = None
+    if built_from != json.loads(json.dumps(sources)):
+        db.close()
+        return None
+    return db
@@ -0,0 +1,301 @@
+"""
+Lightweight timers and counters for the forge API.
+
+Every forge worker process aggregates how long each phase of answering a request takes, how
+many dependency data lookups are made, how deep dependency recursion goes, how large responses
+are, and how often each per-process cache is hit. The aggregates are rendered in the
+Prometheus text exposition format by the metrics view.
+
+Phases nest: dependency resolution, for instance, fetches and decodes dependency data. Each
+phase is recorded with its exclusive time, which leaves out the time spent in the phases nested
+in it, so that the phase totals of a request add up to at most its duration.
+
+Recording a value only takes a lock and a dictionary update, so instrumentation is always on.
+"""
+
+import functools
+import threading
+import time
+
+
+# name: (type, help text) of every metric family that is rendered
+FAMILIES = {
+    'pulp_puppet_forge_request_seconds': (
+        'summary', 'Time taken to answer forge API requests, by view.'),
+    'pulp_puppet_forge_phase_seconds': (
+        'summary', 'Time spent in each phase of answering forge API requests, excluding '
+                   'nested phases.'),
+    'pulp_puppet_forge_depdata_lookups_total': (
+        'counter', 'Dependency data lookups of a module name, by whether the name was found.'),
+    'pulp_puppet_forge_dependency_depth': (
+        'summary', 'Depth of the dependency recursion made to answer a release.'),
+    'pulp_puppet_forge_response_bytes': (
+        'summary', 'Size of forge API response bodies, by view.'),
+    'pulp_puppet_forge_cache_requests_total': (
+        'counter', 'Lookups in per-process caches, by cache and result.'),
+}
+
+# phases recorded by the forge API
+PHASE_BIND_LOOKUP = 'bind_lookup'
+PHASE_REPO_PATHS = 'repo_paths'
+PHASE_DB_OPEN = 'db_open'
+PHASE_DEPDATA_FETCH = 'depdata_fetch'
+PHASE_JSON_DECODE = 'json_decode'
+PHASE_DEPENDENCIES = 'dependencies'
+PHASE_SEARCH = 'search'
+PHASE_SERIALIZATION = 'serialization'
+
+# results of cache lookups
+CACHE_HIT = 'hit'
+CACHE_MISS = 'miss'
+
+# phase timers that are running in each thread, innermost last
+_running_phases = threading.local()
+
+
+class Registry(object):
+    """
+    Thread safe store of counters and summaries, keyed by metric name and labels.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.summaries = {}
+
+    def increment(self, name, labels=None, amount=1):
+        """
+        :param name:    name of a counter family
+        :type  name:    str
+        :param labels:  label names and values that identify the counter in the family
+        :type  labels:  dict
+        :param amount:  value to add to the counter
+        :type  amount:  int
+        """
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, labels=None):
+        """
+        :param name:    name of a summary family
+        :type  name:    str
+        :param value:   observed value
+        :type  value:   int or float
+        :param labels:  label names and values that identify the summary in the family
+        :type  labels:  dict
+        """
+        key = (name, _label_key(labels))
+        with self._lock:
+            summary = self.summaries.get(key)
+            if summary is None:
+                self.summaries[key] = [1, value, value]
+            else:
+                summary[0] += 1
+                summary[1] += value
+                if value > summary[2]:
+                    summary[2] = value
+
+    def reset(self):
+        """
+        Forget every recorded value.
+        """
+        with self._lock:
+            self.counters = {}
+            self.summaries = {}
+
+    def render(self):
+        """
+        :return:    every recorded value in the Prometheus text exposition format. Each
+                    summary is rendered with its "_count" and "_sum" samples, and its largest
+                    observation as a separate "_max" gauge.
+        :rtype:     str
+        """
+        with self._lock:
+            counters = dict(self.counters)
+            summaries = dict((key, list(value)) for key, value in self.summaries.iteritems())
+
+        lines = []
+        for name in sorted(FAMILIES):
+            metric_type, help_text = FAMILIES[name]
+            if metric_type == 'counter':
+                samples = sorted((key[1], value) for key, value in counters.iteritems()
+                                 if key[0] == name)
+                if not samples:
+                    continue
+                lines.append('# HELP %s %s' % (name, help_text))
+                lines.append('# TYPE %s counter' % name)
+                for labels, value in samples:
+                    lines.append('%s%s %s' % (name, _format_labels(labels), value))
+            else:
+                samples = sorted((key[1], value) for key, value in summaries.iteritems()
+                                 if key[0] == name)
+                if not samples:
+                    continue
+                lines.append('# HELP %s %s' % (name, help_text))
+                lines.append('# TYPE %s summary' % name)
+                for labels, (count, total, maximum) in samples:
+                    lines.append('%s_count%s %s' % (name, _format_labels(labels), count))
+                    lines.append('%s_sum%s %r' % (name, _format_labels(labels), float(total)))
+                lines.append('# HELP %s_max Largest observation of %s' % (name, name))
+                lines.append('# TYPE %s_max gauge' % name)
+                for labels, (count, total, maximum) in samples:
+                    lines.append('%s_max%s %r' % (name, _format_labels(labels), float(maximum)))
+        return '\n'.join(lines) + '\n'
+
+
+def _label_key(labels):
+    """
+    :param labels:  label names and values
+    :type  labels:  dict
+
+    :return:    hashable, ordered representation of the labels
+    :rtype:     tuple
+    """
+    if not labels:
+        return ()
+    return tuple(sorted(labels.iteritems()))
+
+
+def _format_labels(label_key):
+    """
+    :param label_key:   labels as returned by _label_key
+    :type  label_key:   tuple
+
+    :return:    labels formatted for the text exposition format
+    :rtype:     str
+    """
+    if not label_key:
+        return ''
+    pairs = []
+    for name, value in label_key:
+        value = unicode(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append('%s="%s"' % (name, value))
+    return '{%s}' % ','.join(pairs)
+
+
+REGISTRY = Registry()
+
+
+def increment(name, labels=None, amount=1):
+    """
+    Add to a counter of the process wide registry.
+
+    :param name:    name of a counter family
+    :type  name:    str
+    :param labels:  label names and values that identify the counter in the family
+    :type  labels:  dict
+    :param amount:  value to add to the counter
+    :type  amount:  int
+    """
+    REGISTRY.increment(name, labels, amount)
+
+
+def observe(name, value, labels=None):
+    """
+    Record an observation in a summary of the process wide registry.
+
+    :param name:    name of a summary family
+    :type  name:    str
+    :param value:   observed value
+    :type  value:   int or float
+    :param labels:  label names and values that identify the summary in the family
+    :type  labels:  dict
+    """
+    REGISTRY.observe(name, value, labels)
+
+
+def count_depdata_lookup(found):
+    """
+    Count a lookup of a module name in dependency data.
+
+    :param found:   True if the dependency data held the module
+    :type  found:   bool
+    """
+    REGISTRY.increment('pulp_puppet_forge_depdata_lookups_total',
+                       {'result': 'found' if found else 'missing'})
+
+
+def count_cache_lookup(cache_name, hit, amount=1):
+    """
+    Count lookups in a per-process cache.
+
+    :param cache_name:  name of the cache
+    :type  cache_name:  str
+    :param hit:         True if the cache held the requested values
+    :type  hit:         bool
+    :param amount:      number of lookups
+    :type  amount:      int
+    """
+    if amount:
+        REGISTRY.increment('pulp_puppet_forge_cache_requests_total',
+                           {'cache': cache_name, 'result': CACHE_HIT if hit else CACHE_MISS},
+                           amount)
+
+
+class timer(object):
+    """
+    Context manager that records how long its block takes as a phase of answering a request.
+    The time spent in phases nested in the block is left out of the phase's time.
+    """
+
+    __slots__ = ('name', 'labels', 'start', 'nested', 'phase')
+
+    def __init__(self, phase, name='pulp_puppet_forge_phase_seconds', labels=None):
+        """
+        :param phase:   name of the phase, recorded as the "phase" label. None leaves the
+                        label out.
+        :type  phase:   str
+        :param name:    name of the summary family to record the duration in
+        :type  name:    str
+        :param labels:  additional labels
+        :type  labels:  dict
+        """
+        self.name = name
+        self.labels = dict(labels or {})
+        self.phase = phase
+        if phase is not None:
+            self.labels['phase'] = phase
+        self.start = None
+        # time spent in the phases nested in this one
+        self.nested = 0.0
+
+    def __enter__(self):
+        if self.phase is not None:
+            stack = getattr(_running_phases, 'stack', None)
+            if stack is None:
+                stack = _running_phases.stack = []
+            stack.append(self)
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed = time.time() - self.start
+        if self.phase is not None:
+            stack = _running_phases.stack
+            stack.pop()
+            if stack:
+                stack[-1].nested += elapsed
+        REGISTRY.observe(self.name, elapsed - self.nested, self.labels)
+
+
+def instrumented_view(method):
+    """
+    Decorator for the request handling methods of forge views. It records how long each request
+    takes and the size of each response, labelled with the name of the view class.
+
+    :param method:  view method that accepts the request as its first argument after self
+    :type  method:  callable
+
+    :return:    the wrapped method
+    :rtype:     callable
+    """
+    @functools.wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        labels = {'view': self.__class__.__name__}
+        with timer(None, 'pulp_puppet_forge_request_seconds', labels):
+            response = method(self, request, *args, **kwargs)
+        if not getattr(response, 'streaming', False):
+            REGISTRY.observe('pulp_puppet_forge_response_bytes', len(response.content), labels)
+        return response
+    return wrapper
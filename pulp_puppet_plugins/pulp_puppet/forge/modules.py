@@ -0,0 +1,68 @@
+from gettext import gettext as _
+import logging
+import os.path
+
+from django.http import HttpResponse
+
+from pulp_puppet.common import constants
+from pulp_puppet.forge import metrics, releases, search
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def view(consumer_id, repo_id, query=None, tags=None):
+    """
+    produces data for the "v3/modules" search view
+
+    :param consumer_id: unique ID for a consumer
+    :type  consumer_id: str
+    :param repo_id:     unique ID for a repo
+    :type  repo_id:     str
+    :param query:       free text that matching modules' author, name, summary or
+                        tags must contain
+    :type  query:       str
+    :param tags:        tags that matching modules must have
+    :type  tags:        list
+
+    :return:    list of the newest release of each matching module, as dicts with
+                keys "author", "name", "version", "summary", "tags" and "file",
+                sorted by author and name
+    :rtype:     list
+    """
+    repo_ids = releases.get_repo_ids(consumer_id, repo_id)
+    if repo_ids is None:
+        # must provide either consumer ID or repo ID
+        return HttpResponse('Unauthorized', status=401)
+
+    newest = {}
+    for index in get_search_indexes(repo_ids):
+        with metrics.timer(metrics.PHASE_SEARCH):
+            for module in index.search(query, tags):
+                key = (module['author'], module['name'])
+                if key not in newest or search.is_newer(module, newest[key]):
+                    newest[key] = module
+    return [newest[name] for name in sorted(newest)]
+
+
+def get_search_indexes(repo_ids):
+    """
+    Load the search index of each repo. Repos that have not been published since
+    search indexes were introduced are skipped.
+
+    :param repo_ids: list of repository IDs.
+    :type  repo_ids: list
+
+    :return:    list of pulp_puppet.forge.search.SearchIndex instances
+    :rtype:     list
+    """
+    ret = []
+    for repo_id, repo_data in sorted(releases.get_repo_paths(repo_ids).iteritems()):
+        path = os.path.join(os.path.dirname(repo_data['path']),
+                            constants.REPO_SEARCH_INDEX_FILENAME)
+        try:
+            ret.append(search.load_index(path))
+        except (IOError, ValueError):
+            msg = _('failed to load search index for repo %(repo_id)s. re-publish to fix.')
+            _LOGGER.error(msg, {'repo_id': repo_id})
+    return ret
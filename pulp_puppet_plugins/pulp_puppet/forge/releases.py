@@ -4,16 +4,21 @@ import json
 import logging
 import os.path
 
+from django.conf import settings
 from django.http import HttpResponseNotFound, HttpResponse
 from pulp.server.db import model
-from pulp.server.managers.consumer.bind import BindManager
 
 from pulp_puppet.common import constants
+from pulp_puppet.forge import cache, merged_index, metrics
 from pulp_puppet.forge.unit import Unit
 
 
 _LOGGER = logging.getLogger(__name__)
 
+# Per-process caches. These are only enabled by the forge WSGI application, see enable_caches.
+REPO_PATH_INDEX = None
+DATABASE_CACHE = None
+
 
 def unit_generator(dbs, module_name, hostname):
     """
@@ -33,18 +38,59 @@ def unit_generator(dbs, module_name, hostname):
         protocol = data['protocol']
         db = data['db']
         try:
-            json_data = db[module_name]
+            with metrics.timer(metrics.PHASE_DEPDATA_FETCH):
+                json_data = db[module_name]
         except KeyError:
+            metrics.count_depdata_lookup(False)
             msg_dict = {'module': module_name, 'repo_id': repo_id}
             msg = _('module %(module)s not found in repo %(repo_id)s')
             _LOGGER.debug(msg, msg_dict)
             continue
-        units = json.loads(json_data)
+        metrics.count_depdata_lookup(True)
+        with metrics.timer(metrics.PHASE_JSON_DECODE):
+            units = json.loads(json_data)
         for unit in units:
             yield Unit(name=module_name, db=db, repo_id=repo_id, host=hostname, protocol=protocol,
                        **unit)
 
 
+def merged_unit_generator(dbs, module_name, hostname):
+    """
+    Generator to produce all units visible to the API caller from a merged dependency index.
+    A merged index holds the entries of several repositories under a single key, each entry
+    tagged with the repository it was published in.
+
+    :param dbs: The merged index data, as returned by get_merged_repo_data
+    :type dbs: dict
+    :param module_name: The module name to search for
+    :type module_name: str
+    :param hostname: The hostname of server serving modules
+    :type hostname: str
+
+    :return: A generator of pulp_puppet.forge.unit.Unit objects
+    :rtype: generator
+    """
+    for data in dbs.itervalues():
+        protocols = data['protocols']
+        db = data['db']
+        try:
+            with metrics.timer(metrics.PHASE_DEPDATA_FETCH):
+                json_data = db[module_name]
+        except KeyError:
+            metrics.count_depdata_lookup(False)
+            msg_dict = {'module': module_name, 'repo_ids': ', '.join(sorted(protocols))}
+            msg = _('module %(module)s not found in repos %(repo_ids)s')
+            _LOGGER.debug(msg, msg_dict)
+            continue
+        metrics.count_depdata_lookup(True)
+        with metrics.timer(metrics.PHASE_JSON_DECODE):
+            units = json.loads(json_data)
+        for unit in units:
+            repo_id = unit.pop(merged_index.REPO_ID_KEY)
+            yield Unit(name=module_name, db=db, repo_id=repo_id, host=hostname,
+                       protocol=protocols[repo_id], **unit)
+
+
 def view(consumer_id, repo_id, module_name, version=None, recurse_deps=True,
          view_all_matching=False, hostname=None):
     """
@@ -71,30 +117,34 @@ def view(consumer_id, repo_id, module_name, version=None, recurse_deps=True,
     :rtype:     dict
     """
     # Build the list of repositories that should be queried
-    if repo_id == constants.FORGE_NULL_AUTH_VALUE:
-        if consumer_id == constants.FORGE_NULL_AUTH_VALUE:
-            # must provide either consumer ID or repo ID
-            return HttpResponse('Unauthorized', status=401)
-        repo_ids = get_bound_repos(consumer_id)
-    else:
-        repo_ids = [repo_id]
+    repo_ids = get_repo_ids(consumer_id, repo_id)
+    if repo_ids is None:
+        # must provide either consumer ID or repo ID
+        return HttpResponse('Unauthorized', status=401)
 
     dbs = None
     return_data = None
     try:
-        # Get the list of database files to query
-        dbs = get_repo_data(repo_ids)
+        # Get the list of database files to query. Several repositories are served from a
+        # single merged index when one is configured.
+        if len(repo_ids) > 1:
+            dbs = get_merged_repo_data(repo_ids)
+        if dbs:
+            generate_units = merged_unit_generator
+        else:
+            dbs = get_repo_data(repo_ids)
+            generate_units = unit_generator
 
         # Build list of units to return
         ret = []
         # If a version was specified filter by that specific version of the module
         if version:
-            for unit in unit_generator(dbs, module_name, hostname):
+            for unit in generate_units(dbs, module_name, hostname):
                 if unit.version == version:
                     ret.append(unit)
                     break
         else:
-            units = list(unit_generator(dbs, module_name, hostname))
+            units = list(generate_units(dbs, module_name, hostname))
             # if view_all_matching then return all modules matching the query, otherwise
             # only return the first matching module (for forge v1 & v2 api compliance)
             if view_all_matching:
@@ -105,10 +155,11 @@ def view(consumer_id, repo_id, module_name, version=None, recurse_deps=True,
 
         # calculate dependencies for the units being returned & build the return structure
         return_data = {}
-        for unit in ret:
-            populated_unit = unit.build_dep_metadata(recurse_deps)
-            for unit_name, unit_details in populated_unit.iteritems():
-                return_data.setdefault(unit_name, []).extend(unit_details)
+        with metrics.timer(metrics.PHASE_DEPENDENCIES):
+            for unit in ret:
+                populated_unit = unit.build_dep_metadata(recurse_deps)
+                for unit_name, unit_details in populated_unit.iteritems():
+                    return_data.setdefault(unit_name, []).extend(unit_details)
 
         if not return_data:
             return HttpResponseNotFound()
@@ -130,6 +181,26 @@ def view(consumer_id, repo_id, module_name, version=None, recurse_deps=True,
     return return_data
 
 
+def get_repo_ids(consumer_id, repo_id):
+    """
+    Determine which repositories a forge API request should be answered from.
+
+    :param consumer_id: unique ID for a consumer
+    :type  consumer_id: str
+    :param repo_id:     unique ID for a repo
+    :type  repo_id:     str
+
+    :return:    list of repo IDs, or None if neither a consumer ID nor a repo ID
+                was provided
+    :rtype:     list
+    """
+    if repo_id == constants.FORGE_NULL_AUTH_VALUE:
+        if consumer_id == constants.FORGE_NULL_AUTH_VALUE:
+            return None
+        return get_bound_repos(consumer_id)
+    return [repo_id]
+
+
 # this just provides a convenient way to access each config key and value from
 # the following function
 PROTOCOL_CONFIG_KEYS = {
@@ -138,6 +209,53 @@ PROTOCOL_CONFIG_KEYS = {
 }
 
 
+def get_repo_paths(repo_ids):
+    """
+    Find the path to the gdbm database file associated with each repo plus that
+    repo's publish protocol. The per-process repo index is used when it is enabled.
+
+    :param repo_ids: list of repository IDs.
+    :type  repo_ids: list
+
+    :return:    dictionary where keys are repo IDs, and values are dicts that
+                contain the path to the gdbm database under key "path", and a
+                protocol under key "protocol".
+    :rtype:     dict
+    """
+    if REPO_PATH_INDEX is not None:
+        return REPO_PATH_INDEX.get(repo_ids)
+    return query_repo_paths(repo_ids)
+
+
+def query_repo_paths(repo_ids):
+    """
+    Query the database for the path to the gdbm database file associated with
+    each repo plus that repo's publish protocol
+
+    :param repo_ids: list of repository IDs, or None for every repository that
+                     has a puppet distributor
+    :type  repo_ids: list
+
+    :return:    dictionary where keys are repo IDs, and values are dicts that
+                contain the path to the gdbm database under key "path", and a
+                protocol under key "protocol".
+    :rtype:     dict
+    """
+    query = {'distributor_type_id': constants.DISTRIBUTOR_TYPE_ID}
+    if repo_ids is not None:
+        query['repo_id__in'] = repo_ids
+    ret = {}
+    with metrics.timer(metrics.PHASE_REPO_PATHS):
+        for distributor in model.Distributor.objects(**query):
+            publish_protocol = _get_protocol_from_distributor(distributor)
+            protocol_key, protocol_default_value = PROTOCOL_CONFIG_KEYS[publish_protocol]
+            repo_path = distributor['config'].get(protocol_key, protocol_default_value)
+            repo_id = distributor['repo_id']
+            db_path = os.path.join(repo_path, repo_id, constants.REPO_DEPDATA_FILENAME)
+            ret[repo_id] = {'path': db_path, 'protocol': publish_protocol}
+    return ret
+
+
 def get_repo_data(repo_ids):
     """
     Find, open, and return the gdbm database file associated with each repo
@@ -152,20 +270,92 @@ def get_repo_data(repo_ids):
     :rtype:     dict
     """
     ret = {}
-    for distributor in model.Distributor.objects(repo_id__in=repo_ids):
-        publish_protocol = _get_protocol_from_distributor(distributor)
-        protocol_key, protocol_default_value = PROTOCOL_CONFIG_KEYS[publish_protocol]
-        repo_path = distributor['config'].get(protocol_key, protocol_default_value)
-        repo_id = distributor['repo_id']
-        db_path = os.path.join(repo_path, repo_id, constants.REPO_DEPDATA_FILENAME)
+    for repo_id, repo_data in get_repo_paths(repo_ids).iteritems():
         try:
-            ret[repo_id] = {'db': gdbm.open(db_path, 'r'), 'protocol': publish_protocol}
+            ret[repo_id] = {'db': open_database(repo_data['path']),
+                            'protocol': repo_data['protocol']}
         except gdbm.error:
             _LOGGER.error(_('failed to find dependency database for repo %s. re-publish to fix.' %
                           repo_id))
     return ret
 
 
+def open_database(path):
+    """
+    Open a gdbm dependency database for reading. The database is shared with later
+    requests when the per-process database cache is enabled.
+
+    :param path: path to the gdbm database
+    :type  path: str
+
+    :return:    open database
+    :rtype:     gdbm.gdbm or pulp_puppet.forge.cache.SharedDatabase
+
+    :raise gdbm.error: if the database cannot be opened
+    """
+    with metrics.timer(metrics.PHASE_DB_OPEN):
+        if DATABASE_CACHE is not None:
+            return DATABASE_CACHE.open(path)
+        return gdbm.open(path, 'r')
+
+
+def enable_caches(repo_index_ttl, database_cache_size):
+    """
+    Enable the per-process caches of the repo index and of open dependency
+    databases. This is meant for long running forge worker processes.
+
+    :param repo_index_ttl:      number of seconds after which the repo index is
+                                reloaded; 0 disables the repo index
+    :type  repo_index_ttl:      int
+    :param database_cache_size: maximum number of dependency databases kept open;
+                                0 disables the database cache
+    :type  database_cache_size: int
+    """
+    global REPO_PATH_INDEX, DATABASE_CACHE
+    REPO_PATH_INDEX = None
+    DATABASE_CACHE = None
+    if repo_index_ttl:
+        REPO_PATH_INDEX = cache.RepoPathIndex(query_repo_paths, repo_index_ttl)
+    if database_cache_size:
+        DATABASE_CACHE = cache.DatabaseCache(database_cache_size)
+
+
+def get_merged_repo_data(repo_ids):
+    """
+    Open, building or rebuilding as needed, the merged dependency index covering
+    all of the given repos. Merged indexes are only used when the
+    PULP_PUPPET_MERGED_INDEX_DIR setting is configured.
+
+    :param repo_ids: list of repository IDs.
+    :type  repo_ids: list
+
+    :return:    dictionary with a single entry whose value is a dict that contains
+                the open merged index under key "db", and a dict of each member
+                repo's protocol keyed by repo ID under key "protocols". None is
+                returned if merged indexes are disabled or the index could not be
+                opened, in which case each repo's database should be queried instead.
+    :rtype:     dict
+    """
+    index_dir = getattr(settings, 'PULP_PUPPET_MERGED_INDEX_DIR', None)
+    if not index_dir:
+        return None
+
+    repo_paths = get_repo_paths(repo_ids)
+    db_paths = dict((repo_id, data['path']) for repo_id, data in repo_paths.iteritems())
+    try:
+        with metrics.timer(metrics.PHASE_DB_OPEN):
+            db = merged_index.open_index(index_dir, db_paths)
+    except (gdbm.error, IOError, OSError, ValueError):
+        msg = _('failed to open merged dependency index for repos %(repo_ids)s')
+        _LOGGER.exception(msg, {'repo_ids': ', '.join(sorted(repo_ids))})
+        return None
+    if db is None:
+        return None
+
+    protocols = dict((repo_id, data['protocol']) for repo_id, data in repo_paths.iteritems())
+    return {'merged': {'db': db, 'protocols': protocols}}
+
+
 def _get_protocol_from_distributor(distributor):
     """
     Look at a distributor's config and determine what protocol it gets published
@@ -198,8 +388,13 @@ def get_bound_repos(consumer_id):
     :return:    list of repo IDs
     :rtype:     list
     """
-    bindings = BindManager().find_by_consumer(consumer_id)
-    repos = [binding['repo_id']
-             for binding in bindings
-             if binding['distributor_id'] == constants.DISTRIBUTOR_TYPE_ID]
+    # the consumer managers pull in a large part of the Pulp server, so they are only
+    # imported once a consumer scoped request needs them
+    from pulp.server.managers.consumer.bind import BindManager
+
+    with metrics.timer(metrics.PHASE_BIND_LOOKUP):
+        bindings = BindManager().find_by_consumer(consumer_id)
+        repos = [binding['repo_id']
+                 for binding in bindings
+                 if binding['distributor_id'] == constants.DISTRIBUTOR_TYPE_ID]
     return repos
@@ -0,0 +1,205 @@
+"""
+Inverted index used to answer forge module searches.
+
+The index is built when a repository is published and stored next to its dependency
+database. Each forge worker loads it once, and reloads it after the repository is
+re-published, so that a search never touches the database.
+
+The stored document is JSON with three keys:
+
+* "modules" - list of the newest release of each module, as dicts with keys "author",
+  "name", "version", "summary", "tags" and "file"
+* "tokens" - maps each token found in a module's author, name, summary and tags to the
+  sorted positions of the matching modules in "modules"
+* "tags" - maps each tag to the sorted positions of the modules that have it
+"""
+
+import bisect
+import json
+import os
+import re
+import threading
+
+from pulp_puppet.common.version import version_key
+from pulp_puppet.forge import metrics
+
+
+TOKEN_PATTERN = re.compile('[a-z0-9]+')
+
+
+def tokenize(text):
+    """
+    Split text into lowercase alphanumeric tokens.
+
+    :param text:    text to split
+    :type  text:    basestring
+
+    :return:    list of tokens
+    :rtype:     list
+    """
+    if not text:
+        return []
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def build_index(modules):
+    """
+    Build the search index document for a list of module releases. Only the newest
+    release of each module is indexed.
+
+    :param modules: dicts with keys "author", "name", "version", "summary", "tags" and "file"
+    :type  modules: iterable
+
+    :return:    the search index document
+    :rtype:     dict
+    """
+    newest = {}
+    for module in modules:
+        key = (module['author'], module['name'])
+        if key not in newest or is_newer(module, newest[key]):
+            newest[key] = module
+
+    entries = [newest[name] for name in sorted(newest)]
+    tokens = {}
+    tags = {}
+    for position, entry in enumerate(entries):
+        words = set(tokenize(entry['author']))
+        words.update(tokenize(entry['name']))
+        words.update(tokenize(entry['summary']))
+        for tag in entry['tags']:
+            words.update(tokenize(tag))
+            tags.setdefault(tag.lower(), []).append(position)
+        for word in words:
+            tokens.setdefault(word, []).append(position)
+
+    return {'modules': entries, 'tokens': tokens, 'tags': tags}
+
+
+def write_index(path, modules):
+    """
+    Build the search index for a list of module releases and write it to a file.
+
+    :param path:    path of the file to write
+    :type  path:    str
+    :param modules: dicts with keys "author", "name", "version", "summary", "tags" and "file"
+    :type  modules: iterable
+    """
+    with open(path, 'w') as index_file:
+        json.dump(build_index(modules), index_file, separators=(',', ':'))
+
+
+def is_newer(module, other):
+    """
+    :param module:  module release with key "version"
+    :type  module:  dict
+    :param other:   release of the same module with key "version"
+    :type  other:   dict
+
+    :return:    True if module is a newer release than other
+    :rtype:     bool
+    """
+    return version_key(module['version']) > version_key(other['version'])
+
+
+class SearchIndex(object):
+    """
+    In-memory search index of one published repository.
+    """
+
+    def __init__(self, document):
+        """
+        :param document:    search index document, as built by build_index
+        :type  document:    dict
+        """
+        self.modules = document['modules']
+        self.postings = dict((token, frozenset(positions))
+                             for token, positions in document['tokens'].iteritems())
+        self.tokens = sorted(self.postings)
+        self.tags = dict((tag, frozenset(positions))
+                         for tag, positions in document['tags'].iteritems())
+
+    def search(self, query=None, tags=None):
+        """
+        Find the modules that match every token of the query and have every one of the
+        given tags. A query token matches any indexed token that it is a prefix of.
+
+        :param query:   free text query
+        :type  query:   basestring
+        :param tags:    tags the modules must have
+        :type  tags:    list
+
+        :return:    matching modules, as dicts with keys "author", "name", "version",
+                    "summary", "tags" and "file"
+        :rtype:     list
+        """
+        matches = None
+        for word in tokenize(query):
+            positions = self._prefix_positions(word)
+            matches = positions if matches is None else matches & positions
+            if not matches:
+                return []
+        for tag in tags or []:
+            positions = self.tags.get(tag.lower(), frozenset())
+            matches = positions if matches is None else matches & positions
+            if not matches:
+                return []
+        if matches is None:
+            return list(self.modules)
+        return [self.modules[position] for position in sorted(matches)]
+
+    def _prefix_positions(self, prefix):
+        """
+        :param prefix:  beginning of a token
+        :type  prefix:  str
+
+        :return:    positions of the modules with any token that starts with the prefix
+        :rtype:     frozenset
+        """
+        start = bisect.bisect_left(self.tokens, prefix)
+        end = bisect.bisect_left(self.tokens, prefix + u'\uffff', start)
+        if end - start == 1:
+            return self.postings[self.tokens[start]]
+        positions = set()
+        for token in self.tokens[start:end]:
+            positions.update(self.postings[token])
+        return frozenset(positions)
+
+
+_LOADED = {}
+_LOADED_LOCK = threading.Lock()
+
+
+def load_index(path):
+    """
+    Return the search index stored at the given path. Indexes stay loaded in this process
+    and are only read again after the file is replaced.
+
+    :param path:    path to a search index file
+    :type  path:    str
+
+    :return:    the loaded index
+    :rtype:     SearchIndex
+
+    :raise IOError: if the index cannot be read
+    :raise ValueError: if the file is not a valid index
+    """
+    try:
+        stat = os.stat(path)
+    except OSError, e:
+        raise IOError(str(e))
+    identity = (stat.st_ino, stat.st_mtime, stat.st_size)
+
+    loaded = _LOADED.get(path)
+    if loaded is not None and loaded[0] == identity:
+        metrics.count_cache_lookup('search_index', True)
+        return loaded[1]
+    metrics.count_cache_lookup('search_index', False)
+
+    with open(path) as index_file:
+        try:
+            index = SearchIndex(json.load(index_file))
+        except KeyError, e:
+            raise ValueError('search index %s lacks key %s' % (path, e))
+    with _LOADED_LOCK:
+        _LOADED[path] = (identity, index)
+    return index
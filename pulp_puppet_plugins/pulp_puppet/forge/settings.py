@@ -64,3 +64,41 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/1.4/howto/static-files/
 
 STATIC_URL = '/static/'
+
+
+# Pulp Puppet forge
+
+# Directory in which merged dependency indexes are kept for consumers bound to more than one
+# puppet repository, for example '/var/cache/pulp/puppet/forge'. The directory must be
+# writable by the web server user. When None, each bound repository's dependency database is
+# queried separately on every request.
+PULP_PUPPET_MERGED_INDEX_DIR = None
+
+# Name of the header used to hand module file downloads over to the front-end web server, for
+# example 'X-Sendfile' (Apache mod_xsendfile, lighttpd) or 'X-Accel-Redirect' (nginx). When
+# None, module files requested from the forge application are streamed by Python.
+PULP_PUPPET_SENDFILE_HEADER = None
+
+# URI prefix of an internal web server location that maps onto the directory repositories are
+# published to, for use with 'X-Accel-Redirect'. When None, the sendfile header carries the
+# absolute path to the file.
+PULP_PUPPET_SENDFILE_PREFIX = None
+
+# Number of seconds each forge process keeps its index of published repositories before
+# reloading it from the database. 0 queries the database on every request.
+PULP_PUPPET_REPO_INDEX_TTL = 60
+
+# Maximum number of dependency databases each forge process keeps open between requests.
+# 0 opens and closes the databases on every request.
+PULP_PUPPET_DATABASE_CACHE_SIZE = 32
+
+# IDs of the repositories whose dependency databases are opened when a forge process starts.
+# When empty, the databases of all published repositories are opened, up to
+# PULP_PUPPET_DATABASE_CACHE_SIZE.
+PULP_PUPPET_WARM_REPOS = ()
+
+# Client addresses allowed to read the forge metrics at /pulp_puppet/forge/metrics. Requests
+# from any other address are answered as if the page did not exist. Addresses are compared to
+# REMOTE_ADDR, which is the proxy's address for requests forwarded by a reverse proxy, so
+# allowing a proxy's address allows every client of that proxy. Empty denies every client.
+PULP_PUPPET_METRICS_ADDRESSES = ()
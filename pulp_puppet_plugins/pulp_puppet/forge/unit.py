@@ -4,6 +4,8 @@ import logging
 
 import semantic_version
 
+from pulp_puppet.forge import metrics
+
 _LOGGER = logging.getLogger(__name__)
 
 
@@ -148,6 +150,9 @@ class Unit(object):
         self.host = host
         self.protocol = protocol
         self.file_md5 = file_md5
+        # current and deepest level of dependency recursion while building dependency metadata
+        self._depth = 0
+        self._max_depth = 0
 
     @classmethod
     def units_from_json(cls, name, db, repo_id, host, protocol):
@@ -172,16 +177,23 @@ class Unit(object):
         :rtype:     list
         """
         try:
-            json_data = db[name]
+            with metrics.timer(metrics.PHASE_DEPDATA_FETCH):
+                json_data = db[name]
         except KeyError:
+            metrics.count_depdata_lookup(False)
             msg = _('module %(name)s not found in repo %(repo_id)s')
             msg_dict = {'name': name, 'repo_id': repo_id}
             _LOGGER.debug(msg, msg_dict)
             return []
-        units = json.loads(json_data)
+        metrics.count_depdata_lookup(True)
+        with metrics.timer(metrics.PHASE_JSON_DECODE):
+            units = json.loads(json_data)
+        # entries from a merged dependency index carry the ID of the repository they were
+        # published in; dependencies are only ever resolved within the unit's own repository
         return [
             cls(name=name, db=db, repo_id=repo_id, host=host, protocol=protocol, **unit)
             for unit in units
+            if unit.pop('repo_id', repo_id) == repo_id
         ]
 
     def build_dep_metadata(self, recurse_deps=True):
@@ -198,8 +210,11 @@ class Unit(object):
         :rtype:     dict
         """
         root = {self.name: [self.to_dict()]}
+        self._depth = 0
+        self._max_depth = 0
         for dep in self.dependencies:
             self._add_dep_to_metadata(dep['name'], root, recurse_deps=recurse_deps)
+        metrics.observe('pulp_puppet_forge_dependency_depth', self._max_depth)
         return root
 
     def _add_dep_to_metadata(self, name, root, recurse_deps=True):
@@ -219,12 +234,19 @@ class Unit(object):
         :return:    None
         """
         if name not in root:
-            units = self.units_from_json(name, self.db, self.repo_id, self.host, self.protocol)
-            root[name] = [unit.to_dict() for unit in units]
-            for unit in units:
-                for dep in unit.dependencies:
-                    if recurse_deps:
-                        self._add_dep_to_metadata(dep['name'], root)
+            # track how deep the recursion goes, for the dependency depth metric
+            self._depth += 1
+            self._max_depth = max(self._max_depth, self._depth)
+            try:
+                units = self.units_from_json(name, self.db, self.repo_id, self.host,
+                                             self.protocol)
+                root[name] = [unit.to_dict() for unit in units]
+                for unit in units:
+                    for dep in unit.dependencies:
+                        if recurse_deps:
+                            self._add_dep_to_metadata(dep['name'], root)
+            finally:
+                self._depth -= 1
 
     @property
     def _deps_as_list(self):
@@ -1,4 +1,7 @@
 from django.conf.urls import url
+from pulp_puppet.forge.views.files import ModuleFileView
+from pulp_puppet.forge.views.metrics import MetricsView
+from pulp_puppet.forge.views.modules import ModulesView
 from pulp_puppet.forge.views.releases import ReleasesView, ReleasesPost36View
 
 urlpatterns = [
@@ -7,5 +10,11 @@ urlpatterns = [
         name='post_33_releases'),
     url(r'^api/v1/releases.json', ReleasesView.as_view(),
         name='pre_33_releases'),
-    url(r'^v3/releases', ReleasesPost36View.as_view(), name='post_36_releases')
+    url(r'^v3/releases', ReleasesPost36View.as_view(), name='post_36_releases'),
+    url(r'^pulp_puppet/forge/([^/]+)/([^/]+)/v3/modules/?$', ModulesView.as_view(),
+        name='post_33_modules'),
+    url(r'^v3/modules/?$', ModulesView.as_view(), name='modules'),
+    url(r'^pulp_puppet/forge/metrics$', MetricsView.as_view(), name='metrics'),
+    url(r'^(?:.*/)?([^/]+)/(system/releases/[^/]+/[^/]+/[^/]+\.tar\.gz)$',
+        ModuleFileView.as_view(), name='module_file')
 ]
@@ -0,0 +1,104 @@
+from gettext import gettext as _
+import logging
+import os
+from wsgiref.util import FileWrapper
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotFound, StreamingHttpResponse
+from django.views.generic import View
+
+from pulp_puppet.forge import releases
+
+
+_LOGGER = logging.getLogger(__name__)
+
+MODULE_FILE_CONTENT_TYPE = 'application/x-gzip'
+
+
+class ModuleFileView(View):
+    """
+    Serves module tarballs out of the published repository tree.
+
+    The "file" and "file_uri" values returned by the releases views point into the published
+    tree, which is normally served directly by the web server. Deployments that route every
+    request through the forge application end up here instead. When the
+    PULP_PUPPET_SENDFILE_HEADER setting is configured, the transfer is handed back to the
+    front-end web server with that header, so the tarball bytes never pass through Python.
+    """
+
+    def get(self, request, repo_id, relative_path):
+        """
+        Resolve a module file through the published tree of the given repository and serve it.
+
+        :param request: the incoming request
+        :type  request: django.http.HttpRequest
+        :param repo_id: ID of the repository the file was published in
+        :type  repo_id: str
+        :param relative_path: path of the file relative to the published repository
+        :type  relative_path: str
+
+        :return: a response that transfers the module file
+        :rtype:  django.http.HttpResponse
+        """
+        file_path = self._resolve_file(repo_id, relative_path)
+        if file_path is None:
+            return HttpResponseNotFound()
+
+        header = getattr(settings, 'PULP_PUPPET_SENDFILE_HEADER', None)
+        if header:
+            response = HttpResponse(content_type=MODULE_FILE_CONTENT_TYPE)
+            response[header] = self._sendfile_location(file_path, repo_id, relative_path)
+        else:
+            response = StreamingHttpResponse(FileWrapper(open(file_path, 'rb')),
+                                             content_type=MODULE_FILE_CONTENT_TYPE)
+            response['Content-Length'] = os.path.getsize(file_path)
+        response['Content-Disposition'] = 'attachment; filename=%s' % os.path.basename(file_path)
+        return response
+
+    @staticmethod
+    def _resolve_file(repo_id, relative_path):
+        """
+        Find the absolute path of a module file within a repository's published tree.
+
+        :param repo_id: ID of the repository the file was published in
+        :type  repo_id: str
+        :param relative_path: path of the file relative to the published repository
+        :type  relative_path: str
+
+        :return: absolute path to the file, or None if the repository is not published or the
+                 path does not name a file inside of it
+        :rtype:  str
+        """
+        repo_paths = releases.get_repo_paths([repo_id])
+        if repo_id not in repo_paths:
+            return None
+        repo_dir = os.path.dirname(repo_paths[repo_id]['path']) + '/'
+        file_path = os.path.normpath(os.path.join(repo_dir, relative_path))
+        if not file_path.startswith(repo_dir) or not os.path.isfile(file_path):
+            msg = _('module file %(path)s not found in repo %(repo_id)s')
+            _LOGGER.debug(msg, {'path': relative_path, 'repo_id': repo_id})
+            return None
+        return file_path
+
+    @staticmethod
+    def _sendfile_location(file_path, repo_id, relative_path):
+        """
+        Build the value of the sendfile header. Without a configured
+        PULP_PUPPET_SENDFILE_PREFIX this is the absolute path to the file, as expected by
+        "X-Sendfile". Otherwise it is a URI beneath that prefix, as expected by nginx's
+        "X-Accel-Redirect".
+
+        :param file_path: absolute path to the file
+        :type  file_path: str
+        :param repo_id: ID of the repository the file was published in
+        :type  repo_id: str
+        :param relative_path: path of the file relative to the published repository
+        :type  relative_path: str
+
+        :return: value for the sendfile header
+        :rtype:  str
+        """
+        prefix = getattr(settings, 'PULP_PUPPET_SENDFILE_PREFIX', None)
+        if not prefix:
+            return file_path
+        return '%s/%s/%s' % (prefix.rstrip('/'), repo_id, os.path.normpath(relative_path))
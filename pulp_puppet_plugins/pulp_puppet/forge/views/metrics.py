@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotFound
+from django.views.generic import View
+
+from pulp_puppet.forge import metrics
+
+
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class MetricsView(View):
+    """
+    Exposes the forge API timers and counters of the answering worker process in the
+    Prometheus text exposition format.
+
+    The page is only served to the addresses in the PULP_PUPPET_METRICS_ADDRESSES setting,
+    which by default denies every client.
+    """
+
+    def get(self, request):
+        """
+        :param request: the incoming request
+        :type  request: django.http.HttpRequest
+
+        :return: the metrics of this process, or a 404 for clients that may not read them
+        :rtype:  django.http.HttpResponse
+        """
+        allowed = getattr(settings, 'PULP_PUPPET_METRICS_ADDRESSES', ())
+        if request.META.get('REMOTE_ADDR') not in allowed:
+            return HttpResponseNotFound()
+        return HttpResponse(metrics.REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
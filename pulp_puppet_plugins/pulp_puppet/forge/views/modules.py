@@ -0,0 +1,113 @@
+import urllib
+
+from django.http import HttpResponse, HttpResponseBadRequest
+from pulp.server.webservices.views.util import generate_json_response
+
+from pulp_puppet.forge import metrics, modules
+from pulp_puppet.forge.views.releases import ReleasesView
+
+
+class ModulesView(ReleasesView):
+    """
+    Answers forge v3 module searches, such as those made by "puppet module search".
+
+    Searches are answered from the search index built when each repository was published,
+    which every worker keeps loaded, so no database is queried for them.
+    """
+
+    @metrics.instrumented_view
+    def get(self, request, resource_type=None, resource=None):
+        """
+        The repository or consumer to search is identified the same way as for the
+        releases views.
+
+        Supported query parameters are "query", free text that a module's author, name,
+        summary or tags must contain, "tag", which may be repeated and names tags a module
+        must have, and "limit" and "offset" for pagination.
+        """
+        credentials = self._resolve_credentials(request, resource_type, resource)
+        if isinstance(credentials, HttpResponse):
+            return credentials
+
+        query = request.GET.get('query', '')
+        tags = request.GET.getlist('tag')
+        try:
+            limit = int(request.GET.get('limit', 20))
+            offset = int(request.GET.get('offset', 0))
+        except ValueError:
+            return HttpResponseBadRequest('Invalid pagination parameters.')
+        if limit < 1 or offset < 0:
+            return HttpResponseBadRequest('Invalid pagination parameters.')
+
+        data = modules.view(*credentials, query=query, tags=tags)
+        if isinstance(data, HttpResponse):
+            return data
+
+        def page_path(page_offset):
+            query_args = [('query', query)] + [('tag', tag) for tag in tags]
+            query_args += [('offset', page_offset), ('limit', limit)]
+            return '%s?%s' % (request.path_info, urllib.urlencode(query_args))
+
+        with metrics.timer(metrics.PHASE_SERIALIZATION):
+            return self._format_results(data, page_path, limit, offset)
+
+    def _format_results(self, data, page_path, limit, offset):
+        """
+        Format a page of search results the way the forge v3 API does.
+
+        :param data: the modules found by the search
+        :type data: list
+        :param page_path: callable that returns the path to the page at a given offset
+        :type page_path: callable
+        :param limit: The max number of items to show on a page
+        :type limit: int
+        :param offset: offset of the page to show
+        :type offset: int
+        :return: the response that carries the page of results
+        :rtype: django.http.HttpResponse
+        """
+        total_count = len(data)
+        formatted_results = {
+            'pagination': {
+                'limit': limit,
+                'offset': offset,
+                'first': page_path(0),
+                'previous': page_path(max(offset - limit, 0)) if offset > 0 else None,
+                'current': page_path(offset),
+                'next': page_path(offset + limit) if total_count > offset + limit else None,
+                'total': total_count
+            },
+            'results': [self._format_module(module) for module in data[offset:offset + limit]]
+        }
+        return generate_json_response(formatted_results)
+
+    @staticmethod
+    def _format_module(module):
+        """
+        Format a module found by a search the way the forge v3 API does.
+
+        :param module: A dictionary with the module's information from the search index
+        :type module: dict
+        :return: A dictionary containing module information of interest to the caller
+        :rtype: dict
+        """
+        slug = '%s-%s' % (module['author'], module['name'])
+        return {
+            'uri': '/v3/modules/%s' % slug,
+            'slug': slug,
+            'name': module['name'],
+            'owner': {
+                'username': module['author'],
+                'slug': module['author']
+            },
+            'current_release': {
+                'version': module['version'],
+                'file_uri': module['file'],
+                'metadata': {
+                    'name': slug,
+                    'version': module['version'],
+                    'summary': module['summary'],
+                    'tags': module['tags']
+                }
+            }
+        }
@@ -6,7 +6,7 @@ from django.http import HttpResponseNotFound, HttpResponse, HttpResponseBadReque
 from django.views.generic import View
 from pulp.server.webservices.views.util import generate_json_response
 
-from pulp_puppet.forge import releases
+from pulp_puppet.forge import metrics, releases
 
 
 MODULE_PATTERN = re.compile('(^[a-zA-Z0-9]+)(/|-)([a-zA-Z0-9_]+)$')
@@ -19,6 +19,7 @@ class ReleasesView(View):
     REPO_RESOURCE = 'repository'
     CONSUMER_RESOURCE = 'consumer'
 
+    @metrics.instrumented_view
     def get(self, request, resource_type=None, resource=None):
         """
         Credentials here are not actually used for authorization, but instead
@@ -32,18 +33,9 @@ class ReleasesView(View):
         repository IDs in the URL's path.
         """
         hostname = request.get_host()
-        if resource_type is not None:
-            if resource_type == self.REPO_RESOURCE:
-                credentials = ('.', resource)
-            elif resource_type == self.CONSUMER_RESOURCE:
-                credentials = (resource, '.')
-            else:
-                return HttpResponseNotFound()
-
-        else:
-            credentials = self._get_credentials(request.META)
-            if not credentials:
-                return HttpResponse('Unauthorized', status=401)
+        credentials = self._resolve_credentials(request, resource_type, resource)
+        if isinstance(credentials, HttpResponse):
+            return credentials
 
         get_dict = self._get_parameters(request.GET, request.path_info)
         if isinstance(get_dict, HttpResponse):
@@ -55,7 +47,8 @@ class ReleasesView(View):
                                  hostname=hostname)
         if isinstance(data, HttpResponse):
             return data
-        return self.format_results(data, get_dict, request.path_info)
+        with metrics.timer(metrics.PHASE_SERIALIZATION):
+            return self.format_results(data, get_dict, request.path_info)
 
     def get_releases(self, *args, **kwargs):
         """
@@ -79,6 +72,34 @@ class ReleasesView(View):
         """
         return generate_json_response(data)
 
+    def _resolve_credentials(self, request, resource_type, resource):
+        """
+        Determine the consumer ID and repository ID a request is made for, either from the
+        URL's path or from the basic auth credentials.
+
+        :param request: the incoming request
+        :type  request: django.http.HttpRequest
+        :param resource_type: "repository" or "consumer" when given in the URL's path
+        :type  resource_type: str
+        :param resource: repository ID or consumer ID when given in the URL's path
+        :type  resource: str
+
+        :return: consumer ID and repository ID, either of which may be the null auth value,
+                 or an HttpResponse if they could not be determined
+        :rtype:  tuple
+        """
+        if resource_type is not None:
+            if resource_type == self.REPO_RESOURCE:
+                return '.', resource
+            elif resource_type == self.CONSUMER_RESOURCE:
+                return resource, '.'
+            return HttpResponseNotFound()
+
+        credentials = self._get_credentials(request.META)
+        if not credentials:
+            return HttpResponse('Unauthorized', status=401)
+        return credentials
+
     @staticmethod
     def _get_credentials(headers):
         """
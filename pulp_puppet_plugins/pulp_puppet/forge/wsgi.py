@@ -9,12 +9,12 @@ https://docs.djangoproject.com/en/1.6/howto/deployment/wsgi/
 
 import os
 import logging
+import time
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pulp_puppet.forge.settings")
 
+from django.conf import settings  # noqa: E402
 from django.core.wsgi import get_wsgi_application  # noqa: E402
-from pulp.server.webservices.application import SaveEnvironWSGIHandler  # noqa: E402
-from pulp.server import initialization, logs  # noqa: E402
 
 
 def wsgi_application():
@@ -24,6 +24,11 @@ def wsgi_application():
 
     :return: wsgi application callable
     """
+    # The Pulp server stack is imported here rather than at module level so that importing
+    # this module does not pay for it until an application is actually created.
+    from pulp.server.webservices.application import SaveEnvironWSGIHandler
+    from pulp.server import initialization, logs
+
     try:
         logger = logging.getLogger(__name__)
         logs.start_logging()
@@ -36,13 +41,105 @@ def wsgi_application():
         raise e
     except Exception as e:
         logger.fatal('*************************************************************')
-        logger.exception('The Pulp Puppet Forge encountered an unexpected failure during ' /
+        logger.exception('The Pulp Puppet Forge encountered an unexpected failure during '
                          'initialization')
         logger.fatal('*************************************************************')
         raise e
 
+    application = SaveEnvironWSGIHandler(get_wsgi_application())
+    warm_up()
+
     logger.info('*************************************************************')
     logger.info('The Pulp Puppet Forge has been successfully initialized')
     logger.info('*************************************************************')
 
-    return SaveEnvironWSGIHandler(get_wsgi_application())
+    return application
+
+
+def warm_up():
+    """
+    Prepare this worker process to answer requests without a cold start. The process wide
+    caches are enabled, the index of published repositories is loaded, and the dependency
+    databases and search indexes of the repositories configured in PULP_PUPPET_WARM_REPOS are
+    loaded. When no repositories are configured, those of all published repositories are
+    loaded, up to the size of the database cache.
+
+    A failure in any phase is logged and does not prevent the application from starting,
+    since every cache is filled on demand by requests anyway.
+
+    :return: duration in seconds of each warm-up phase, keyed by phase name
+    :rtype:  dict
+    """
+    logger = logging.getLogger(__name__)
+    timings = {}
+
+    def run_phase(name, phase):
+        start = time.time()
+        try:
+            return phase()
+        except Exception:
+            logger.exception('Pulp Puppet Forge warm-up phase "%(phase)s" failed',
+                             {'phase': name})
+        finally:
+            timings[name] = time.time() - start
+            logger.info('Pulp Puppet Forge warm-up phase "%(phase)s" took %(seconds).3f seconds',
+                        {'phase': name, 'seconds': timings[name]})
+
+    releases = run_phase('import', _import_releases)
+    if releases is None:
+        return timings
+
+    releases.enable_caches(getattr(settings, 'PULP_PUPPET_REPO_INDEX_TTL', 0),
+                           getattr(settings, 'PULP_PUPPET_DATABASE_CACHE_SIZE', 0))
+    if releases.REPO_PATH_INDEX is not None:
+        run_phase('repo index', releases.REPO_PATH_INDEX.load)
+    if releases.DATABASE_CACHE is not None:
+        repo_ids = run_phase('dependency databases', lambda: _open_warm_databases(releases))
+        if repo_ids:
+            run_phase('search indexes', lambda: _load_warm_search_indexes(repo_ids))
+    return timings
+
+
+def _import_releases():
+    """
+    Import the module that answers forge API requests, along with the parts of the Pulp
+    server it uses.
+
+    :return: the pulp_puppet.forge.releases module
+    :rtype:  module
+    """
+    from pulp_puppet.forge import releases
+    return releases
+
+
+def _open_warm_databases(releases):
+    """
+    Open the dependency databases of the repositories that should be warm in the database
+    cache.
+
+    :param releases: the pulp_puppet.forge.releases module
+    :type  releases: module
+
+    :return: IDs of the repositories whose databases were opened
+    :rtype:  list
+    """
+    repo_ids = list(getattr(settings, 'PULP_PUPPET_WARM_REPOS', None) or [])
+    if not repo_ids:
+        if releases.REPO_PATH_INDEX is not None:
+            repo_ids = sorted(releases.REPO_PATH_INDEX.repos)
+        else:
+            repo_ids = sorted(releases.query_repo_paths(None))
+    repo_ids = repo_ids[:releases.DATABASE_CACHE.size]
+    releases.get_repo_data(repo_ids)
+    return repo_ids
+
+
+def _load_warm_search_indexes(repo_ids):
+    """
+    Load the search indexes of the repositories whose dependency databases were opened.
+
+    :param repo_ids: IDs of the repositories to load search indexes for
+    :type  repo_ids: list
+    """
+    from pulp_puppet.forge import modules
+    modules.get_search_indexes(repo_ids)
@@ -100,6 +100,8 @@ class Module(FileContentUnit):
     meta = {
         'allow_inheritance': False,
         'collection': 'units_puppet_module',
+        # uploads look up modules by checksum to avoid storing identical tarballs twice
+        'indexes': ['checksum'],
     }
 
     @classmethod
@@ -0,0 +1,235 @@
+"""
+Content addressed cache of extracted module trees, shared by install distributors.
+
+Many repositories contain the same versions of common modules, and every install
+distributor would otherwise decompress its own copy of them. The cache keeps one extracted
+tree per module checksum. A distributor that installs a module that is already cached
+recreates the tree in its destination with hard links to the cached files, which only
+costs a directory walk.
+
+Every cached file that is also installed somewhere has more than one link, which is what
+eviction uses to tell whether an entry is still referenced. Entries are evicted least
+recently used first, and only while they are not referenced by any install, until the
+cache fits its size limit.
+
+Entries are created in a temporary directory and renamed into place, and are renamed
+away before they are removed, so that processes sharing the cache only ever see complete
+entries.
+"""
+
+import errno
+import logging
+import os
+import shutil
+import tempfile
+from gettext import gettext as _
+
+
+_LOGGER = logging.getLogger(__name__)
+
+# name of the extracted module tree within a cache entry
+TREE_DIRNAME = 'tree'
+
+# name of the file within a cache entry that holds the size of its tree in bytes
+SIZE_FILENAME = 'size'
+
+
+def link_tree(source, destination):
+    """
+    Recreate a directory tree with hard links to the files of the source tree, which is
+    much cheaper than copying them. Files are copied instead when the two trees are on
+    different filesystems.
+
+    :param source:      absolute path to the directory to recreate
+    :type  source:      str
+    :param destination: absolute path at which to recreate it, which must not exist
+    :type  destination: str
+
+    :return:    total size in bytes of the files in the tree
+    :rtype:     int
+    """
+    size = 0
+    for root, dirs, files in os.walk(source):
+        target = os.path.normpath(os.path.join(destination, os.path.relpath(root, source)))
+        os.mkdir(target)
+        shutil.copymode(root, target)
+        for name in list(dirs):
+            # os.walk does not descend into symlinks to directories
+            if os.path.islink(os.path.join(root, name)):
+                dirs.remove(name)
+                files.append(name)
+        for name in files:
+            path = os.path.join(root, name)
+            if os.path.islink(path):
+                os.symlink(os.readlink(path), os.path.join(target, name))
+                continue
+            try:
+                os.link(path, os.path.join(target, name))
+            except OSError, e:
+                if e.errno != errno.EXDEV:
+                    raise
+                shutil.copy2(path, os.path.join(target, name))
+            size += os.lstat(path).st_size
+    return size
+
+
+class ExtractionCache(object):
+    """
+    A directory of extracted module trees, keyed by module checksum.
+    """
+
+    def __init__(self, path, max_size):
+        """
+        :param path:        absolute path to the cache directory
+        :type  path:        str
+        :param max_size:    size in bytes that the cached trees should not exceed
+        :type  max_size:    int
+        """
+        self.path = path
+        self.max_size = max_size
+
+    def entry_path(self, checksum):
+        """
+        :param checksum:    checksum of a module's tarball
+        :type  checksum:    str
+
+        :return:    absolute path to the cache entry of the module
+        :rtype:     str
+        """
+        return os.path.join(self.path, checksum)
+
+    def materialize(self, checksum, destination):
+        """
+        Recreate a cached module tree at the destination.
+
+        :param checksum:    checksum of the module's tarball
+        :type  checksum:    str
+        :param destination: absolute path at which to create the module directory, which
+                            must not exist
+        :type  destination: str
+
+        :return:    True if the module was cached and is now at the destination, else False
+        :rtype:     bool
+        """
+        entry = self.entry_path(checksum)
+        tree = os.path.join(entry, TREE_DIRNAME)
+        if not os.path.isdir(tree):
+            return False
+        try:
+            link_tree(tree, destination)
+            # the modification time of an entry records when it was last used
+            os.utime(entry, None)
+        except (IOError, OSError), e:
+            # most likely evicted by another process while it was being linked
+            msg = _('failed to install module from extraction cache entry %(entry)s: %(exc)s')
+            _LOGGER.debug(msg, {'entry': entry, 'exc': e})
+            shutil.rmtree(destination, ignore_errors=True)
+            return False
+        return True
+
+    def add(self, checksum, source):
+        """
+        Add an extracted module tree to the cache. The cache entry is created with hard
+        links to the source files. Failing to add it is logged, but not raised, since the
+        module was installed regardless.
+
+        :param checksum:    checksum of the module's tarball
+        :type  checksum:    str
+        :param source:      absolute path to the extracted module directory
+        :type  source:      str
+        """
+        entry = self.entry_path(checksum)
+        if os.path.isdir(entry):
+            return
+        try:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path)
+            staging = tempfile.mkdtemp(prefix='.adding-', dir=self.path)
+        except OSError, e:
+            msg = _('failed to create extraction cache at %(path)s: %(exc)s')
+            _LOGGER.warn(msg, {'path': self.path, 'exc': e})
+            return
+        try:
+            size = link_tree(source, os.path.join(staging, TREE_DIRNAME))
+            with open(os.path.join(staging, SIZE_FILENAME), 'w') as size_file:
+                size_file.write(str(size))
+            os.chmod(staging, 0755)
+            os.rename(staging, entry)
+        except (IOError, OSError), e:
+            # another process may have added the same module in the meantime
+            if not os.path.isdir(entry):
+                msg = _('failed to add %(source)s to extraction cache: %(exc)s')
+                _LOGGER.warn(msg, {'source': source, 'exc': e})
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def evict(self):
+        """
+        Remove least recently used entries that no install references, until the cached
+        trees fit the size limit or only referenced entries are left.
+        """
+        entries = []
+        total = 0
+        for name in self._entry_names():
+            entry = self.entry_path(name)
+            try:
+                with open(os.path.join(entry, SIZE_FILENAME)) as size_file:
+                    size = int(size_file.read())
+                mtime = os.stat(entry).st_mtime
+            except (IOError, OSError, ValueError):
+                continue
+            entries.append((mtime, name, size))
+            total += size
+
+        for mtime, name, size in sorted(entries):
+            if total <= self.max_size:
+                break
+            entry = self.entry_path(name)
+            if self._is_referenced(entry):
+                continue
+            msg = _('evicting %(entry)s from extraction cache')
+            _LOGGER.debug(msg, {'entry': entry})
+            self._remove(entry)
+            total -= size
+
+    def _entry_names(self):
+        """
+        :return:    names of the complete entries in the cache
+        :rtype:     list of str
+        """
+        try:
+            names = os.listdir(self.path)
+        except OSError:
+            return []
+        return [name for name in names if not name.startswith('.')]
+
+    @staticmethod
+    def _is_referenced(entry):
+        """
+        :param entry:   absolute path to a cache entry
+        :type  entry:   str
+
+        :return:    True if any file in the entry's tree is also linked from elsewhere
+        :rtype:     bool
+        """
+        for root, dirs, files in os.walk(os.path.join(entry, TREE_DIRNAME)):
+            for name in files:
+                try:
+                    if os.lstat(os.path.join(root, name)).st_nlink > 1:
+                        return True
+                except OSError:
+                    continue
+        return False
+
+    def _remove(self, entry):
+        """
+        Remove a cache entry, renaming it away first so that it disappears at once.
+
+        :param entry:   absolute path to a cache entry
+        :type  entry:   str
+        """
+        trash = tempfile.mkdtemp(prefix='.removing-', dir=self.path)
+        try:
+            os.rename(entry, os.path.join(trash, 'entry'))
+        except OSError:
+            pass
+        shutil.rmtree(trash, ignore_errors=True)
@@ -1,18 +1,22 @@
 import errno
 from gettext import gettext as _
+import json
 import logging
+from multiprocessing.pool import ThreadPool
 import os
 import shutil
 import tarfile
 import tempfile
+import time
 
 from pulp.plugins.distributor import Distributor
 from pulp.server.controllers import repository as repo_controller
 from pulp.plugins.util.misc import get_parent_directory, mkdir
 
 from pulp_puppet.common import constants
+from pulp_puppet.common.tarball import NormalizingTarInfo, safe_members
+from pulp_puppet.plugins.distributors import extraction_cache
 
-ERROR_MESSAGE_PATH = 'one or more units contains a path outside its base extraction path'
 _LOGGER = logging.getLogger(__name__)
 
 
@@ -27,45 +31,12 @@ def entry_point():
     return PuppetModuleInstallDistributor, {}
 
 
-class NormalizingTarInfo(tarfile.TarInfo):
-    """
-    Use this class with a call to tarfile.open(). It ensures that the uid and gid of extracted files
-    get set to the values of the current process, and that the permissions on files and dirs get
-    the below minimum values.
-
-    Specifically, it is important to guarantee that puppet can read the extracted files.
-    """
-    min_file_perms = int('0644', base=8)
-    min_dir_perms = int('0755', base=8)
-
-    @classmethod
-    def fromtarfile(cls, *args, **kwargs):
-        """
-        This removes the uid and gid from the returned TarInfo file, causing those values to be set
-        based on the process currently running.
-
-        This also adds a basic level of filesystem permissions to each file and directory extracted,
-        to ensure that they can be accessed and moved around as required.
-
-        :return:    a new TarInfo instance representing a file in an archive
-        :rtype:     tarfile.TarInfo
-        """
-        ret = super(NormalizingTarInfo, cls).fromtarfile(*args, **kwargs)
-        # this causes the uid and gid to be set matching the process doing the extraction
-        ret.uid = 0
-        ret.gid = 0
-        if ret.isfile():
-            ret.mode |= cls.min_file_perms
-        elif ret.isdir():
-            ret.mode |= cls.min_dir_perms
-        return ret
-
-
 class PuppetModuleInstallDistributor(Distributor):
 
     def __init__(self):
         super(PuppetModuleInstallDistributor, self).__init__()
         self.detail_report = DetailReport()
+        self.extraction_cache = None
 
     @classmethod
     def metadata(cls):
@@ -102,13 +73,46 @@ class PuppetModuleInstallDistributor(Distributor):
                             ' distributor.')
         if not os.path.isabs(path):
             return False, _('install path is not absolute')
+        workers = config.get(constants.CONFIG_INSTALL_WORKERS)
+        if workers is not None:
+            try:
+                workers = int(workers)
+            except (TypeError, ValueError):
+                workers = 0
+            if workers < 1:
+                return False, _('%(key)s must be a positive integer') % {
+                    'key': constants.CONFIG_INSTALL_WORKERS}
+        cache_dir = config.get(constants.CONFIG_EXTRACTION_CACHE_DIR)
+        if cache_dir is not None:
+            if not isinstance(cache_dir, basestring) or not os.path.isabs(cache_dir):
+                return False, _('%(key)s must be an absolute path') % {
+                    'key': constants.CONFIG_EXTRACTION_CACHE_DIR}
+        max_size = config.get(constants.CONFIG_EXTRACTION_CACHE_MAX_SIZE)
+        if max_size is not None:
+            try:
+                max_size = int(max_size)
+            except (TypeError, ValueError):
+                max_size = -1
+            if max_size < 0:
+                return False, _('%(key)s must be a non-negative integer') % {
+                    'key': constants.CONFIG_EXTRACTION_CACHE_MAX_SIZE}
+        mode = config.get(constants.CONFIG_INSTALL_MODE, constants.DEFAULT_INSTALL_MODE)
+        if mode not in constants.INSTALL_MODES:
+            return False, _('%(key)s must be one of: %(modes)s') % {
+                'key': constants.CONFIG_INSTALL_MODE, 'modes': ', '.join(constants.INSTALL_MODES)}
         return True, None
 
     def publish_repo(self, repo, publish_conduit, config):
         """
         Publish the repository by "installing" each puppet module into the given
         destination directory. This effectively means extracting each module's
-        tarball in that directory.
+        tarball in that directory. Modules that a previous publish already installed
+        in the same version are left in place.
+
+        In the symlink install mode, the destination is a symlink to a versioned directory
+        instead. A new versioned directory is built for each publish and the symlink is
+        swapped to it atomically once it is complete. The versions left by earlier publishes
+        are removed before the new one is created.
 
         :param repo: plugin repository object
         :type repo: pulp.plugins.model.Repository
@@ -139,39 +143,64 @@ class PuppetModuleInstallDistributor(Distributor):
             return publish_conduit.build_failure_report(_('duplicate unit names'),
                                                         self.detail_report.report)
 
-        # check for unsafe paths in tarballs, and fail early if problems are found
-        self._check_for_unsafe_archive_paths(units, destination)
-        if self.detail_report.has_errors:
-            return publish_conduit.build_failure_report('failed', self.detail_report.report)
+        # only modules that are not already installed need to be extracted
+        installed = self._read_install_state(destination)
+        changed_units = self._find_changed_units(units, installed, destination)
 
         # ensure the destination directory exists
+        symlink_mode = config.get(constants.CONFIG_INSTALL_MODE) == constants.INSTALL_MODE_SYMLINK
+        if symlink_mode:
+            try:
+                self._remove_old_versions(destination)
+            except OSError, e:
+                return publish_conduit.build_failure_report(
+                    _('failed to remove old install directories: %s') % str(e),
+                    self.detail_report.report)
         try:
-            mkdir(destination)
-            temporarydestination = self._create_temporary_destination_directory(destination)
+            if symlink_mode:
+                temporarydestination = self._create_version_directory(destination)
+            else:
+                mkdir(destination)
+                temporarydestination = self._create_temporary_destination_directory(destination)
         except OSError, e:
             return publish_conduit.build_failure_report(
                 _('failed to create destination directory: %s') % str(e), self.detail_report.report)
 
-        # actually publish
-        for unit in units:
-            try:
-                archive = tarfile.open(unit._storage_path, tarinfo=NormalizingTarInfo)
-                try:
-                    archive.extractall(temporarydestination)
-                    self._rename_directory(unit, temporarydestination, archive.getnames())
-                finally:
-                    archive.close()
-                self.detail_report.success(unit.unit_key)
-            except (OSError, IOError, ValueError), e:
-                self.detail_report.error(unit.unit_key, str(e))
+        # actually publish. Tarballs with unsafe paths are found while they are extracted.
+        cache_dir = config.get(constants.CONFIG_EXTRACTION_CACHE_DIR)
+        if cache_dir:
+            max_size = int(config.get(constants.CONFIG_EXTRACTION_CACHE_MAX_SIZE,
+                                      constants.DEFAULT_EXTRACTION_CACHE_MAX_SIZE))
+            self.extraction_cache = extraction_cache.ExtractionCache(cache_dir, max_size)
+        workers = int(config.get(constants.CONFIG_INSTALL_WORKERS,
+                                 constants.DEFAULT_INSTALL_WORKERS))
+        self._extract_units(changed_units, temporarydestination, workers)
+        if self.extraction_cache is not None:
+            self.extraction_cache.evict()
 
         if self.detail_report.has_errors:
             return publish_conduit.build_failure_report(_('failed publishing units'),
                                                         self.detail_report.report)
+        changed_names = set(unit.name for unit in changed_units)
+        for unit in units:
+            if unit.name not in changed_names:
+                self.detail_report.success(unit.unit_key)
+        keep = set(unit.name for unit in units) - changed_names
 
-        # remove old directory if exists
+        if symlink_mode:
+            try:
+                self._swap_version_directory(destination, temporarydestination, keep, units)
+            except (IOError, OSError), e:
+                return publish_conduit.build_failure_report(
+                    _('failed to switch to the new install directory: %s') % str(e),
+                    self.detail_report.report)
+            return publish_conduit.build_success_report(_('success'), self.detail_report.report)
+
+        # remove the directories of modules that are no longer wanted or are replaced. The
+        # state is removed first, so that an interrupted publish is followed by a full one.
         try:
-            self._clear_destination_directory(destination)
+            self._remove_install_state(destination)
+            self._clear_destination_directory(destination, keep)
         except (IOError, OSError), e:
             return publish_conduit.build_failure_report(
                 _('failed to clear destination directory: %s') % str(e),
@@ -185,6 +214,13 @@ class PuppetModuleInstallDistributor(Distributor):
                 _('failed to move temporary destination to destination directory: %s') % str(e),
                 self.detail_report.report)
 
+        try:
+            self._write_install_state(destination, units)
+        except (IOError, OSError), e:
+            return publish_conduit.build_failure_report(
+                _('failed to record the installed modules: %s') % str(e),
+                self.detail_report.report)
+
         return publish_conduit.build_success_report(_('success'), self.detail_report.report)
 
     def distributor_removed(self, repo, config):
@@ -202,7 +238,12 @@ class PuppetModuleInstallDistributor(Distributor):
             msg_dict = {'directory': destination}
             _LOGGER.info(msg, msg_dict)
             try:
-                shutil.rmtree(destination)
+                if os.path.islink(destination.rstrip('/')):
+                    # installed in the symlink mode without a subdir
+                    os.remove(destination.rstrip('/'))
+                    shutil.rmtree(self._versions_directory(destination))
+                else:
+                    shutil.rmtree(destination)
             except Exception, e:
                 msg = _('error removing environment: %(exc)s')
                 msg_dict = {'exc': e}
@@ -237,6 +278,183 @@ class PuppetModuleInstallDistributor(Distributor):
                 duplicates.add(name)
         return [unit for unit in units if unit.name in duplicates]
 
+    @staticmethod
+    def _read_install_state(destination):
+        """
+        Read the record of the modules that a previous publish installed in the destination.
+
+        :param destination: absolute path to the destination where modules are installed
+        :type destination: str
+
+        :return: dictionary where keys are module names and values are dictionaries with the
+                 author, version and checksum of the installed module, or None if there is no
+                 usable record, in which case every module must be installed again
+        :rtype: dict or None
+        """
+        path = os.path.join(destination, constants.INSTALL_STATE_FILENAME)
+        try:
+            with open(path) as state_file:
+                installed = json.load(state_file)
+        except IOError, e:
+            if e.errno != errno.ENOENT:
+                msg = _('failed to read installed modules from %(path)s: %(exc)s')
+                _LOGGER.warn(msg, {'path': path, 'exc': e})
+            return None
+        except ValueError, e:
+            msg = _('ignoring invalid record of installed modules in %(path)s: %(exc)s')
+            _LOGGER.warn(msg, {'path': path, 'exc': e})
+            return None
+        if not isinstance(installed, dict):
+            return None
+        return installed
+
+    @staticmethod
+    def _write_install_state(destination, units):
+        """
+        Record the modules that are installed in the destination. The record is written to a
+        temporary file and renamed into place, so that it is never read half written.
+
+        :param destination: absolute path to the destination where modules are installed
+        :type destination: str
+        :param units: units that are installed in the destination
+        :type units: list of pulp_puppet.plugins.db.models.Module objects
+        """
+        installed = {}
+        for unit in units:
+            installed[unit.name] = {
+                'author': unit.author,
+                'version': unit.version,
+                'checksum': unit.checksum,
+            }
+        fd, tmp_path = tempfile.mkstemp(prefix='.installing-', dir=destination)
+        try:
+            with os.fdopen(fd, 'w') as state_file:
+                json.dump(installed, state_file)
+            os.rename(tmp_path, os.path.join(destination, constants.INSTALL_STATE_FILENAME))
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+    @staticmethod
+    def _remove_install_state(destination):
+        """
+        Remove the record of the modules installed in the destination, if there is one.
+
+        :param destination: absolute path to the destination where modules are installed
+        :type destination: str
+        """
+        try:
+            os.remove(os.path.join(destination, constants.INSTALL_STATE_FILENAME))
+        except OSError, e:
+            if e.errno != errno.ENOENT:
+                raise
+
+    @staticmethod
+    def _find_changed_units(units, installed, destination):
+        """
+        Find the units that are not installed in the destination exactly as they are in the
+        repository. A unit is unchanged only if the installed record has the same author,
+        version and checksum for its name, and its directory still exists.
+
+        :param units: all units being published
+        :type units: list of pulp_puppet.plugins.db.models.Module objects
+        :param installed: record of the installed modules, as returned by _read_install_state
+        :type installed: dict or None
+        :param destination: absolute path to the destination where modules are installed
+        :type destination: str
+
+        :return: units that need to be extracted
+        :rtype: list of pulp_puppet.plugins.db.models.Module objects
+        """
+        if installed is None:
+            return list(units)
+        changed = []
+        for unit in units:
+            wanted = {'author': unit.author, 'version': unit.version, 'checksum': unit.checksum}
+            if unit.checksum is None or installed.get(unit.name) != wanted:
+                changed.append(unit)
+            elif not os.path.isdir(os.path.join(destination, unit.name)):
+                changed.append(unit)
+        return changed
+
+    def _extract_units(self, units, destination, workers):
+        """
+        Extract each unit's tarball into the destination directory, using up to the given
+        number of threads. Tarball extraction is dominated by decompression and file writes,
+        both of which release the GIL, so the threads make use of several cores. Adds a
+        success or an error to the detail report for each unit, in the order the units are
+        given.
+
+        :param units: list of units whose tarballs should be extracted
+        :type units: list of pulp_puppet.plugins.db.models.Module objects
+        :param destination: absolute path to the directory modules should be extracted to
+        :type destination: str
+        :param workers: maximum number of tarballs to extract at the same time
+        :type workers: int
+        """
+        def extract(unit):
+            try:
+                self._extract_unit(unit, destination)
+            except (OSError, IOError, ValueError), e:
+                return str(e)
+
+        workers = min(workers, len(units))
+        if workers > 1:
+            pool = ThreadPool(workers)
+            try:
+                errors = pool.map(extract, units)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            errors = [extract(unit) for unit in units]
+
+        for unit, error in zip(units, errors):
+            if error is None:
+                self.detail_report.success(unit.unit_key)
+            else:
+                self.detail_report.error(unit.unit_key, error)
+
+    def _extract_unit(self, unit, destination):
+        """
+        Extract a unit's tarball into its own staging directory inside the destination,
+        then rename the extracted module directory into place as destination/<name>. Since
+        every unit has its own staging directory, units can be extracted concurrently.
+
+        The tarball is read only once. Each member is checked for an unsafe path as it is
+        read, and extraction stops at the first unsafe member. Whatever was already
+        extracted stays in the staging directory, which is discarded.
+
+        :param unit: unit whose tarball should be extracted
+        :type unit: pulp_puppet.plugins.db.models.Module
+        :param destination: absolute path to the directory modules should be extracted to
+        :type destination: str
+
+        When an extraction cache is configured, a module that is already cached is linked
+        from the cache instead, and a module that is not is added to it once extracted.
+
+        :raise: OSError, IOError, ValueError
+        """
+        cache = self.extraction_cache if unit.checksum else None
+        target = os.path.join(destination, unit.name)
+        if cache is not None and cache.materialize(unit.checksum, target):
+            return
+
+        staging = tempfile.mkdtemp(prefix='.extract-', dir=destination)
+        try:
+            archive = tarfile.open(unit._storage_path, tarinfo=NormalizingTarInfo)
+            try:
+                archive.extractall(staging, members=safe_members(archive, staging))
+                # every member was read by now, so this does not read the tarball again
+                self._rename_directory(unit, staging, archive.getnames())
+            finally:
+                archive.close()
+            os.rename(os.path.join(staging, unit.name), target)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        if cache is not None:
+            cache.add(unit.checksum, target)
+
     @staticmethod
     def _rename_directory(unit, destination, names):
         """
@@ -269,62 +487,19 @@ class PuppetModuleInstallDistributor(Distributor):
         if before != after:
             shutil.move(before, after)
 
-    def _check_for_unsafe_archive_paths(self, units, destination):
-        """
-        Check the paths of files in each tarball to make sure none include path
-        components, such as "../", that would cause files to be placed outside of
-        the destination directory. Adds errors to the detail report for each unit
-        that has one or more offending paths.
-
-        :param units: list of units whose tarballs should be checked for unsafe paths
-        :type units: list of pulp_puppet.plugins.db.models.Module objects
-        :param destination: absolute path to the destination where modules should be installed
-        :type destination: str
-        """
-        for unit in units:
-            try:
-                archive = tarfile.open(unit._storage_path)
-                try:
-                    if not self._archive_paths_are_safe(destination, archive):
-                        self.detail_report.error(unit.unit_key, ERROR_MESSAGE_PATH)
-                finally:
-                    archive.close()
-            except (OSError, IOError), e:
-                self.detail_report.error(unit.unit_key, str(e))
-
     @staticmethod
-    def _archive_paths_are_safe(destination, archive):
+    def _clear_destination_directory(destination, keep=frozenset()):
         """
-        Checks a tarball archive for paths that include components such as "../"
-        that would cause files to be placed outside of the destination_path.
-
-        :param destination: absolute path to the destination where modules should be installed
-        :type destination: str
-        :param archive: tarball archive that should be checked
-        :type archive: tarfile.TarFile
-
-        :return: True iff all paths in the archive are safe, else False
-        :rtype: bool
-        """
-        for name in archive.getnames():
-            result = os.path.normpath(os.path.join(destination, name))
-            if not destination.endswith('/'):
-                destination += '/'
-            if not result.startswith(destination):
-                return False
-        return True
-
-    @staticmethod
-    def _clear_destination_directory(destination):
-        """
-        Deletes every directory found in the given destination.
+        Deletes every directory found in the given destination, except for the ones to keep.
 
         :param destination: absolute path to the destination where modules should be installed
         :type destination: str
+        :param keep: names of directories that should not be deleted
+        :type keep: set
         """
         for directory in os.listdir(destination):
             path = os.path.join(destination, directory)
-            if os.path.isdir(path):
+            if directory not in keep and os.path.isdir(path):
                 shutil.rmtree(path)
 
     @staticmethod
@@ -352,6 +527,103 @@ class PuppetModuleInstallDistributor(Distributor):
                 raise
         return tempfile.mkdtemp(prefix='pulp', dir=basedir)
 
+    @staticmethod
+    def _versions_directory(destination):
+        """
+        Return the directory that holds the versioned directories of a destination that is
+        installed in the symlink mode. It is a peer of the destination, so that every version
+        is on the same filesystem as the symlink.
+
+        :param destination: absolute path to the destination where modules should be installed
+        :type destination: str
+
+        :return: absolute path to the directory of versioned directories
+        :rtype: str
+        """
+        destination = os.path.normpath(destination)
+        return os.path.join(os.path.dirname(destination),
+                            '.%s-versions' % os.path.basename(destination))
+
+    def _create_version_directory(self, destination):
+        """
+        Create a new, empty versioned directory for the destination. Versioned directories
+        are named after the time they were created, so that they sort by age.
+
+        :param destination: absolute path to the destination where modules should be installed
+        :type destination: str
+
+        :return: absolute path to the new versioned directory
+        :rtype: str
+        """
+        versions = self._versions_directory(destination)
+        mkdir(versions)
+        prefix = time.strftime('%Y%m%d%H%M%S-', time.gmtime())
+        version = tempfile.mkdtemp(prefix=prefix, dir=versions)
+        # mkdtemp only grants access to the owner, but puppet has to read the modules
+        os.chmod(version, 0755)
+        return version
+
+    def _swap_version_directory(self, destination, version, keep, units):
+        """
+        Complete a versioned directory and atomically point the destination symlink at it.
+        Modules that are already installed are hard linked from the current version, and the
+        installed modules are recorded in the new version.
+
+        A destination that is still a real directory, because it was installed in place
+        before, is moved into the versions directory first. Only this first swap is not
+        atomic.
+
+        :param destination: absolute path to the destination where modules should be installed
+        :type destination: str
+        :param version: absolute path to the new versioned directory
+        :type version: str
+        :param keep: names of the modules to take from the current version
+        :type keep: set
+        :param units: units that are installed in the new version
+        :type units: list of pulp_puppet.plugins.db.models.Module objects
+        """
+        destination = os.path.normpath(destination)
+        for name in keep:
+            extraction_cache.link_tree(os.path.join(destination, name),
+                                       os.path.join(version, name))
+        self._write_install_state(version, units)
+
+        if os.path.isdir(destination) and not os.path.islink(destination):
+            previous = tempfile.mkdtemp(prefix='in-place-', dir=os.path.dirname(version))
+            os.rename(destination, previous)
+
+        parent = os.path.dirname(destination)
+        link = os.path.join(parent, '.%s-%s' % (os.path.basename(destination), os.getpid()))
+        if os.path.lexists(link):
+            os.remove(link)
+        os.symlink(os.path.relpath(version, parent), link)
+        os.rename(link, destination)
+
+    def _remove_old_versions(self, destination):
+        """
+        Remove every versioned directory of a destination except the one it points at. This
+        is done at the start of a publish, before its new version is created, so that no
+        version being built is removed. The version replaced by the previous publish is thus
+        kept until now, so that readers which resolved the symlink before that swap can finish.
+
+        :param destination: absolute path to the destination where modules should be installed
+        :type destination: str
+        """
+        # a trailing slash would make the symlink look like the directory it points at
+        destination = os.path.normpath(destination)
+        versions = self._versions_directory(destination)
+        if not os.path.isdir(versions):
+            return
+        current = None
+        if os.path.islink(destination):
+            current = os.path.realpath(destination)
+        for name in os.listdir(versions):
+            path = os.path.join(versions, name)
+            if os.path.realpath(path) != current:
+                msg = _('removing old install directory %(path)s')
+                _LOGGER.debug(msg, {'path': path})
+                shutil.rmtree(path, ignore_errors=True)
+
     @staticmethod
     def _move_to_destination_directory(source, destination):
         """
@@ -14,6 +14,7 @@ from pulp.server.controllers.repository import find_repo_content_units
 from pulp_puppet.common import constants
 from pulp_puppet.common.constants import (STATE_FAILED, STATE_RUNNING, STATE_SKIPPED, STATE_SUCCESS)
 from pulp_puppet.common.publish_progress import PublishProgressReport
+from pulp_puppet.forge import search
 from pulp_puppet.plugins.db.models import RepositoryMetadata
 
 
@@ -141,6 +142,7 @@ class PuppetModulePublishRun(object):
         try:
             self._generate_metadata(modules)
             self._generate_dependency_data(modules)
+            self._generate_search_index(modules)
             self._copy_to_published()
             self._cleanup_build_dir()
         except Exception, e:
@@ -344,6 +346,30 @@ class PuppetModulePublishRun(object):
         finally:
             db.close()
 
+    def _generate_search_index(self, modules):
+        """
+        Generate the index used by the forge API to answer module searches, and store it in a
+        file at the root of the repo. Only the newest version of each module is indexed.
+
+        :param modules: list of modules in the repository; empty list if there are none
+        :type modules: list of pulp_puppet.plugins.db.models.Module
+        """
+        filename = os.path.join(self._build_dir(), constants.REPO_SEARCH_INDEX_FILENAME)
+        msg = _('generating search index in file %(filename)s')
+        msg_dict = {'filename': filename}
+        _logger.debug(msg, msg_dict)
+        entries = []
+        for module in modules:
+            entries.append({
+                'author': module.author,
+                'name': module.name,
+                'version': module.version,
+                'summary': module.summary,
+                'tags': module.tag_list or [],
+                'file': os.path.join(self._repo_path, self._build_relative_path(module)),
+            })
+        search.write_index(filename, entries)
+
     def _copy_to_published(self):
         """
         Moves the built repository into the proper locations where it will be
@@ -1,8 +1,10 @@
 from gettext import gettext as _
+import re
 
 from pulp.plugins.util import importer_config
 
 from pulp_puppet.common import constants
+from pulp_puppet.plugins.importers import filters
 from pulp_puppet.plugins.importers.downloaders import factory as downloader_factory
 
 
@@ -20,6 +22,9 @@ def validate(config):
         _validate_feed,
         _validate_remove_missing,
         _validate_queries,
+        _validate_retain_versions,
+        _validate_module_patterns,
+        _validate_upload_workers,
     )
 
     for v in validations:
@@ -91,3 +96,61 @@ def _validate_remove_missing(config):
         return False, msg
 
     return True, None
+
+
+def _validate_retain_versions(config):
+    """
+    Validates the number of releases of each module to retain, if it is specified.
+    """
+    return _validate_positive_integer(config, constants.CONFIG_RETAIN_VERSIONS)
+
+
+def _validate_upload_workers(config):
+    """
+    Validates the number of uploaded modules to read at the same time, if it is specified.
+    """
+    return _validate_positive_integer(config, constants.CONFIG_UPLOAD_WORKERS)
+
+
+def _validate_positive_integer(config, key):
+    """
+    Validates that the value of a key is a positive integer, if it is specified.
+    """
+    # The value is optional
+    if key not in config.keys():
+        return True, None
+
+    value = config.get(key)
+    if isinstance(value, bool) or not str(value).strip().isdigit() or int(value) < 1:
+        error_dict = {'key': key}
+        msg = _('The value for <%(key)s> must be a positive integer') % error_dict
+        return False, msg
+
+    return True, None
+
+
+def _validate_module_patterns(config):
+    """
+    Validates the include and exclude patterns of module names, if they are specified.
+    """
+    for key in (constants.CONFIG_INCLUDE_MODULES, constants.CONFIG_EXCLUDE_MODULES):
+        # The patterns are optional
+        if key not in config.keys():
+            continue
+
+        patterns = config.get(key)
+        if not isinstance(patterns, (list, tuple)) or \
+                not all(isinstance(p, basestring) for p in patterns):
+            error_dict = {'patterns': key}
+            msg = _('The value for <%(patterns)s> must be specified as a list') % error_dict
+            return False, msg
+
+        try:
+            filters.compile_patterns(patterns)
+        except re.error, e:
+            error_dict = {'patterns': key, 'error': e}
+            msg = _('The value for <%(patterns)s> contains an invalid regular expression: '
+                    '%(error)s') % error_dict
+            return False, msg
+
+    return True, None
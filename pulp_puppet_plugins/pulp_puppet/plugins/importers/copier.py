@@ -1,23 +1,218 @@
-from pulp.server.controllers.repository import find_repo_content_units
-from pulp.server.db.model import Repository
+from gettext import gettext as _
+import logging
 
+from pulp.common import dateutils
+from pulp.server.controllers import repository as repo_controller
+from pulp.server.db.model import RepositoryContentUnit
 
-def copy_units(import_conduit, units):
+from pulp_puppet.common import constants
+from pulp_puppet.common.version import satisfies, version_key
+from pulp_puppet.plugins.db.models import Module
+
+
+_logger = logging.getLogger(__name__)
+
+# number of associations written, and of copied units loaded, at a time
+BATCH_SIZE = 1000
+
+
+def copy_units(import_conduit, units, recursive=False):
     """
     Copies puppet modules from one repo into another. There is nothing that
     the importer needs to do; it maintains no state in the working directory
-    so the process is to simply tell Pulp to import each unit specified.
-    """
+    so the process is to simply associate each unit specified with the
+    destination repository.
 
+    Only the IDs of the units are read from the source repository. Units that
+    are already in the destination repository are skipped, and the new
+    associations are written in batches.
+
+    :param import_conduit: provides access to relevant Pulp functionality
+    :type  import_conduit: pulp.plugins.conduits.unit_import.ImportUnitConduit
+    :param units: units to copy, or None to copy every unit in the source repository
+    :type  units: list of pulp_puppet.plugins.db.models.Module
+    :param recursive: if True, also copy the dependencies of the units, recursively
+    :type  recursive: bool
+
+    :return: the copied units, with only their unit key fields loaded
+    :rtype:  generator of pulp_puppet.plugins.db.models.Module
+    """
     # Determine which units are being copied
     if units is None:
-        repo = Repository.objects.get(repo_id=import_conduit.source_repo_id)
-        units = find_repo_content_units(repo, yield_content_unit=True)
+        unit_ids = repo_unit_ids(import_conduit.source_repo_id)
+    elif recursive:
+        graph = DependencyGraph(import_conduit.source_repo_id)
+        unit_ids = graph.closure([u.id for u in units])
+    else:
+        unit_ids = (u.id for u in units)
 
     # Associate to the new repository
-    units_to_return = []
-    for u in units:
-        units_to_return.append(u)
-        import_conduit.associate_unit(u)
+    copied_ids = associate_unit_ids(import_conduit.dest_repo_id, unit_ids)
+
+    msg = _('copied %(count)d modules from repository %(source)s to %(dest)s')
+    msg_dict = {'count': len(copied_ids), 'source': import_conduit.source_repo_id,
+                'dest': import_conduit.dest_repo_id}
+    _logger.info(msg, msg_dict)
+    return copied_units(copied_ids)
+
+
+def repo_unit_ids(repo_id):
+    """
+    :param repo_id: ID of a repository
+    :type  repo_id: str
+
+    :return: IDs of the puppet modules in the repository
+    :rtype:  iterable of str
+    """
+    return RepositoryContentUnit.objects(
+        repo_id=repo_id, unit_type_id=constants.TYPE_PUPPET_MODULE).values_list('unit_id')
+
+
+def associate_unit_ids(repo_id, unit_ids):
+    """
+    Associate puppet modules with a repository, in batches of BATCH_SIZE.
+
+    :param repo_id: ID of the repository
+    :type  repo_id: str
+    :param unit_ids: IDs of puppet modules
+    :type  unit_ids: iterable of str
+
+    :return: IDs of the modules that were not already in the repository
+    :rtype:  list of str
+    """
+    present = set(repo_unit_ids(repo_id))
+    associated = []
+    batch = []
+    for unit_id in unit_ids:
+        if unit_id in present:
+            continue
+        present.add(unit_id)
+        batch.append(unit_id)
+        if len(batch) >= BATCH_SIZE:
+            _insert_associations(repo_id, batch)
+            associated.extend(batch)
+            batch = []
+    if batch:
+        _insert_associations(repo_id, batch)
+        associated.extend(batch)
+
+    if associated:
+        repo_controller.update_last_unit_added(repo_id)
+    return associated
+
+
+def _insert_associations(repo_id, unit_ids):
+    """
+    Write the associations of puppet modules with a repository in one bulk insert.
+
+    :param repo_id: ID of the repository
+    :type  repo_id: str
+    :param unit_ids: IDs of puppet modules that are not in the repository
+    :type  unit_ids: list of str
+    """
+    timestamp = dateutils.format_iso8601_utc_timestamp(dateutils.now_utc_timestamp())
+    associations = [RepositoryContentUnit(repo_id=repo_id, unit_id=unit_id,
+                                          unit_type_id=constants.TYPE_PUPPET_MODULE,
+                                          created=timestamp, updated=timestamp)
+                    for unit_id in unit_ids]
+    RepositoryContentUnit.objects.insert(associations, load_bulk=False)
+
+
+def copied_units(unit_ids):
+    """
+    Load copied units a batch at a time, with only their unit key fields.
+
+    :param unit_ids: IDs of puppet modules
+    :type  unit_ids: list of str
+
+    :return: the modules
+    :rtype:  generator of pulp_puppet.plugins.db.models.Module
+    """
+    for start in xrange(0, len(unit_ids), BATCH_SIZE):
+        batch = unit_ids[start:start + BATCH_SIZE]
+        for unit in Module.objects(id__in=batch).only(*Module.unit_key_fields):
+            yield unit
+
+
+class DependencyGraph(object):
+    """
+    The releases of every module in a repository, and their dependencies, loaded once so
+    that dependencies can be resolved in memory.
+    """
+
+    def __init__(self, repo_id):
+        """
+        :param repo_id: ID of the repository
+        :type  repo_id: str
+        """
+        # full name in form "author/name" -> list of (version, unit ID)
+        self.releases = {}
+        # unit ID -> list of (full name, version requirement) of its dependencies
+        self.dependencies = {}
+
+        unit_ids = list(repo_unit_ids(repo_id))
+        fields = ('id', 'author', 'name', 'version', 'dependencies')
+        for start in xrange(0, len(unit_ids), BATCH_SIZE):
+            batch = unit_ids[start:start + BATCH_SIZE]
+            for unit in Module.objects(id__in=batch).only(*fields):
+                self.add(unit.id, unit.author, unit.name, unit.version, unit.dependencies)
+
+    def add(self, unit_id, author, name, version, dependencies):
+        """
+        :param unit_id: ID of a module
+        :type  unit_id: str
+        :param author: author of the module
+        :type  author: str
+        :param name: name of the module
+        :type  name: str
+        :param version: version of the module
+        :type  version: str
+        :param dependencies: dicts with keys "name", in form "author/name" or "author-name",
+                             and "version_requirement"
+        :type  dependencies: list of dict
+        """
+        full_name = '%s/%s' % (author, name)
+        self.releases.setdefault(full_name, []).append((version, unit_id))
+        requirements = []
+        for dependency in dependencies or []:
+            dependency_name = dependency.get('name')
+            if not dependency_name:
+                continue
+            if '/' not in dependency_name:
+                dependency_name = dependency_name.replace('-', '/', 1)
+            requirements.append((dependency_name, dependency.get('version_requirement')))
+        self.dependencies[unit_id] = requirements
+
+    def closure(self, unit_ids):
+        """
+        Find the modules that the given ones depend on, directly or indirectly. A
+        dependency is met by a release that is already selected if one satisfies its
+        version requirement, and otherwise by the newest release that does.
+        Dependencies that no release in the repository satisfies are logged and skipped.
+
+        :param unit_ids: IDs of modules
+        :type  unit_ids: list of str
 
-    return units_to_return
+        :return: IDs of the given modules followed by the IDs of their dependencies
+        :rtype:  list of str
+        """
+        selected = list(unit_ids)
+        selected_ids = set(selected)
+        pending = list(selected)
+        while pending:
+            unit_id = pending.pop()
+            for name, requirement in self.dependencies.get(unit_id, []):
+                candidates = [release for release in self.releases.get(name, [])
+                              if satisfies(release[0], requirement)]
+                if any(release[1] in selected_ids for release in candidates):
+                    continue
+                if not candidates:
+                    msg = _('no module in the repository satisfies the dependency '
+                            '%(name)s %(requirement)s')
+                    _logger.warning(msg, {'name': name, 'requirement': requirement or ''})
+                    continue
+                newest = max(candidates, key=lambda release: version_key(release[0]))
+                selected.append(newest[1])
+                selected_ids.add(newest[1])
+                pending.append(newest[1])
+        return selected
@@ -23,6 +23,8 @@ from pulp.server.controllers import repository as repo_controller
 from pulp_puppet.common import constants
 from pulp_puppet.common.sync_progress import SyncProgressReport
 from pulp_puppet.plugins.db.models import Module
+from pulp_puppet.plugins.importers import filters
+from pulp_puppet.plugins.importers import retention
 
 
 _logger = logging.getLogger(__name__)
@@ -197,7 +199,8 @@ class SynchronizeWithDirectory(object):
 
     def _fetch_modules(self, manifest):
         """
-        Fetch all of the modules referenced in the manifest.
+        Fetch the modules referenced in the manifest that the include and exclude patterns
+        select, and that are among the newest releases to retain, if any.
 
         :param manifest: A parsed PULP_MANIFEST. List of: (name,checksum,size).
         :type manifest: list
@@ -207,6 +210,16 @@ class SynchronizeWithDirectory(object):
         """
         self.started_fetch_modules = time()
 
+        # skip the modules that the patterns exclude
+        module_filter = filters.ModuleFilter.from_config(self.config)
+        if module_filter.active:
+            manifest = [entry for entry in manifest if module_filter.matches_filename(entry[0])]
+
+        # skip the releases older than the newest ones to retain
+        retain_versions = retention.retained_versions(self.config)
+        if retain_versions:
+            manifest = retention.newest_in_manifest(manifest, retain_versions)
+
         # report progress: started
         self.report.modules_state = constants.STATE_RUNNING
         self.report.modules_total_count = len(manifest)
@@ -249,15 +262,24 @@ class SynchronizeWithDirectory(object):
             existing_module_ids_by_key[module.unit_key_str] = module.id
 
         remote_paths = {}
+        module_filter = filters.ModuleFilter.from_config(self.config)
 
         list_of_modules = []
         for module_path in module_paths:
             puppet_manifest = self._extract_metadata(module_path)
             puppet_manifest.update(Module.split_filename(puppet_manifest['name']))
+            # modules whose filenames did not tell their names were not filtered out yet
+            if not module_filter.matches(puppet_manifest['author'], puppet_manifest['name']):
+                continue
             module = Module.from_metadata(puppet_manifest)
             remote_paths[module.unit_key_str] = module_path
             list_of_modules.append(module)
 
+        # modules whose filenames did not tell their versions were not selected yet
+        retain_versions = retention.retained_versions(self.config)
+        if retain_versions:
+            list_of_modules = retention.newest(list_of_modules, retain_versions)
+
         pub_step = publish_step.GetLocalUnitsStep(constants.IMPORTER_TYPE_ID,
                                                   available_units=list_of_modules, repo=self.repo)
         pub_step.process_main()
@@ -292,6 +314,9 @@ class SynchronizeWithDirectory(object):
         if remove_missing:
             self._remove_missing(existing_module_ids_by_key, remote_paths.keys())
 
+        if retain_versions:
+            retention.prune(self.repo.repo_obj, retain_versions)
+
     def _remove_missing(self, existing_module_ids_by_key, remote_unit_keys):
         """
         Removes units from the local repository if they are missing from the remote repository.
@@ -0,0 +1,176 @@
+"""
+Include and exclude patterns that select which modules a sync imports.
+
+The patterns are matched against module names in form "author/name". A pattern is a shell
+style glob that must match the whole name, unless it is prefixed with "regex:", in which case
+the rest of it is a regular expression that is searched for in the name. The patterns are
+applied to the feed's metadata or manifest, so that excluded modules are never downloaded.
+"""
+
+import fnmatch
+import os
+import re
+
+from pulp_puppet.common import constants
+
+
+# prefix of a pattern that is a regular expression rather than a glob
+REGEX_PREFIX = 'regex:'
+
+# extensions of module tarballs, stripped from filenames in manifests
+TARBALL_EXTENSIONS = ('.tar.gz', '.tgz')
+
+
+def compile_patterns(patterns):
+    """
+    :param patterns: globs, or regular expressions prefixed with REGEX_PREFIX
+    :type  patterns: list of basestring
+
+    :return: a compiled regular expression for each pattern
+    :rtype:  list of re.RegexObject
+
+    :raise re.error: if a regular expression is invalid
+    """
+    compiled = []
+    for pattern in patterns:
+        if pattern.startswith(REGEX_PREFIX):
+            compiled.append(re.compile(pattern[len(REGEX_PREFIX):]))
+        else:
+            # anchored at the start too, since the patterns are searched for
+            compiled.append(re.compile(r'\A' + fnmatch.translate(pattern)))
+    return compiled
+
+
+def split_filename(filename):
+    """
+    Determine the author, name and version of a module from the filename of its tarball,
+    which is expected to be in the format "author-name-version.tar.gz". Module names cannot
+    contain hyphens, while versions can, as in "1.0.0-rc1".
+
+    :param filename: path or filename of a module tarball
+    :type  filename: basestring
+
+    :return: the author, name and version, or None if the filename is not in the expected
+             format
+    :rtype:  tuple or None
+    """
+    stem = os.path.basename(filename)
+    for extension in TARBALL_EXTENSIONS:
+        if stem.endswith(extension):
+            stem = stem[:-len(extension)]
+            break
+    else:
+        return None
+    parts = stem.split('-', 2)
+    if len(parts) < 3:
+        return None
+    return tuple(parts)
+
+
+def full_name_from_filename(filename):
+    """
+    Determine the name of a module from the filename of its tarball.
+
+    :param filename: path or filename of a module tarball
+    :type  filename: basestring
+
+    :return: the module name in form "author/name", or None if the filename is not in the
+             expected format
+    :rtype:  basestring or None
+    """
+    parts = split_filename(filename)
+    if parts is None:
+        return None
+    return '%s/%s' % parts[:2]
+
+
+class ModuleFilter(object):
+    """
+    Decides which modules a sync imports, according to the configured include and exclude
+    patterns. A module is imported if it matches an include pattern, or if there are none, and
+    it matches no exclude pattern.
+    """
+
+    def __init__(self, include=None, exclude=None):
+        """
+        :param include: patterns of the modules to import; None imports every module
+        :type  include: list of basestring
+        :param exclude: patterns of the modules not to import
+        :type  exclude: list of basestring
+        """
+        self.include = compile_patterns(include) if include else None
+        self.exclude = compile_patterns(exclude or [])
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        :param config: importer configuration
+        :type  config: pulp.plugins.config.PluginCallConfiguration
+
+        :return: a filter for the configured patterns
+        :rtype:  ModuleFilter
+        """
+        return cls(config.get(constants.CONFIG_INCLUDE_MODULES),
+                   config.get(constants.CONFIG_EXCLUDE_MODULES))
+
+    @property
+    def active(self):
+        """
+        :return: True if any pattern is configured, so that some modules may be filtered out
+        :rtype:  bool
+        """
+        return self.include is not None or bool(self.exclude)
+
+    def matches(self, author, name):
+        """
+        :param author: author of a module
+        :type  author: basestring
+        :param name: name of a module
+        :type  name: basestring
+
+        :return: True if the module should be imported
+        :rtype:  bool
+        """
+        return self._matches_full_name('%s/%s' % (author, name))
+
+    def matches_filename(self, filename):
+        """
+        Decide from the filename of a module tarball whether the module should be imported.
+        Modules are imported if their name cannot be determined from the filename, leaving
+        the decision to be made once their metadata has been read.
+
+        :param filename: path or filename of a module tarball
+        :type  filename: basestring
+
+        :return: True if the module should be imported
+        :rtype:  bool
+        """
+        full_name = full_name_from_filename(filename)
+        if full_name is None:
+            return True
+        return self._matches_full_name(full_name)
+
+    def filter(self, modules):
+        """
+        :param modules: modules or unit keys, with attributes "author" and "name"
+        :type  modules: iterable
+
+        :return: the modules that should be imported
+        :rtype:  list
+        """
+        if not self.active:
+            return list(modules)
+        return [module for module in modules if self.matches(module.author, module.name)]
+
+    def _matches_full_name(self, full_name):
+        """
+        :param full_name: module name in form "author/name"
+        :type  full_name: basestring
+
+        :return: True if the module should be imported
+        :rtype:  bool
+        """
+        if self.include is not None:
+            if not any(pattern.search(full_name) for pattern in self.include):
+                return False
+        return not any(pattern.search(full_name) for pattern in self.exclude)
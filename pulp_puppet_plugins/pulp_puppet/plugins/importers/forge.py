@@ -15,7 +15,9 @@ from pulp_puppet.common.constants import (STATE_FAILED, STATE_RUNNING,
                                           STATE_SUCCESS, STATE_CANCELED)
 from pulp_puppet.common.sync_progress import SyncProgressReport
 from pulp_puppet.plugins.db.models import Module, RepositoryMetadata
+from pulp_puppet.plugins.importers import filters
 from pulp_puppet.plugins.importers import metadata as metadata_module
+from pulp_puppet.plugins.importers import retention
 from pulp_puppet.plugins.importers.downloaders import factory as downloader_factory
 
 
@@ -237,8 +239,9 @@ class SynchronizeWithPuppetForge(object):
         downloader = self._create_downloader()
         self.downloader = downloader
 
-        # Ease module lookup
-        metadata_modules_by_key = dict([(m.unit_key_as_named_tuple, m) for m in metadata.modules])
+        # Ease module lookup, leaving out modules that the patterns exclude
+        metadata_modules = filters.ModuleFilter.from_config(self.config).filter(metadata.modules)
+        metadata_modules_by_key = dict([(m.unit_key_as_named_tuple, m) for m in metadata_modules])
 
         # Collect information about the repository's modules before changing it
         existing_module_ids_by_key = {}
@@ -278,6 +281,11 @@ class SynchronizeWithPuppetForge(object):
             doomed_module_iterator = Module.objects.in_bulk(doomed_ids).itervalues()
             repo_controller.disassociate_units(self.repo.repo_obj, doomed_module_iterator)
 
+        # Remove releases that are no longer among the newest ones
+        retain_versions = retention.retained_versions(self.config)
+        if retain_versions and not self._canceled:
+            retention.prune(self.repo.repo_obj, retain_versions)
+
         self.downloader = None
 
     def _add_new_module(self, downloader, module):
@@ -321,6 +329,7 @@ class SynchronizeWithPuppetForge(object):
 
         Filter out units which are already in a repository,
         associate units which are already downloaded,
+        and filter out releases older than the newest ones to retain, if configured.
 
         :param existing: units which are already in a repository
         :type existing: list of unit keys as namedtuples
@@ -330,6 +339,10 @@ class SynchronizeWithPuppetForge(object):
         :return: list of unit keys to download; empty list if all units are already downloaded
         :rtype:  list of unit keys as namedtuples
         """
+        retain_versions = retention.retained_versions(self.config)
+        if retain_versions:
+            wanted = retention.newest(wanted, retain_versions)
+
         model = plugin_api.get_unit_model_by_id(constants.TYPE_PUPPET_MODULE)
         unit_generator = (model(**unit_tuple._asdict()) for unit_tuple in wanted)
         still_wanted = set(wanted)
@@ -6,7 +6,7 @@ from pulp.plugins.importer import Importer
 from pulp.common.config import read_json_config
 
 from pulp_puppet.common import constants
-from pulp_puppet.plugins.importers import configuration, upload, copier
+from pulp_puppet.plugins.importers import configuration, upload, copier, retention
 from pulp_puppet.plugins.importers.directory import SynchronizeWithDirectory
 from pulp_puppet.plugins.importers.forge import SynchronizeWithPuppetForge
 
@@ -74,9 +74,21 @@ class PuppetModuleImporter(Importer):
         return report.build_final_report()
 
     def import_units(self, source_repo, dest_repo, import_conduit, config, units=None):
-        return copier.copy_units(import_conduit, units)
+        recursive = config.get(constants.CONFIG_RECURSIVE, constants.DEFAULT_RECURSIVE)
+        copied_units = copier.copy_units(import_conduit, units, recursive)
+
+        # Copied releases may be older than the newest ones the destination retains
+        retain_versions = retention.retained_versions(config)
+        if retain_versions:
+            removed_ids = set(retention.prune(dest_repo.repo_obj, retain_versions))
+            copied_units = (unit for unit in copied_units if unit.id not in removed_ids)
+        return copied_units
 
     def upload_unit(self, repo, type_id, unit_key, metadata, file_path, conduit, config):
+        metadata = metadata or {}
+        if metadata.get(constants.UPLOAD_BATCH_KEY):
+            return upload.handle_uploaded_batch(repo, type_id, metadata, file_path, config)
+
         report = upload.handle_uploaded_unit(repo, type_id, unit_key, metadata, file_path,
                                              conduit)
         return report
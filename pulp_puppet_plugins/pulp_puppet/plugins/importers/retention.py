@@ -0,0 +1,112 @@
+"""
+Retention of only the newest releases of each module in a repository.
+
+With the "retain_versions" importer option set, a sync only downloads the newest releases
+of each module that the feed offers, and a sync or copy then removes the releases that are
+no longer among the newest ones in the repository. Directory feeds list only filenames, so
+their releases are selected by the versions in the filenames, and the tarballs whose
+filenames are not in the usual format are downloaded and selected by their metadata.
+"""
+
+from collections import namedtuple
+from gettext import gettext as _
+import logging
+
+from pulp.server.controllers import repository as repo_controller
+
+from pulp_puppet.common import constants
+from pulp_puppet.common.version import version_key
+from pulp_puppet.plugins.db.models import Module
+from pulp_puppet.plugins.importers import filters
+
+
+_logger = logging.getLogger(__name__)
+
+# a module release listed in a directory feed's manifest
+ManifestRelease = namedtuple('ManifestRelease', ['entry', 'author', 'name', 'version'])
+
+
+def retained_versions(config):
+    """
+    :param config: importer configuration
+    :type  config: pulp.plugins.config.PluginCallConfiguration
+
+    :return: number of releases of each module to keep, or None to keep every release
+    :rtype:  int or None
+    """
+    value = config.get(constants.CONFIG_RETAIN_VERSIONS)
+    if value is None:
+        return None
+    return int(value)
+
+
+def newest(units, count):
+    """
+    Select the newest releases of each module, ordered by semantic version.
+
+    :param units: unit keys or units, with attributes "author", "name" and "version"
+    :type  units: iterable
+    :param count: number of releases of each module to select
+    :type  count: int
+
+    :return: the selected unit keys or units
+    :rtype:  list
+    """
+    releases = {}
+    for unit in units:
+        releases.setdefault((unit.author, unit.name), []).append(unit)
+    selected = []
+    for module_releases in releases.itervalues():
+        module_releases.sort(key=lambda unit: version_key(unit.version), reverse=True)
+        selected.extend(module_releases[:count])
+    return selected
+
+
+def newest_in_manifest(manifest, count):
+    """
+    Select the entries of a directory feed's manifest that are the newest releases of each
+    module, according to their filenames. Entries whose filenames are not in the format
+    "author-name-version.tar.gz" are all selected.
+
+    :param manifest: parsed PULP_MANIFEST; list of (path, checksum, size)
+    :type  manifest: list
+    :param count: number of releases of each module to select
+    :type  count: int
+
+    :return: the selected entries, in manifest order
+    :rtype:  list
+    """
+    releases = []
+    for entry in manifest:
+        parts = filters.split_filename(entry[0])
+        if parts is not None:
+            releases.append(ManifestRelease(entry, *parts))
+    parsed = set(release.entry for release in releases)
+    selected = set(release.entry for release in newest(releases, count))
+    return [entry for entry in manifest if entry not in parsed or entry in selected]
+
+
+def prune(repo_obj, count):
+    """
+    Remove the releases of each module from a repository that are older than its newest
+    releases.
+
+    :param repo_obj: the repository
+    :type  repo_obj: pulp.server.db.model.Repository
+    :param count: number of releases of each module to keep
+    :type  count: int
+
+    :return: IDs of the removed modules
+    :rtype:  list of str
+    """
+    modules = list(repo_controller.find_repo_content_units(
+        repo_obj, unit_fields=Module.unit_key_fields, yield_content_unit=True))
+    kept_ids = set(module.id for module in newest(modules, count))
+    doomed = [module for module in modules if module.id not in kept_ids]
+    if doomed:
+        msg = _('removing %(count)d modules older than the newest %(retain)d releases from '
+                'repository <%(repo_id)s>')
+        msg_dict = {'count': len(doomed), 'retain': count, 'repo_id': repo_obj.repo_id}
+        _logger.info(msg, msg_dict)
+        repo_controller.disassociate_units(repo_obj, doomed)
+    return [module.id for module in doomed]
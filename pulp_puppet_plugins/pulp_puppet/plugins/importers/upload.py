@@ -1,5 +1,12 @@
+from contextlib import closing
+from gettext import gettext as _
+from multiprocessing.pool import ThreadPool
+import logging
 import os
 import shutil
+import sys
+import tarfile
+import tempfile
 
 from mongoengine import NotUniqueError
 
@@ -7,9 +14,13 @@ from pulp.server.controllers import repository as repo_controller
 
 from pulp_puppet.common import constants
 from pulp_puppet.plugins.db.models import Module
+from pulp_puppet.plugins.importers import copier
 from pulp_puppet.plugins.importers import metadata as metadata_parser
 
 
+_logger = logging.getLogger(__name__)
+
+
 def handle_uploaded_unit(repo, type_id, unit_key, metadata, file_path, conduit):
     """
     Handles an upload unit request to the importer. This call is responsible
@@ -18,6 +29,10 @@ def handle_uploaded_unit(repo, type_id, unit_key, metadata, file_path, conduit):
     This call will also update the database in Pulp to reflect the unit
     and its association to the repository.
 
+    If a module with the same checksum is already stored, the upload is a duplicate of it,
+    and that module is associated with the repository instead; the upload's metadata is not
+    extracted and the file is not stored again.
+
     :param repo: repository into which the unit is being uploaded
     :type repo: pulp.plugins.model.Repository
     :param type_id: type of unit being uploaded
@@ -34,24 +49,241 @@ def handle_uploaded_unit(repo, type_id, unit_key, metadata, file_path, conduit):
     if type_id != constants.TYPE_PUPPET_MODULE:
         raise NotImplementedError()
 
+    checksum = metadata_parser.calculate_checksum(file_path)
+
+    existing_module = find_modules_by_checksum([checksum]).get(checksum)
+    if existing_module is not None:
+        msg = _('Uploaded file is identical to the stored module %(module)s')
+        msg_dict = {'module': existing_module.unit_key_str}
+        _logger.info(msg, msg_dict)
+        repo_controller.associate_single_unit(repo.repo_obj, existing_module)
+        return {'success_flag': True, 'summary': '', 'details': {}}
+
+    uploaded_module = _read_module(file_path, repo.working_dir, checksum)
+    uploaded_module = _store_module(uploaded_module, file_path)
+    repo_controller.associate_single_unit(repo.repo_obj, uploaded_module)
+
+    return {'success_flag': True, 'summary': '', 'details': {}}
+
+
+def handle_uploaded_batch(repo, type_id, metadata, file_path, config):
+    """
+    Handles an upload unit request that imports many modules at once. The uploaded file is
+    an archive of module tarballs, as indicated by the metadata's UPLOAD_BATCH_KEY.
+
+    Every file is hashed first, and files identical to stored modules are not read further.
+    The metadata of the other files is extracted in parallel, after which each new module is
+    stored. All of the modules are then associated with the repository in bulk. A module
+    that fails to import is recorded in the report without stopping the others.
+
+    :param repo: repository into which the modules are being uploaded
+    :type repo: pulp.plugins.model.Repository
+    :param type_id: type of unit being uploaded
+    :type type_id: str
+    :param metadata: extra data about the upload
+    :type metadata: dict
+    :param file_path: temporary location of the uploaded file
+    :type file_path: str
+    :param config: importer configuration
+    :type config: pulp.plugins.config.PluginCallConfiguration
+
+    :return: a single report for all of the modules
+    :rtype: dict
+    """
+    if type_id != constants.TYPE_PUPPET_MODULE:
+        raise NotImplementedError()
+
+    workers = int(config.get(constants.CONFIG_UPLOAD_WORKERS, constants.DEFAULT_UPLOAD_WORKERS))
+    staging_dir = tempfile.mkdtemp(dir=repo.working_dir)
+    errors = []
+    try:
+        file_paths = extract_archive(file_path, staging_dir)
+
+        # Hash every file, keeping one file of each checksum
+        paths_by_checksum = {}
+        checksums = _map(metadata_parser.calculate_checksum, file_paths, workers)
+        for path, (checksum, error) in zip(file_paths, checksums):
+            if error is not None:
+                errors.append(_error(path, error))
+            else:
+                paths_by_checksum.setdefault(checksum, path)
+
+        existing_modules = find_modules_by_checksum(paths_by_checksum.keys())
+        unit_ids = [module.id for module in existing_modules.itervalues()]
+        new_files = [(checksum, path) for checksum, path in paths_by_checksum.iteritems()
+                     if checksum not in existing_modules]
+
+        # Extract the metadata of the new modules in parallel, then store them
+        read_modules = _map(lambda new_file: _read_module(new_file[1], staging_dir, new_file[0]),
+                            new_files, workers)
+        for (checksum, path), (module, error) in zip(new_files, read_modules):
+            if error is None:
+                try:
+                    module = _store_module(module, path)
+                except Exception, e:
+                    error = e
+            if error is not None:
+                errors.append(_error(path, error))
+            else:
+                unit_ids.append(module.id)
+
+        associated_ids = copier.associate_unit_ids(repo.id, unit_ids)
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+    summary = {
+        'stored': len(unit_ids) - len(existing_modules),
+        'duplicates': len(existing_modules),
+        'associated': len(associated_ids),
+        'errors': len(errors),
+    }
+    msg = _('Stored %(stored)d modules and found %(duplicates)d already stored; associated '
+            '%(associated)d with repository <%(repo_id)s>; %(errors)d modules failed')
+    msg_dict = dict(summary, repo_id=repo.id)
+    _logger.info(msg, msg_dict)
+
+    return {'success_flag': not errors, 'summary': summary, 'details': {'errors': errors}}
+
+
+def extract_archive(archive_path, destination):
+    """
+    Extract the module tarballs in an archive. Each one is written under a name of its own in
+    the destination directory, so paths inside the archive cannot point elsewhere, and
+    members that are not module tarballs are ignored.
+
+    :param archive_path: full path to the archive
+    :type archive_path: str
+    :param destination: directory to write the module tarballs to
+    :type destination: str
+
+    :return: full paths to the extracted module tarballs
+    :rtype: list of str
+
+    :raise InvalidTarball: if the archive cannot be read
+    """
+    paths = []
+    try:
+        with closing(tarfile.open(archive_path)) as archive:
+            for index, member in enumerate(archive):
+                if not member.isfile() or not member.name.endswith('.tar.gz'):
+                    continue
+                path = os.path.join(destination, '%d-%s' % (index, os.path.basename(member.name)))
+                with closing(archive.extractfile(member)) as source:
+                    with open(path, 'wb') as target:
+                        shutil.copyfileobj(source, target)
+                paths.append(path)
+    except tarfile.TarError:
+        raise metadata_parser.InvalidTarball(), None, sys.exc_info()[2]
+    return paths
+
+
+def find_modules_by_checksum(checksums):
+    """
+    Find stored modules by the checksums of their files.
+
+    :param checksums: checksums of module files, calculated with the default hashlib
+    :type  checksums: list of str
+
+    :return: dict of the modules whose files are in storage, keyed by checksum
+    :rtype:  dict
+    """
+    modules = {}
+    if not checksums:
+        return modules
+    for module in Module.objects(checksum__in=checksums,
+                                 checksum_type=constants.DEFAULT_HASHLIB):
+        if module._storage_path is not None and os.path.isfile(module._storage_path):
+            modules.setdefault(module.checksum, module)
+    return modules
+
+
+def _read_module(file_path, working_dir, checksum):
+    """
+    Create a module from the metadata in its tarball.
+
+    :param file_path: full path to the module tarball
+    :type file_path: str
+    :param working_dir: directory the tarball may be extracted in
+    :type working_dir: str
+    :param checksum: checksum of the tarball
+    :type checksum: str
+
+    :return: the module, not yet saved
+    :rtype: pulp_puppet.plugins.db.models.Module
+    """
     # Extract the metadata from the module
-    extracted_data = metadata_parser.extract_metadata(file_path, repo.working_dir)
+    extracted_data = metadata_parser.extract_metadata(file_path, working_dir)
 
     # Overwrite the author and name
     extracted_data.update(Module.split_filename(extracted_data['name']))
 
-    uploaded_module = Module.from_metadata(extracted_data)
+    module = Module.from_metadata(extracted_data)
+    module.checksum = checksum
+    return module
+
 
+def _store_module(module, file_path):
+    """
+    Save a module and import its tarball into storage. If the module is already stored,
+    the stored one is returned instead.
+
+    :param module: the module
+    :type module: pulp_puppet.plugins.db.models.Module
+    :param file_path: full path to the module tarball, which is renamed
+    :type file_path: str
+
+    :return: the stored module
+    :rtype: pulp_puppet.plugins.db.models.Module
+    """
     # rename the file so it has the original module name
-    new_file_path = os.path.join(os.path.dirname(file_path),
-                                 uploaded_module.puppet_standard_filename())
+    new_file_path = os.path.join(os.path.dirname(file_path), module.puppet_standard_filename())
     shutil.move(file_path, new_file_path)
 
-    uploaded_module.set_storage_path(os.path.basename(new_file_path))
+    module.set_storage_path(os.path.basename(new_file_path))
     try:
-        uploaded_module.save_and_import_content(new_file_path)
+        module.save_and_import_content(new_file_path)
     except NotUniqueError:
-        uploaded_module = uploaded_module.__class__.objects.get(**uploaded_module.unit_key)
-    repo_controller.associate_single_unit(repo.repo_obj, uploaded_module)
+        module = module.__class__.objects.get(**module.unit_key)
+    return module
 
-    return {'success_flag': True, 'summary': '', 'details': {}}
+
+def _map(function, items, workers):
+    """
+    Call a function with each item, using up to the given number of threads. Hashing and
+    tarball extraction are dominated by work that releases the GIL, so the threads make use
+    of several cores.
+
+    :param function: function taking one item
+    :type function: callable
+    :param items: items to call the function with
+    :type items: list
+    :param workers: maximum number of calls to make at the same time
+    :type workers: int
+
+    :return: for each item, in order, a tuple of what the function returned and None, or of
+             None and the exception it raised
+    :rtype: list of tuple
+    """
+    def call(item):
+        try:
+            return function(item), None
+        except Exception, e:
+            return None, e
+
+    workers = min(workers, len(items))
+    if workers > 1:
+        pool = ThreadPool(workers)
+        try:
+            return pool.map(call, items)
+        finally:
+            pool.close()
+            pool.join()
+    return [call(item) for item in items]
+
+
+def _error(file_path, error):
+    """
+    :return: an entry of a batch report's errors
+    :rtype: dict
+    """
+    return {'file': os.path.basename(file_path), 'error': str(error)}
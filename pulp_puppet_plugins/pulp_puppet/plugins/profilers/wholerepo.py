@@ -1,16 +1,21 @@
 from gettext import gettext as _
+import itertools
 import logging
 
 from pulp.plugins.profiler import Profiler
 from pulp.server.config import config as pulp_conf
-from pulp.server.controllers.repository import find_repo_content_units
-from pulp.server.db.model import Repository
+from pulp.server.db.model import Repository, RepositoryContentUnit
 
 from pulp_puppet.common import constants
+from pulp_puppet.common.version import version_key
+from pulp_puppet.plugins.db.models import Module
 
 
 _LOGGER = logging.getLogger(__name__)
 
+# number of unit IDs matched by each aggregation of a repository's modules
+UNIT_ID_BATCH_SIZE = 10000
+
 
 def entry_point():
     return WholeRepoProfiler, {}
@@ -18,6 +23,10 @@ def entry_point():
 
 class WholeRepoProfiler(Profiler):
 
+    # repo ID -> (content signature of the repo, index of its newest modules), shared by
+    # every consumer whose applicability is calculated in this process
+    _latest_versions = {}
+
     @classmethod
     def metadata(cls):
         """
@@ -48,7 +57,9 @@ class WholeRepoProfiler(Profiler):
         Inspect the options, and if constants.WHOLE_REPO_ID has a non-False
         value, replace the list of units with a list of all units in the given
         repository. Omits version numbers, which allows the install tool to
-        automatically choose the most recent version of each.
+        automatically choose the most recent version of each, unless
+        constants.PIN_LATEST_OPTION has a non-False value, in which case each
+        unit key has the most recent version in the repository.
 
         :param consumer: A consumer.
         :type consumer: pulp.plugins.model.Consumer
@@ -67,6 +78,7 @@ class WholeRepoProfiler(Profiler):
 
         :return: The translated units
         :rtype: list of: {'type_id': <str>, unit_key: {'author': <author>, 'name': <name>}
+                or {'author': <author>, 'name': <name>, 'version': <version>}
         """
         repo_id = options.get(constants.REPO_ID_OPTION)
         self._inject_forge_settings(options)
@@ -75,18 +87,19 @@ class WholeRepoProfiler(Profiler):
             msg_dict = {'repo_id': repo_id, 'consumer_id': consumer.id}
             _LOGGER.debug(msg, msg_dict)
 
-            repo = Repository.objects.get(repo_id=repo_id)
-            units = find_repo_content_units(repo, yield_content_unit=True)
+            repo = Repository.objects.only(
+                'repo_id', 'last_unit_added', 'last_unit_removed').get(repo_id=repo_id)
+            pin_latest = options.get(constants.PIN_LATEST_OPTION)
 
-            unit_key_dict = {}
-            for unit in units:
-                fullname = '%s/%s' % (unit.author, unit.name)
-                unit_key_dict[fullname] = {
-                    'unit_key': {'author': unit.author, 'name': unit.name},
-                    'type_id': constants.TYPE_PUPPET_MODULE
-                }
+            units = []
+            for fullname, (version, unit_id) in sorted(self._latest_modules(repo).iteritems()):
+                author, name = fullname.split('/', 1)
+                unit_key = {'author': author, 'name': name}
+                if pin_latest:
+                    unit_key['version'] = version
+                units.append({'unit_key': unit_key, 'type_id': constants.TYPE_PUPPET_MODULE})
 
-            return unit_key_dict.values()
+            return units
 
         else:
             return units
@@ -116,6 +129,107 @@ class WholeRepoProfiler(Profiler):
         self._inject_forge_settings(options)
         return units
 
+    def calculate_applicable_units(self, unit_profile, bound_repo_id, config, conduit):
+        """
+        Find the modules in the bound repository that are newer than the versions installed
+        on consumers with the given profile. Modules that are not installed are not
+        applicable.
+
+        :param unit_profile: a consumer unit profile, as reported by the agent handler
+        :type unit_profile: dict where keys are module names in form "author/name", and
+                            values are installed versions
+
+        :param bound_repo_id: ID of the repository to calculate applicability against
+        :type bound_repo_id: str
+
+        :param config: plugin configuration
+        :type config: pulp.plugins.config.PluginCallConfiguration
+
+        :param conduit: provides access to relevant Pulp functionality
+        :type conduit: pulp.plugins.conduits.profiler.ProfilerConduit
+
+        :return: IDs of the applicable units
+        :rtype: dict where the key is the puppet module type ID, and the value is a list of
+                unit IDs
+        """
+        repo = Repository.objects(repo_id=bound_repo_id).only(
+            'repo_id', 'last_unit_added', 'last_unit_removed').first()
+        if repo is None:
+            self._latest_versions.pop(bound_repo_id, None)
+            return {constants.TYPE_PUPPET_MODULE: []}
+
+        latest = self._latest_modules(repo)
+        applicable = []
+        for name, version in (unit_profile or {}).iteritems():
+            if '/' not in name:
+                name = name.replace('-', '/', 1)
+            newest = latest.get(name)
+            if newest is not None and version_key(newest[0]) > version_key(version):
+                applicable.append(newest[1])
+        return {constants.TYPE_PUPPET_MODULE: applicable}
+
+    @classmethod
+    def _latest_modules(cls, repo):
+        """
+        Get the index of the newest version of each module in a repository. The index is
+        built on first use, and again only after units are added to or removed from the
+        repository, so that calculating applicability for many consumers bound to the same
+        repository, or installing it on them, reads its units once.
+
+        :param repo: a repository, with at least its ID and last unit change times loaded
+        :type repo: pulp.server.db.model.Repository
+
+        :return: dictionary where keys are module names in form "author/name", and values are
+                 tuples of the newest version and the ID of its unit
+        :rtype: dict
+        """
+        repo_id = repo.repo_id
+        signature = (repo.last_unit_added, repo.last_unit_removed)
+        cached = cls._latest_versions.get(repo_id)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        msg = _('indexing the newest modules in repository %(repo_id)s')
+        _LOGGER.debug(msg, {'repo_id': repo_id})
+        latest = {}
+        for author, name, releases in cls._module_releases(repo_id):
+            fullname = '%s/%s' % (author, name)
+            for release in releases:
+                newest = latest.get(fullname)
+                if newest is None or version_key(release['version']) > version_key(newest[0]):
+                    latest[fullname] = (release['version'], release['id'])
+        cls._latest_versions[repo_id] = (signature, latest)
+        return latest
+
+    @staticmethod
+    def _module_releases(repo_id):
+        """
+        Group the modules in a repository by name in the database, so that only their
+        versions and IDs are loaded instead of every module document. The unit IDs in the
+        repository are matched in batches, so a module may be yielded once per batch.
+
+        :param repo_id: ID of a repository
+        :type repo_id: str
+
+        :return: generator of tuples of a module's author, its name, and a list of its
+                 releases as dicts with keys "version" and "id"
+        :rtype: generator
+        """
+        unit_ids = iter(RepositoryContentUnit.objects(
+            repo_id=repo_id, unit_type_id=constants.TYPE_PUPPET_MODULE).values_list('unit_id'))
+        collection = Module._get_collection()
+        while True:
+            batch = list(itertools.islice(unit_ids, UNIT_ID_BATCH_SIZE))
+            if not batch:
+                break
+            pipeline = [
+                {'$match': {'_id': {'$in': batch}}},
+                {'$group': {'_id': {'author': '$author', 'name': '$name'},
+                            'releases': {'$push': {'version': '$version', 'id': '$_id'}}}},
+            ]
+            for group in collection.aggregate(pipeline, allowDiskUse=True):
+                yield group['_id']['author'], group['_id']['name'], group['releases']
+
     def _inject_forge_settings(self, options):
         """
         Inject the puppet forge settings into the options.
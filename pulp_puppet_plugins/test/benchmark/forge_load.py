@@ -0,0 +1,429 @@
+#!/usr/bin/env python2
+"""
+Load benchmark for the read path of the forge API.
+
+Synthetic repositories are generated at a configurable scale and published with the same
+dependency data generator that PuppetModulePublishRun uses. ReleasesView and
+ReleasesPost36View are then driven in-process with a mix of forge v1 and v3 requests, scoped
+either to a repository or to a consumer bound to every repository. The latency percentiles,
+throughput and memory use of each kind of request are reported.
+
+Only the database lookups of distributors and consumer bindings are replaced, so that no
+Pulp database is needed. Everything from the view down to the gdbm files is real.
+
+Example:
+
+    python forge_load.py --modules 500 --versions 5 --fan-out 3 --depth 4 --requests 5000
+"""
+
+import base64
+import gc
+from gettext import gettext as _
+import json
+import math
+from optparse import OptionParser
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import mock
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pulp_puppet.forge.settings')
+
+from django.test.client import RequestFactory  # noqa: E402
+from pulp.plugins.model import Repository  # noqa: E402
+
+from pulp_puppet.common import constants  # noqa: E402
+from pulp_puppet.forge import releases  # noqa: E402
+from pulp_puppet.forge.views.releases import ReleasesView, ReleasesPost36View  # noqa: E402
+from pulp_puppet.plugins.distributors.publish import PuppetModulePublishRun  # noqa: E402
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+CONSUMER_ID = 'consumer1'
+AUTHOR = 'bench'
+
+# request kind: weight in the default request mix
+DEFAULT_MIX = 'v1_repo=30,v1_consumer=20,v3_releases=30,v3_release=20'
+
+USAGE = _('%prog [options]')
+
+DESCRIPTION = _('Publish synthetic puppet repositories and measure how fast the forge API '
+                'answers requests against them.')
+
+
+class SyntheticModule(object):
+    """
+    Stands in for pulp_puppet.plugins.db.models.Module with the attributes that publishing
+    dependency data reads.
+    """
+
+    def __init__(self, name, version, dependencies, storage_path):
+        self.author = AUTHOR
+        self.name = name
+        self.version = version
+        self.dependencies = dependencies
+        self.summary = 'Synthetic module %s' % name
+        self.tag_list = ['benchmark']
+        self._storage_path = storage_path
+
+
+def parse_options(argv):
+    """
+    :param argv: command line arguments, without the program name
+    :type  argv: list
+
+    :return: the parsed options
+    :rtype:  optparse.Values
+    """
+    parser = OptionParser(usage=USAGE, description=DESCRIPTION)
+    parser.add_option('--modules', type='int', default=200,
+                      help=_('number of distinct modules in each repository; default: 200'))
+    parser.add_option('--versions', type='int', default=5,
+                      help=_('number of versions of each module; default: 5'))
+    parser.add_option('--fan-out', type='int', default=3,
+                      help=_('largest number of dependencies of a module; each module depends '
+                             'on a random number of modules up to this; default: 3'))
+    parser.add_option('--depth', type='int', default=3,
+                      help=_('length of the longest dependency chain; default: 3'))
+    parser.add_option('--repos', type='int', default=2,
+                      help=_('number of repositories, each holding every module, that the '
+                             'consumer is bound to; default: 2'))
+    parser.add_option('--requests', type='int', default=2000,
+                      help=_('number of measured requests; default: 2000'))
+    parser.add_option('--warm-up', type='int', default=100,
+                      help=_('number of requests made before measuring; default: 100'))
+    parser.add_option('--mix', default=DEFAULT_MIX,
+                      help=_('weight of each kind of request; default: %s') % DEFAULT_MIX)
+    parser.add_option('--caches', default=False, action='store_true',
+                      help=_('enable the per-process repository index and database cache, as '
+                             'forge workers do'))
+    parser.add_option('--file-size', type='int', default=4096,
+                      help=_('size in bytes of each synthetic module file; default: 4096'))
+    parser.add_option('--seed', type='int', default=0,
+                      help=_('seed of the random generator; default: 0'))
+    parser.add_option('--working-dir',
+                      help=_('directory to publish into, which is kept; by default a temporary '
+                             'directory is used and removed'))
+    parser.add_option('--json', dest='json_path',
+                      help=_('also write the results as JSON to this file'))
+    options, args = parser.parse_args(argv)
+    if args:
+        parser.error(_('unexpected arguments: %s') % ' '.join(args))
+    if min(options.modules, options.versions, options.repos, options.requests) < 1:
+        parser.error(_('--modules, --versions, --repos and --requests must be positive'))
+    if options.depth < 0 or options.fan_out < 0:
+        parser.error(_('--depth and --fan-out must not be negative'))
+    try:
+        options.mix = parse_mix(options.mix)
+    except ValueError, e:
+        parser.error(str(e))
+    return options
+
+
+def parse_mix(mix):
+    """
+    :param mix: comma separated "kind=weight" pairs
+    :type  mix: str
+
+    :return: list of (kind, weight) tuples
+    :rtype:  list
+
+    :raise ValueError: if the mix is malformed or names an unknown kind of request
+    """
+    ret = []
+    for pair in mix.split(','):
+        kind, weight = pair.split('=')
+        if kind not in REQUEST_BUILDERS:
+            raise ValueError(_('unknown request kind: %s') % kind)
+        ret.append((kind, int(weight)))
+    return ret
+
+
+def generate_modules(content_dir, options, rng):
+    """
+    Generate the modules of a synthetic repository. Modules are spread over depth + 1
+    layers, and each module depends on up to fan-out modules of the next layer, so the
+    longest dependency chain is depth modules long.
+
+    :param content_dir: directory in which module files are written
+    :type  content_dir: str
+    :param options:     benchmark options
+    :type  options:     optparse.Values
+    :param rng:         random generator
+    :type  rng:         random.Random
+
+    :return: the modules, and the names of the modules in the top layer
+    :rtype:  tuple
+    """
+    layer_count = min(options.depth + 1, options.modules)
+    layers = [[] for i in range(layer_count)]
+    for i in range(options.modules):
+        layers[i * layer_count // options.modules].append('module%d' % i)
+
+    modules = []
+    for layer_index, names in enumerate(layers):
+        next_layer = layers[layer_index + 1] if layer_index + 1 < layer_count else []
+        for name in names:
+            dep_count = min(rng.randint(0, options.fan_out), len(next_layer))
+            dependencies = [{'name': '%s/%s' % (AUTHOR, dep), 'version_requirement': '>= 1.0.0'}
+                            for dep in rng.sample(next_layer, dep_count)]
+            for minor in range(options.versions):
+                version = '1.%d.0' % minor
+                file_name = '%s-%s-%s.tar.gz' % (AUTHOR, name, version)
+                storage_path = os.path.join(content_dir, file_name)
+                with open(storage_path, 'wb') as module_file:
+                    module_file.write(os.urandom(options.file_size))
+                modules.append(SyntheticModule(name, version, dependencies, storage_path))
+    return modules, layers[0]
+
+
+def publish(working_dir, repo_id, modules):
+    """
+    Publish the dependency data and search index of a synthetic repository.
+
+    :param working_dir: directory the repository is built in
+    :type  working_dir: str
+    :param repo_id:     ID of the repository
+    :type  repo_id:     str
+    :param modules:     modules in the repository
+    :type  modules:     list
+
+    :return: path to the published dependency database
+    :rtype:  str
+    """
+    repo = Repository(repo_id, working_dir=working_dir)
+    run = PuppetModulePublishRun(repo, repo, mock.MagicMock(), {}, lambda: False)
+    os.makedirs(run._build_dir())
+    run._generate_dependency_data(modules)
+    run._generate_search_index(modules)
+    return os.path.join(run._build_dir(), constants.REPO_DEPDATA_FILENAME)
+
+
+def _basic_auth(consumer_id, repo_id):
+    return 'Basic ' + base64.b64encode('%s:%s' % (consumer_id, repo_id))
+
+
+def build_v1_repo(factory, name, version, repo_id):
+    request = factory.get('/pulp_puppet/forge/repository/%s/api/v1/releases.json' % repo_id,
+                          {'module': '%s/%s' % (AUTHOR, name)})
+    return ReleasesView.as_view(), request, (ReleasesView.REPO_RESOURCE, repo_id)
+
+
+def build_v1_consumer(factory, name, version, repo_id):
+    request = factory.get('/pulp_puppet/forge/consumer/%s/api/v1/releases.json' % CONSUMER_ID,
+                          {'module': '%s/%s' % (AUTHOR, name)})
+    return ReleasesView.as_view(), request, (ReleasesView.CONSUMER_RESOURCE, CONSUMER_ID)
+
+
+def build_v3_releases(factory, name, version, repo_id):
+    request = factory.get('/v3/releases', {'module': '%s-%s' % (AUTHOR, name)},
+                          HTTP_AUTHORIZATION=_basic_auth('.', repo_id))
+    return ReleasesPost36View.as_view(), request, ()
+
+
+def build_v3_release(factory, name, version, repo_id):
+    request = factory.get('/v3/releases/%s-%s-%s' % (AUTHOR, name, version),
+                          HTTP_AUTHORIZATION=_basic_auth('.', repo_id))
+    return ReleasesPost36View.as_view(), request, ()
+
+
+# request kind: function that builds the view, request and view arguments of a request
+REQUEST_BUILDERS = {
+    'v1_repo': build_v1_repo,
+    'v1_consumer': build_v1_consumer,
+    'v3_releases': build_v3_releases,
+    'v3_release': build_v3_release,
+}
+
+
+def build_requests(count, options, top_names, repo_ids, rng):
+    """
+    Build a random sequence of requests following the request mix. Requests are for the
+    modules of the top layer, which are the ones users ask for.
+
+    :return: list of (kind, view, request, view arguments) tuples
+    :rtype:  list
+    """
+    factory = RequestFactory()
+    kinds = []
+    for kind, weight in options.mix:
+        kinds.extend([kind] * weight)
+    ret = []
+    for i in range(count):
+        kind = rng.choice(kinds)
+        version = '1.%d.0' % rng.randrange(options.versions)
+        view, request, args = REQUEST_BUILDERS[kind](factory, rng.choice(top_names), version,
+                                                     rng.choice(repo_ids))
+        ret.append((kind, view, request, args))
+    return ret
+
+
+def percentile(values, fraction):
+    """
+    :param values:   sorted values
+    :type  values:   list
+    :param fraction: percentile as a fraction, such as 0.99
+    :type  fraction: float
+
+    :return: the nearest-rank percentile of the values
+    :rtype:  float
+    """
+    index = int(math.ceil(fraction * len(values))) - 1
+    return values[min(max(index, 0), len(values) - 1)]
+
+
+def run_requests(requests):
+    """
+    Make each request and measure it.
+
+    :param requests: requests as returned by build_requests
+    :type  requests: list
+
+    :return: latencies in seconds keyed by request kind, total wall clock seconds, and response
+             bytes keyed by request kind
+    :rtype:  tuple
+    """
+    latencies = {}
+    response_bytes = {}
+    start = time.time()
+    for kind, view, request, args in requests:
+        request_start = time.time()
+        response = view(request, *args)
+        latencies.setdefault(kind, []).append(time.time() - request_start)
+        if response.status_code != 200:
+            raise RuntimeError(_('%(kind)s request for %(path)s returned %(status)s') % {
+                'kind': kind, 'path': request.get_full_path(),
+                'status': response.status_code})
+        response_bytes[kind] = response_bytes.get(kind, 0) + len(response.content)
+    return latencies, time.time() - start, response_bytes
+
+
+def summarize(latencies, elapsed, response_bytes, memory):
+    """
+    :return: the results of a run, keyed by request kind and "all"
+    :rtype:  dict
+    """
+    results = {}
+    all_latencies = []
+    for kind, values in latencies.items() + [('all', None)]:
+        if values is None:
+            values = all_latencies
+            total_bytes = sum(response_bytes.values())
+        else:
+            all_latencies.extend(values)
+            total_bytes = response_bytes[kind]
+        values = sorted(values)
+        results[kind] = {
+            'requests': len(values),
+            'p50_ms': percentile(values, 0.5) * 1000,
+            'p99_ms': percentile(values, 0.99) * 1000,
+            'mean_bytes': total_bytes // len(values),
+        }
+    results['all']['throughput_rps'] = len(all_latencies) / elapsed
+    results['all'].update(memory)
+    return results
+
+
+def measure(requests):
+    """
+    Run the measured requests while tracking memory use.
+
+    :return: results as returned by summarize
+    :rtype:  dict
+    """
+    gc.collect()
+    objects_before = len(gc.get_objects())
+    if tracemalloc is not None:
+        tracemalloc.start()
+    latencies, elapsed, response_bytes = run_requests(requests)
+    memory = {'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+    if tracemalloc is not None:
+        memory['traced_peak_kb'] = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+    gc.collect()
+    memory['object_growth'] = len(gc.get_objects()) - objects_before
+    return summarize(latencies, elapsed, response_bytes, memory)
+
+
+def print_results(results, out=sys.stdout):
+    """
+    Print the results as a table.
+    """
+    out.write('%-12s %9s %10s %10s %11s\n' % ('kind', 'requests', 'p50 ms', 'p99 ms',
+                                              'mean bytes'))
+    for kind in sorted(results, key=lambda k: (k == 'all', k)):
+        data = results[kind]
+        out.write('%-12s %9d %10.3f %10.3f %11d\n' % (kind, data['requests'], data['p50_ms'],
+                                                      data['p99_ms'], data['mean_bytes']))
+    summary = results['all']
+    out.write('\nthroughput: %.1f requests/second\n' % summary['throughput_rps'])
+    out.write('max RSS: %d KiB\n' % summary['max_rss_kb'])
+    if 'traced_peak_kb' in summary:
+        out.write('traced allocation peak: %d KiB\n' % summary['traced_peak_kb'])
+    out.write('tracked object growth: %d\n' % summary['object_growth'])
+
+
+def main(argv=None):
+    """
+    Run the benchmark.
+
+    :param argv: command line arguments, without the program name; defaults to sys.argv
+    :type  argv: list
+
+    :return: the results, as returned by summarize
+    :rtype:  dict
+    """
+    options = parse_options(sys.argv[1:] if argv is None else argv)
+    rng = random.Random(options.seed)
+    working_dir = options.working_dir or tempfile.mkdtemp(prefix='forge-benchmark-')
+    try:
+        content_dir = os.path.join(working_dir, 'content')
+        os.makedirs(content_dir)
+        modules, top_names = generate_modules(content_dir, options, rng)
+
+        repo_ids = ['repo%d' % i for i in range(options.repos)]
+        publish_start = time.time()
+        repo_paths = dict((repo_id, {'path': publish(working_dir, repo_id, modules),
+                                     'protocol': 'http'})
+                          for repo_id in repo_ids)
+        sys.stdout.write('published %d repositories of %d module versions in %.2f seconds\n\n'
+                         % (len(repo_ids), len(modules), time.time() - publish_start))
+
+        def query_repo_paths(ids):
+            if ids is None:
+                return dict(repo_paths)
+            return dict((i, repo_paths[i]) for i in ids if i in repo_paths)
+
+        with mock.patch.object(releases, 'query_repo_paths', query_repo_paths):
+            with mock.patch.object(releases, 'get_bound_repos', lambda consumer_id: repo_ids):
+                if options.caches:
+                    releases.enable_caches(60, max(32, len(repo_ids)))
+                try:
+                    run_requests(build_requests(options.warm_up, options, top_names, repo_ids,
+                                                rng))
+                    results = measure(build_requests(options.requests, options, top_names,
+                                                     repo_ids, rng))
+                finally:
+                    releases.enable_caches(0, 0)
+    finally:
+        if not options.working_dir:
+            shutil.rmtree(working_dir)
+
+    print_results(results)
+    if options.json_path:
+        with open(options.json_path, 'w') as json_file:
+            json.dump(results, json_file, indent=2, sort_keys=True)
+    return results
+
+
+if __name__ == '__main__':
+    main()
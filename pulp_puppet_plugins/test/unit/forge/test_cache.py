@@ -0,0 +1,114 @@
+import gdbm
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from pulp_puppet.forge import cache
+
+
+class TestRepoPathIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.query = mock.MagicMock()
+        self.query.side_effect = lambda repo_ids: dict(
+            (repo_id, {'path': '/%s/.dependency_db' % repo_id, 'protocol': 'http'})
+            for repo_id in (repo_ids or ['repo1', 'repo2']))
+        self.index = cache.RepoPathIndex(self.query, 60)
+
+    def test_load(self):
+        self.index.load()
+
+        self.query.assert_called_once_with(None)
+        self.assertEqual(sorted(self.index.repos), ['repo1', 'repo2'])
+
+    def test_get_loads_once(self):
+        self.index.get(['repo1'])
+        result = self.index.get(['repo2'])
+
+        self.query.assert_called_once_with(None)
+        self.assertEqual(result, {'repo2': {'path': '/repo2/.dependency_db',
+                                            'protocol': 'http'}})
+
+    @mock.patch('time.time')
+    def test_get_reloads_when_expired(self, mock_time):
+        mock_time.return_value = 1000
+        self.index.get(['repo1'])
+        mock_time.return_value = 1061
+        self.index.get(['repo1'])
+
+        self.assertEqual(self.query.call_count, 2)
+
+    def test_get_queries_missing(self):
+        result = self.index.get(['repo1', 'repo3'])
+
+        self.query.assert_called_with(['repo3'])
+        self.assertEqual(sorted(result), ['repo1', 'repo3'])
+        self.assertTrue('repo3' in self.index.repos)
+
+
+class TestDatabaseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp(prefix='forge-cache-')
+        self.cache = cache.DatabaseCache(2)
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def _make_db(self, name, value):
+        path = os.path.join(self.working_dir, name)
+        db = gdbm.open(path, 'n')
+        db['me/mymodule'] = value
+        db.close()
+        return path
+
+    def test_open_reuses_database(self):
+        path = self._make_db('repo1', 'a')
+
+        db1 = self.cache.open(path)
+        db1.close()
+        db2 = self.cache.open(path)
+
+        self.assertTrue(db1 is db2)
+        self.assertEqual(db2['me/mymodule'], 'a')
+
+    @mock.patch.object(cache.metrics, 'count_cache_lookup', autospec=True)
+    def test_open_counts_hits(self, mock_count):
+        path = self._make_db('repo1', 'a')
+
+        self.cache.open(path)
+        self.cache.open(path)
+
+        self.assertEqual(mock_count.call_args_list, [mock.call('database', False),
+                                                     mock.call('database', True)])
+
+    def test_open_replaced_database(self):
+        path = self._make_db('repo1', 'a')
+        self.cache.open(path)
+
+        os.remove(path)
+        self._make_db('repo1', 'bb')
+        db = self.cache.open(path)
+
+        self.assertEqual(db['me/mymodule'], 'bb')
+        self.assertEqual(len(self.cache), 1)
+
+    def test_open_evicts_least_recently_used(self):
+        path1 = self._make_db('repo1', 'a')
+        path2 = self._make_db('repo2', 'a')
+        path3 = self._make_db('repo3', 'a')
+
+        self.cache.open(path1)
+        self.cache.open(path2)
+        self.cache.open(path1)
+        self.cache.open(path3)
+
+        self.assertTrue(path1 in self.cache)
+        self.assertFalse(path2 in self.cache)
+        self.assertTrue(path3 in self.cache)
+
+    def test_open_missing(self):
+        self.assertRaises(gdbm.error, self.cache.open, os.path.join(self.working_dir, 'nope'))
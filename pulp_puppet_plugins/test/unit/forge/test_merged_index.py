@@ -0,0 +1,118 @@
+import gdbm
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from pulp_puppet.forge import merged_index
+
+
+class MergedIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp(prefix='merged-index-')
+        self.index_dir = os.path.join(self.working_dir, 'index')
+        self.db_paths = {
+            'repo1': self._make_db('repo1', {
+                'me/a': [{'version': '1.0.0', 'file': '/a-1.0.0', 'dependencies': []}],
+            }),
+            'repo2': self._make_db('repo2', {
+                'me/a': [{'version': '2.0.0', 'file': '/a-2.0.0', 'dependencies': []}],
+                'me/b': [{'version': '1.0.0', 'file': '/b-1.0.0', 'dependencies': []}],
+            }),
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def _make_db(self, repo_id, contents):
+        path = os.path.join(self.working_dir, repo_id)
+        db = gdbm.open(path, 'n')
+        for key, value in contents.items():
+            db[key] = json.dumps(value)
+        db.close()
+        return path
+
+    def test_index_path_ignores_order(self):
+        path1 = merged_index.index_path('/tmp', ['repo1', 'repo2'])
+        path2 = merged_index.index_path('/tmp', ['repo2', 'repo1'])
+
+        self.assertEqual(path1, path2)
+        self.assertEqual(os.path.dirname(path1), '/tmp')
+
+    def test_index_path_differs_by_repos(self):
+        path1 = merged_index.index_path('/tmp', ['repo1', 'repo2'])
+        path2 = merged_index.index_path('/tmp', ['repo1', 'repo3'])
+
+        self.assertNotEqual(path1, path2)
+
+    def test_open_builds_index(self):
+        db = merged_index.open_index(self.index_dir, self.db_paths)
+        try:
+            entries = json.loads(db['me/a'])
+            self.assertEqual(sorted((e['repo_id'], e['version']) for e in entries),
+                             [('repo1', '1.0.0'), ('repo2', '2.0.0')])
+            entries = json.loads(db['me/b'])
+            self.assertEqual([e['repo_id'] for e in entries], ['repo2'])
+        finally:
+            db.close()
+
+        path = merged_index.index_path(self.index_dir, ['repo1', 'repo2'])
+        self.assertTrue(os.path.isfile(path))
+
+    def test_open_reuses_current_index(self):
+        merged_index.open_index(self.index_dir, self.db_paths).close()
+        path = merged_index.index_path(self.index_dir, ['repo1', 'repo2'])
+        inode = os.stat(path).st_ino
+
+        merged_index.open_index(self.index_dir, self.db_paths).close()
+
+        self.assertEqual(os.stat(path).st_ino, inode)
+
+    def test_open_rebuilds_after_republish(self):
+        merged_index.open_index(self.index_dir, self.db_paths).close()
+
+        os.remove(self.db_paths['repo1'])
+        self._make_db('repo1', {
+            'me/a': [{'version': '1.5.0', 'file': '/a-1.5.0', 'dependencies': []}],
+        })
+        db = merged_index.open_index(self.index_dir, self.db_paths)
+        try:
+            entries = json.loads(db['me/a'])
+            self.assertEqual(sorted(e['version'] for e in entries), ['1.5.0', '2.0.0'])
+        finally:
+            db.close()
+
+    def test_build_removes_stale_indexes(self):
+        merged_index.open_index(self.index_dir, {'repo1': self.db_paths['repo1']}).close()
+        merged_index.open_index(self.index_dir, {'repo2': self.db_paths['repo2']}).close()
+        stale_path = merged_index.index_path(self.index_dir, ['repo1'])
+        other_path = merged_index.index_path(self.index_dir, ['repo2'])
+
+        os.remove(self.db_paths['repo1'])
+        self._make_db('repo1', {
+            'me/a': [{'version': '1.5.0', 'file': '/a-1.5.0', 'dependencies': []}],
+        })
+        merged_index.open_index(self.index_dir, self.db_paths).close()
+
+        self.assertFalse(os.path.exists(stale_path))
+        self.assertTrue(os.path.exists(other_path))
+        self.assertTrue(os.path.exists(merged_index.index_path(self.index_dir,
+                                                               ['repo1', 'repo2'])))
+
+    def test_open_skips_missing_repo(self):
+        self.db_paths['repo3'] = os.path.join(self.working_dir, 'repo3')
+
+        db = merged_index.open_index(self.index_dir, self.db_paths)
+        try:
+            self.assertEqual(sorted(json.loads(db[merged_index.SOURCES_KEY])),
+                             ['repo1', 'repo2'])
+        finally:
+            db.close()
+
+    def test_open_nothing_published(self):
+        db_paths = {'repo3': os.path.join(self.working_dir, 'repo3')}
+
+        self.assertTrue(merged_index.open_index(self.index_dir, db_paths) is None)
+        self.assertFalse(os.path.exists(self.index_dir))
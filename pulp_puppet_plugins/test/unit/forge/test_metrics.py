@@ -0,0 +1,141 @@
+import unittest
+
+import mock
+from django.http import HttpResponse, StreamingHttpResponse
+
+from pulp_puppet.forge import metrics
+
+
+class TestRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = metrics.Registry()
+
+    def test_render_empty(self):
+        self.assertEqual(self.registry.render(), '\n')
+
+    def test_render_counter(self):
+        self.registry.increment('pulp_puppet_forge_depdata_lookups_total', {'result': 'found'})
+        self.registry.increment('pulp_puppet_forge_depdata_lookups_total', {'result': 'found'}, 2)
+        self.registry.increment('pulp_puppet_forge_depdata_lookups_total', {'result': 'missing'})
+
+        lines = self.registry.render().splitlines()
+
+        self.assertEqual(lines[1], '# TYPE pulp_puppet_forge_depdata_lookups_total counter')
+        self.assertEqual(lines[2:], [
+            'pulp_puppet_forge_depdata_lookups_total{result="found"} 3',
+            'pulp_puppet_forge_depdata_lookups_total{result="missing"} 1',
+        ])
+
+    def test_render_summary(self):
+        self.registry.observe('pulp_puppet_forge_dependency_depth', 2)
+        self.registry.observe('pulp_puppet_forge_dependency_depth', 5)
+        self.registry.observe('pulp_puppet_forge_dependency_depth', 1)
+
+        lines = self.registry.render().splitlines()
+
+        self.assertTrue('# TYPE pulp_puppet_forge_dependency_depth summary' in lines)
+        self.assertTrue('pulp_puppet_forge_dependency_depth_count 3' in lines)
+        self.assertTrue('pulp_puppet_forge_dependency_depth_sum 8.0' in lines)
+        self.assertTrue('# TYPE pulp_puppet_forge_dependency_depth_max gauge' in lines)
+        self.assertTrue('pulp_puppet_forge_dependency_depth_max 5.0' in lines)
+
+    def test_label_escaping(self):
+        self.registry.increment('pulp_puppet_forge_cache_requests_total',
+                                {'cache': 'a"b\\c', 'result': 'hit'})
+
+        self.assertTrue('{cache="a\\"b\\\\c",result="hit"} 1' in self.registry.render())
+
+    def test_reset(self):
+        self.registry.increment('pulp_puppet_forge_depdata_lookups_total')
+        self.registry.reset()
+
+        self.assertEqual(self.registry.render(), '\n')
+
+
+class TestRecording(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(metrics, 'REGISTRY', metrics.Registry())
+        self.registry = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @mock.patch.object(metrics.time, 'time', autospec=True)
+    def test_timer(self, mock_time):
+        mock_time.side_effect = [10.0, 10.5]
+
+        with metrics.timer(metrics.PHASE_DB_OPEN):
+            pass
+
+        key = ('pulp_puppet_forge_phase_seconds', (('phase', 'db_open'),))
+        self.assertEqual(self.registry.summaries[key], [1, 0.5, 0.5])
+
+    @mock.patch.object(metrics.time, 'time', autospec=True)
+    def test_timer_nested(self, mock_time):
+        mock_time.side_effect = [10.0, 10.25, 10.75, 11.0]
+
+        with metrics.timer(metrics.PHASE_DEPENDENCIES):
+            with metrics.timer(metrics.PHASE_DEPDATA_FETCH):
+                pass
+
+        outer = ('pulp_puppet_forge_phase_seconds', (('phase', 'dependencies'),))
+        inner = ('pulp_puppet_forge_phase_seconds', (('phase', 'depdata_fetch'),))
+        self.assertEqual(self.registry.summaries[outer], [1, 0.5, 0.5])
+        self.assertEqual(self.registry.summaries[inner], [1, 0.5, 0.5])
+
+    @mock.patch.object(metrics.time, 'time', autospec=True)
+    def test_request_timer_includes_phases(self, mock_time):
+        mock_time.side_effect = [10.0, 10.25, 10.75, 11.0]
+
+        with metrics.timer(None, 'pulp_puppet_forge_request_seconds'):
+            with metrics.timer(metrics.PHASE_SEARCH):
+                pass
+
+        key = ('pulp_puppet_forge_request_seconds', ())
+        self.assertEqual(self.registry.summaries[key], [1, 1.0, 1.0])
+
+    def test_timer_records_failures(self):
+        def fail():
+            with metrics.timer(metrics.PHASE_DB_OPEN):
+                raise ValueError()
+
+        self.assertRaises(ValueError, fail)
+        key = ('pulp_puppet_forge_phase_seconds', (('phase', 'db_open'),))
+        self.assertEqual(self.registry.summaries[key][0], 1)
+
+    def test_count_cache_lookup(self):
+        metrics.count_cache_lookup('database', True)
+        metrics.count_cache_lookup('database', False, 3)
+        metrics.count_cache_lookup('database', False, 0)
+
+        self.assertEqual(self.registry.counters, {
+            ('pulp_puppet_forge_cache_requests_total', (('cache', 'database'),
+                                                        ('result', 'hit'))): 1,
+            ('pulp_puppet_forge_cache_requests_total', (('cache', 'database'),
+                                                        ('result', 'miss'))): 3,
+        })
+
+    def test_instrumented_view(self):
+        class FakeView(object):
+            @metrics.instrumented_view
+            def get(self, request):
+                return HttpResponse('12345')
+
+        FakeView().get(mock.MagicMock())
+
+        labels = (('view', 'FakeView'),)
+        self.assertEqual(self.registry.summaries[('pulp_puppet_forge_response_bytes', labels)],
+                         [1, 5, 5])
+        self.assertEqual(
+            self.registry.summaries[('pulp_puppet_forge_request_seconds', labels)][0], 1)
+
+    def test_instrumented_view_streaming(self):
+        class FakeView(object):
+            @metrics.instrumented_view
+            def get(self, request):
+                return StreamingHttpResponse(iter(['12345']))
+
+        FakeView().get(mock.MagicMock())
+
+        self.assertFalse(('pulp_puppet_forge_response_bytes', (('view', 'FakeView'),))
+                         in self.registry.summaries)
@@ -0,0 +1,66 @@
+import unittest
+
+import mock
+from django.http import HttpResponse
+
+from pulp_puppet.forge import modules, search
+
+
+def make_index(*entries):
+    return search.SearchIndex(search.build_index([
+        {'author': author, 'name': name, 'version': version, 'summary': '', 'tags': [],
+         'file': '/%s/%s-%s-%s.tar.gz' % (repo_id, author, name, version)}
+        for repo_id, author, name, version in entries
+    ]))
+
+
+class TestView(unittest.TestCase):
+
+    def test_unauthorized(self):
+        ret = modules.view('.', '.')
+
+        self.assertTrue(isinstance(ret, HttpResponse))
+        self.assertEqual(ret.status_code, 401)
+
+    @mock.patch.object(modules, 'get_search_indexes', autospec=True)
+    def test_repo(self, mock_indexes):
+        mock_indexes.return_value = [make_index(('repo1', 'foo', 'bar', '1.0.0'),
+                                                ('repo1', 'foo', 'baz', '1.0.0'))]
+
+        ret = modules.view('.', 'repo1', query='baz')
+
+        mock_indexes.assert_called_once_with(['repo1'])
+        self.assertEqual([m['name'] for m in ret], ['baz'])
+
+    @mock.patch.object(modules, 'get_search_indexes', autospec=True)
+    @mock.patch('pulp_puppet.forge.releases.get_bound_repos', autospec=True)
+    def test_consumer_newest_across_repos(self, mock_bound, mock_indexes):
+        mock_bound.return_value = ['repo1', 'repo2']
+        mock_indexes.return_value = [make_index(('repo1', 'foo', 'bar', '1.2.0'),
+                                                ('repo1', 'foo', 'qux', '1.0.0')),
+                                     make_index(('repo2', 'foo', 'bar', '1.10.0'))]
+
+        ret = modules.view('consumer1', '.', query='foo')
+
+        mock_indexes.assert_called_once_with(['repo1', 'repo2'])
+        self.assertEqual([(m['name'], m['version']) for m in ret],
+                         [('bar', '1.10.0'), ('qux', '1.0.0')])
+        self.assertEqual(ret[0]['file'], '/repo2/foo-bar-1.10.0.tar.gz')
+
+
+class TestGetSearchIndexes(unittest.TestCase):
+
+    @mock.patch.object(search, 'load_index', autospec=True)
+    @mock.patch('pulp_puppet.forge.releases.get_repo_paths', autospec=True)
+    def test_load(self, mock_paths, mock_load):
+        mock_paths.return_value = {
+            'repo1': {'path': '/var/www/repo1/.dependency_db', 'protocol': 'http'},
+            'repo2': {'path': '/var/www/repo2/.dependency_db', 'protocol': 'http'},
+        }
+        mock_load.side_effect = [mock.sentinel.index, IOError()]
+
+        ret = modules.get_search_indexes(['repo1', 'repo2'])
+
+        self.assertEqual(ret, [mock.sentinel.index])
+        self.assertEqual(mock_load.call_args_list, [mock.call('/var/www/repo1/.search_index'),
+                                                    mock.call('/var/www/repo2/.search_index')])
@@ -2,6 +2,7 @@
 
 import functools
 import gdbm
+import json
 import unittest
 
 import mock
@@ -66,6 +67,20 @@ class TestUnitGenerator(unittest.TestCase):
         results = list(releases.unit_generator(dbs, 'foo', 'host'))
         self.assertEquals(0, len(results))
 
+    @mock.patch.object(releases.metrics, 'count_depdata_lookup', autospec=True)
+    @mock.patch('pulp_puppet.forge.releases.json.loads', autospec=True)
+    def test_counts_lookups(self, mock_load, mock_count):
+        dbs = {
+            'repo1': {'db': {}, 'protocol': 'http'},
+            'repo2': {'db': {'foo': True}, 'protocol': 'http'},
+        }
+        mock_load.return_value = [UNIT_DICT_FROM_DB]
+
+        list(releases.unit_generator(dbs, 'foo', 'host'))
+
+        self.assertEqual(sorted(mock_count.call_args_list),
+                         [mock.call(False), mock.call(True)])
+
     @mock.patch('pulp_puppet.forge.releases.json.loads', autospec=True)
     def test_two_modules_in_one_db(self, mock_load):
         dbs = {
@@ -246,6 +261,114 @@ class TestView(unittest.TestCase):
         self.assertEquals('3.0.0', result['me/mymodule'][0]['version'])
 
 
+class TestMergedUnitGenerator(unittest.TestCase):
+
+    def test_units_from_several_repos(self):
+        entries = [dict(UNIT_DICT_FROM_DB, repo_id='repo1'),
+                   dict(UNIT_DICT_FROM_DB, version='2.0.0', repo_id='repo2')]
+        dbs = {
+            'merged': {'db': {'foo': json.dumps(entries)},
+                       'protocols': {'repo1': 'http', 'repo2': 'https'}},
+        }
+
+        results = list(releases.merged_unit_generator(dbs, 'foo', 'host'))
+
+        self.assertEqual([(u.repo_id, u.protocol, u.version) for u in results],
+                         [('repo1', 'http', '1.0.0'), ('repo2', 'https', '2.0.0')])
+
+    def test_module_not_found(self):
+        dbs = {'merged': {'db': {}, 'protocols': {'repo1': 'http'}}}
+
+        results = list(releases.merged_unit_generator(dbs, 'foo', 'host'))
+
+        self.assertEqual(results, [])
+
+
+class TestViewMergedIndex(unittest.TestCase):
+
+    @mock.patch.object(releases, 'merged_unit_generator', autospec=True)
+    @mock.patch.object(releases, 'get_repo_data', autospec=True)
+    @mock.patch.object(releases, 'get_merged_repo_data', autospec=True)
+    @mock.patch.object(releases, 'get_bound_repos', autospec=True)
+    def test_consumer_uses_merged_index(self, mock_get_bounds, mock_get_merged, mock_get_data,
+                                        mock_merged_generator):
+        mock_get_bounds.return_value = ['apple', 'pear']
+        mock_get_merged.return_value = {
+            'merged': {'db': mock.MagicMock(), 'protocols': {'apple': 'http'}}
+        }
+        mock_merged_generator.return_value = [unit_generator()]
+
+        result = releases.view('consumer1', constants.FORGE_NULL_AUTH_VALUE, 'me/mymodule')
+
+        self.assertTrue('me/mymodule' in result)
+        mock_get_merged.assert_called_once_with(['apple', 'pear'])
+        self.assertEqual(mock_get_data.call_count, 0)
+        mock_get_merged.return_value['merged']['db'].close.assert_called_once_with()
+
+    @mock.patch.object(releases, 'unit_generator', autospec=True)
+    @mock.patch.object(releases, 'get_repo_data', autospec=True)
+    @mock.patch.object(releases, 'get_merged_repo_data', autospec=True)
+    @mock.patch.object(releases, 'get_bound_repos', autospec=True)
+    def test_consumer_without_merged_index(self, mock_get_bounds, mock_get_merged,
+                                           mock_get_data, mock_unit_generator):
+        mock_get_bounds.return_value = ['apple', 'pear']
+        mock_get_merged.return_value = None
+        mock_get_data.return_value = {'apple': {'db': mock.MagicMock(), 'protocol': 'http'}}
+        mock_unit_generator.return_value = [unit_generator()]
+
+        releases.view('consumer1', constants.FORGE_NULL_AUTH_VALUE, 'me/mymodule')
+
+        mock_get_data.assert_called_once_with(['apple', 'pear'])
+
+    @mock.patch.object(releases, 'unit_generator', autospec=True)
+    @mock.patch.object(releases, 'get_repo_data', autospec=True)
+    @mock.patch.object(releases, 'get_merged_repo_data', autospec=True)
+    def test_single_repo_skips_merged_index(self, mock_get_merged, mock_get_data,
+                                            mock_unit_generator):
+        mock_get_data.return_value = {'repo1': {'db': mock.MagicMock(), 'protocol': 'http'}}
+        mock_unit_generator.return_value = [unit_generator()]
+
+        releases.view(constants.FORGE_NULL_AUTH_VALUE, 'repo_foo', 'me/mymodule')
+
+        self.assertEqual(mock_get_merged.call_count, 0)
+
+
+class TestGetMergedRepoData(unittest.TestCase):
+
+    @mock.patch.object(releases, 'settings')
+    def test_disabled(self, mock_settings):
+        mock_settings.PULP_PUPPET_MERGED_INDEX_DIR = None
+
+        self.assertTrue(releases.get_merged_repo_data(['repo1', 'repo2']) is None)
+
+    @mock.patch('pulp_puppet.forge.merged_index.open_index', autospec=True)
+    @mock.patch.object(releases, 'get_repo_paths', autospec=True)
+    @mock.patch.object(releases, 'settings')
+    def test_enabled(self, mock_settings, mock_get_paths, mock_open_index):
+        mock_settings.PULP_PUPPET_MERGED_INDEX_DIR = '/var/cache/forge'
+        mock_get_paths.return_value = {
+            'repo1': {'path': '/a/repo1/.dependency_db', 'protocol': 'http'},
+            'repo2': {'path': '/a/repo2/.dependency_db', 'protocol': 'https'},
+        }
+
+        result = releases.get_merged_repo_data(['repo1', 'repo2'])
+
+        mock_open_index.assert_called_once_with('/var/cache/forge', {
+            'repo1': '/a/repo1/.dependency_db', 'repo2': '/a/repo2/.dependency_db'})
+        self.assertEqual(result.values(), [{'db': mock_open_index.return_value,
+                                            'protocols': {'repo1': 'http', 'repo2': 'https'}}])
+
+    @mock.patch('pulp_puppet.forge.merged_index.open_index', autospec=True)
+    @mock.patch.object(releases, 'get_repo_paths', autospec=True)
+    @mock.patch.object(releases, 'settings')
+    def test_open_error(self, mock_settings, mock_get_paths, mock_open_index):
+        mock_settings.PULP_PUPPET_MERGED_INDEX_DIR = '/var/cache/forge'
+        mock_get_paths.return_value = {}
+        mock_open_index.side_effect = OSError()
+
+        self.assertTrue(releases.get_merged_repo_data(['repo1', 'repo2']) is None)
+
+
 @mock.patch('pulp_puppet.forge.releases.model.Distributor.objects')
 class TestGetRepoData(unittest.TestCase):
 
@@ -284,6 +407,15 @@ class TestGetRepoData(unittest.TestCase):
         mock_open.assert_called_once_with(
             '/var/lib/pulp/published/puppet/foo/repo1/.dependency_db', 'r')
 
+    @mock.patch('gdbm.open', autospec=True)
+    def test_only_puppet_distributors(self, mock_open, mock_find):
+        mock_find.return_value = []
+
+        releases.get_repo_data(['repo1'])
+
+        mock_find.assert_called_once_with(distributor_type_id=constants.DISTRIBUTOR_TYPE_ID,
+                                          repo_id__in=['repo1'])
+
     @mock.patch('gdbm.open', autospec=True)
     def test_db_open_error(self, mock_open, mock_find):
         mock_find.return_value = [{'repo_id': 'repo1', 'config': {}}]
@@ -296,6 +428,44 @@ class TestGetRepoData(unittest.TestCase):
             '/var/lib/pulp/published/puppet/http/repos/repo1/.dependency_db', 'r')
 
 
+class TestCaches(unittest.TestCase):
+
+    def tearDown(self):
+        releases.enable_caches(0, 0)
+
+    def test_disabled_by_default(self):
+        self.assertTrue(releases.REPO_PATH_INDEX is None)
+        self.assertTrue(releases.DATABASE_CACHE is None)
+
+    @mock.patch.object(releases, 'query_repo_paths', autospec=True)
+    def test_get_repo_paths_uses_index(self, mock_query):
+        mock_query.return_value = {'repo1': {'path': '/repo1/.dependency_db',
+                                             'protocol': 'http'}}
+        releases.enable_caches(60, 0)
+
+        releases.get_repo_paths(['repo1'])
+        result = releases.get_repo_paths(['repo1'])
+
+        mock_query.assert_called_once_with(None)
+        self.assertEqual(result, mock_query.return_value)
+
+    @mock.patch('gdbm.open', autospec=True)
+    def test_open_database_without_cache(self, mock_open):
+        result = releases.open_database('/repo1/.dependency_db')
+
+        mock_open.assert_called_once_with('/repo1/.dependency_db', 'r')
+        self.assertEqual(result, mock_open.return_value)
+
+    def test_open_database_uses_cache(self):
+        releases.enable_caches(0, 4)
+        releases.DATABASE_CACHE = mock.MagicMock()
+
+        result = releases.open_database('/repo1/.dependency_db')
+
+        releases.DATABASE_CACHE.open.assert_called_once_with('/repo1/.dependency_db')
+        self.assertEqual(result, releases.DATABASE_CACHE.open.return_value)
+
+
 class TestGetProtocol(unittest.TestCase):
     def test_default(self):
         result = releases._get_protocol_from_distributor({'config': {}})
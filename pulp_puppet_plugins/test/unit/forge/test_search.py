@@ -0,0 +1,130 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from pulp_puppet.forge import search
+
+
+def make_module(author, name, version='1.0.0', summary='', tags=None):
+    return {'author': author, 'name': name, 'version': version, 'summary': summary,
+            'tags': tags or [], 'file': '/pulp/puppet/repo1/%s-%s-%s.tar.gz' % (
+                author, name, version)}
+
+
+MODULES = [
+    make_module('puppetlabs', 'stdlib', '4.1.0', 'Standard Library for Puppet Modules',
+                ['stdlib', 'functions']),
+    make_module('puppetlabs', 'stdlib', '4.10.0', 'Standard Library for Puppet Modules',
+                ['stdlib', 'functions']),
+    make_module('puppetlabs', 'apache', '1.0.0', 'Installs, configures, and manages Apache',
+                ['apache', 'web']),
+    make_module('example', 'nginx_proxy', '0.1.0', 'Proxy with nginx', ['web']),
+]
+
+
+class TestTokenize(unittest.TestCase):
+
+    def test_tokenize(self):
+        self.assertEqual(search.tokenize('Installs, configures nginx_proxy-2'),
+                         ['installs', 'configures', 'nginx', 'proxy', '2'])
+
+    def test_empty(self):
+        self.assertEqual(search.tokenize(None), [])
+
+
+class TestBuildIndex(unittest.TestCase):
+
+    def test_newest_version_only(self):
+        document = search.build_index(MODULES)
+
+        stdlib = [m for m in document['modules'] if m['name'] == 'stdlib']
+        self.assertEqual(len(stdlib), 1)
+        self.assertEqual(stdlib[0]['version'], '4.10.0')
+
+    def test_postings(self):
+        document = search.build_index(MODULES)
+
+        names = [m['name'] for m in document['modules']]
+        self.assertEqual(names, ['nginx_proxy', 'apache', 'stdlib'])
+        self.assertEqual(document['tokens']['puppetlabs'], [1, 2])
+        self.assertEqual(document['tokens']['proxy'], [0])
+        self.assertEqual(document['tags']['web'], [0, 1])
+
+    def test_invalid_version(self):
+        modules = [make_module('a', 'b', 'not-semver'), make_module('a', 'b', '0.0.1')]
+
+        document = search.build_index(modules)
+
+        self.assertEqual(document['modules'][0]['version'], '0.0.1')
+
+
+class TestSearchIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = search.SearchIndex(search.build_index(MODULES))
+
+    def names(self, results):
+        return [m['name'] for m in results]
+
+    def test_no_criteria(self):
+        self.assertEqual(self.names(self.index.search()), ['nginx_proxy', 'apache', 'stdlib'])
+
+    def test_prefix(self):
+        self.assertEqual(self.names(self.index.search('std')), ['stdlib'])
+
+    def test_all_tokens_must_match(self):
+        self.assertEqual(self.names(self.index.search('puppetlabs web')), ['apache'])
+        self.assertEqual(self.index.search('puppetlabs nginx'), [])
+
+    def test_summary(self):
+        self.assertEqual(self.names(self.index.search('CONFIGURES')), ['apache'])
+
+    def test_tags(self):
+        self.assertEqual(self.names(self.index.search(tags=['web'])), ['nginx_proxy', 'apache'])
+        self.assertEqual(self.names(self.index.search('example', tags=['web'])),
+                         ['nginx_proxy'])
+        self.assertEqual(self.index.search(tags=['web', 'functions']), [])
+
+    def test_no_match(self):
+        self.assertEqual(self.index.search('zzz'), [])
+
+
+class TestLoadIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp(prefix='search-index-')
+        self.path = os.path.join(self.working_dir, '.search_index')
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def test_load_reuses_index(self):
+        search.write_index(self.path, MODULES)
+
+        index = search.load_index(self.path)
+
+        self.assertTrue(search.load_index(self.path) is index)
+        self.assertEqual(len(index.modules), 3)
+
+    def test_reload_replaced_index(self):
+        search.write_index(self.path, MODULES)
+        index = search.load_index(self.path)
+
+        replacement = os.path.join(self.working_dir, 'replacement')
+        search.write_index(replacement, MODULES[:1])
+        os.rename(replacement, self.path)
+
+        reloaded = search.load_index(self.path)
+        self.assertFalse(reloaded is index)
+        self.assertEqual(len(reloaded.modules), 1)
+
+    def test_missing(self):
+        self.assertRaises(IOError, search.load_index, self.path)
+
+    def test_invalid(self):
+        with open(self.path, 'w') as index_file:
+            json.dump({'modules': []}, index_file)
+
+        self.assertRaises(ValueError, search.load_index, self.path)
@@ -4,6 +4,7 @@ import unittest
 
 import mock
 
+from pulp_puppet.forge import metrics
 from pulp_puppet.forge.unit import Unit
 
 
@@ -36,6 +37,18 @@ class TestUnitsFromJSON(unittest.TestCase):
         self.assertEqual(result[0].host, 'localhost')
         self.assertEqual(result[0].protocol, 'http')
 
+    def test_merged_index_filters_other_repos(self):
+        name = 'me/stuntmodule'
+        entries = json.loads(self.UNIT_JSON)
+        other = dict(entries[0], version='2.0.0', repo_id='repo2')
+        entries[0]['repo_id'] = 'repo1'
+        db = {name: json.dumps(entries + [other])}
+        result = Unit.units_from_json(name, db, 'repo1', 'localhost', 'http')
+
+        self.assertEqual(len(result), 1)
+        self.assertEqual(result[0].version, '1.2.0')
+        self.assertEqual(result[0].repo_id, 'repo1')
+
     def test_not_in_db(self):
         name = 'me/stuntmodule'
         db = {}
@@ -98,6 +111,19 @@ class TestAddDepToMetadata(unittest.TestCase):
         self.assertEqual(data['you/yourmodule'],
                          [unit_generator(name='you/yourmodule', dependencies=[]).to_dict()])
 
+    @mock.patch.object(metrics, 'observe', autospec=True)
+    @mock.patch.object(Unit, 'units_from_json', spec=unit_generator().units_from_json)
+    def test_records_depth(self, mock_units_from_json, mock_observe):
+        mock_units_from_json.side_effect = [
+            [unit_generator(name='you/yourmodule', dependencies=[{'name': 'foo/bar'}])],
+            [unit_generator(name='foo/bar', dependencies=[])]
+        ]
+        unit = unit_generator()
+
+        unit.build_dep_metadata()
+
+        mock_observe.assert_called_once_with('pulp_puppet_forge_dependency_depth', 2)
+
     def test_name_already_in_root(self):
         # it should do nothing in this case
         unit = unit_generator()
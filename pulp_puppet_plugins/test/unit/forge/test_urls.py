@@ -2,6 +2,8 @@ import unittest
 
 from django.core.urlresolvers import resolve, reverse, NoReverseMatch
 
+from pulp_puppet.forge.views.files import ModuleFileView
+
 
 def assert_url_match(expected_url, url_name, *args, **kwargs):
         """
@@ -73,3 +75,30 @@ class TestForgetUrls(unittest.TestCase):
         url = '/api/v1/releases.json'
         url_name = 'pre_33_releases'
         assert_url_match(url, url_name)
+
+    def test_match_module_file(self):
+        """
+        Test url matching for module files in the published tree.
+        """
+        match = resolve('/pulp/puppet/repo-id/system/releases/p/puppetlabs/'
+                        'puppetlabs-stdlib-3.2.0.tar.gz')
+        self.assertEqual(match.url_name, 'module_file')
+        self.assertEqual(match.func.__name__, ModuleFileView.__name__)
+        self.assertEqual(match.args, ('repo-id', 'system/releases/p/puppetlabs/'
+                                                 'puppetlabs-stdlib-3.2.0.tar.gz'))
+
+    def test_match_modules(self):
+        """
+        Test url matching for modules.
+        """
+        url = '/v3/modules'
+        url_name = 'modules'
+        assert_url_match(url, url_name)
+
+    def test_match_post_33_modules(self):
+        """
+        Test url matching for post_33_modules.
+        """
+        url = '/pulp_puppet/forge/repository/repo-id/v3/modules'
+        url_name = 'post_33_modules'
+        assert_url_match(url, url_name, 'repository', 'repo-id')
@@ -0,0 +1,76 @@
+import unittest
+
+import mock
+
+from pulp_puppet.forge import modules, releases, wsgi
+
+
+class TestWarmUp(unittest.TestCase):
+
+    def tearDown(self):
+        releases.enable_caches(0, 0)
+
+    @mock.patch.object(modules, 'get_search_indexes', autospec=True)
+    @mock.patch.object(releases, 'get_repo_data', autospec=True)
+    @mock.patch.object(releases, 'query_repo_paths', autospec=True)
+    @mock.patch.object(wsgi, 'settings')
+    def test_warm_up_all_repos(self, mock_settings, mock_query, mock_get_data, mock_indexes):
+        mock_settings.PULP_PUPPET_REPO_INDEX_TTL = 60
+        mock_settings.PULP_PUPPET_DATABASE_CACHE_SIZE = 2
+        mock_settings.PULP_PUPPET_WARM_REPOS = ()
+        mock_query.return_value = {
+            'repo1': {'path': '/repo1/.dependency_db', 'protocol': 'http'},
+            'repo2': {'path': '/repo2/.dependency_db', 'protocol': 'http'},
+            'repo3': {'path': '/repo3/.dependency_db', 'protocol': 'http'},
+        }
+
+        timings = wsgi.warm_up()
+
+        self.assertEqual(sorted(timings), ['dependency databases', 'import', 'repo index',
+                                           'search indexes'])
+        mock_query.assert_called_once_with(None)
+        mock_get_data.assert_called_once_with(['repo1', 'repo2'])
+        mock_indexes.assert_called_once_with(['repo1', 'repo2'])
+        self.assertEqual(releases.DATABASE_CACHE.size, 2)
+
+    @mock.patch.object(modules, 'get_search_indexes', autospec=True)
+    @mock.patch.object(releases, 'get_repo_data', autospec=True)
+    @mock.patch.object(releases, 'query_repo_paths', autospec=True)
+    @mock.patch.object(wsgi, 'settings')
+    def test_warm_up_configured_repos(self, mock_settings, mock_query, mock_get_data,
+                                      mock_indexes):
+        mock_settings.PULP_PUPPET_REPO_INDEX_TTL = 60
+        mock_settings.PULP_PUPPET_DATABASE_CACHE_SIZE = 32
+        mock_settings.PULP_PUPPET_WARM_REPOS = ('repo3', 'repo4')
+        mock_query.return_value = {
+            'repo1': {'path': '/repo1/.dependency_db', 'protocol': 'http'},
+            'repo3': {'path': '/repo3/.dependency_db', 'protocol': 'http'},
+        }
+
+        wsgi.warm_up()
+
+        mock_get_data.assert_called_once_with(['repo3', 'repo4'])
+
+    @mock.patch.object(releases, 'query_repo_paths', autospec=True)
+    @mock.patch.object(wsgi, 'settings')
+    def test_warm_up_disabled(self, mock_settings, mock_query):
+        mock_settings.PULP_PUPPET_REPO_INDEX_TTL = 0
+        mock_settings.PULP_PUPPET_DATABASE_CACHE_SIZE = 0
+
+        timings = wsgi.warm_up()
+
+        self.assertEqual(timings.keys(), ['import'])
+        self.assertTrue(releases.REPO_PATH_INDEX is None)
+        self.assertTrue(releases.DATABASE_CACHE is None)
+        self.assertEqual(mock_query.call_count, 0)
+
+    @mock.patch.object(releases, 'query_repo_paths', autospec=True)
+    @mock.patch.object(wsgi, 'settings')
+    def test_warm_up_phase_failure(self, mock_settings, mock_query):
+        mock_settings.PULP_PUPPET_REPO_INDEX_TTL = 60
+        mock_settings.PULP_PUPPET_DATABASE_CACHE_SIZE = 0
+        mock_query.side_effect = ValueError()
+
+        timings = wsgi.warm_up()
+
+        self.assertTrue('repo index' in timings)
@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+from django.test.client import RequestFactory
+
+from pulp_puppet.forge.views.files import ModuleFileView
+
+
+RELATIVE_PATH = 'system/releases/p/puppetlabs/puppetlabs-stdlib-3.2.0.tar.gz'
+
+
+class TestModuleFileView(unittest.TestCase):
+    """
+    Tests for ModuleFileView.
+    """
+
+    def setUp(self):
+        self.publish_dir = tempfile.mkdtemp(prefix='module-file-view-')
+        self.repo_dir = os.path.join(self.publish_dir, 'repo1')
+        os.makedirs(os.path.join(self.repo_dir, os.path.dirname(RELATIVE_PATH)))
+        with open(os.path.join(self.repo_dir, RELATIVE_PATH), 'w') as module_file:
+            module_file.write('tarball')
+
+        patcher = mock.patch('pulp_puppet.forge.releases.get_repo_paths', autospec=True)
+        self.mock_get_paths = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_get_paths.return_value = {
+            'repo1': {'path': os.path.join(self.repo_dir, '.dependency_db'), 'protocol': 'http'}
+        }
+        self.request = RequestFactory().get('/pulp/puppet/repo1/' + RELATIVE_PATH)
+
+    def tearDown(self):
+        shutil.rmtree(self.publish_dir)
+
+    @mock.patch('pulp_puppet.forge.views.files.settings')
+    def test_sendfile_header(self, mock_settings):
+        mock_settings.PULP_PUPPET_SENDFILE_HEADER = 'X-Sendfile'
+        mock_settings.PULP_PUPPET_SENDFILE_PREFIX = None
+
+        response = ModuleFileView().get(self.request, 'repo1', RELATIVE_PATH)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.repo_dir, RELATIVE_PATH))
+        self.assertEqual(response.content, '')
+        self.mock_get_paths.assert_called_once_with(['repo1'])
+
+    @mock.patch('pulp_puppet.forge.views.files.settings')
+    def test_accel_redirect_prefix(self, mock_settings):
+        mock_settings.PULP_PUPPET_SENDFILE_HEADER = 'X-Accel-Redirect'
+        mock_settings.PULP_PUPPET_SENDFILE_PREFIX = '/protected/'
+
+        response = ModuleFileView().get(self.request, 'repo1', RELATIVE_PATH)
+
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/repo1/' + RELATIVE_PATH)
+
+    @mock.patch('pulp_puppet.forge.views.files.settings')
+    def test_streamed_without_sendfile(self, mock_settings):
+        mock_settings.PULP_PUPPET_SENDFILE_HEADER = None
+
+        response = ModuleFileView().get(self.request, 'repo1', RELATIVE_PATH)
+
+        self.assertEqual(''.join(response.streaming_content), 'tarball')
+        self.assertEqual(response['Content-Length'], '7')
+
+    def test_unknown_repo(self):
+        self.mock_get_paths.return_value = {}
+
+        response = ModuleFileView().get(self.request, 'repo2', RELATIVE_PATH)
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_missing_file(self):
+        relative_path = RELATIVE_PATH.replace('3.2.0', '3.3.0')
+
+        response = ModuleFileView().get(self.request, 'repo1', relative_path)
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_path_outside_repo(self):
+        relative_path = 'system/releases/../../../repo2/' + RELATIVE_PATH
+
+        response = ModuleFileView().get(self.request, 'repo1', relative_path)
+
+        self.assertEqual(response.status_code, 404)
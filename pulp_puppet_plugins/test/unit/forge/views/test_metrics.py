@@ -0,0 +1,52 @@
+import unittest
+
+import mock
+from django.test.client import RequestFactory
+
+from pulp_puppet.forge import metrics
+from pulp_puppet.forge.views.metrics import MetricsView
+
+
+class TestMetricsView(unittest.TestCase):
+    """
+    Tests for MetricsView.
+    """
+
+    @mock.patch('pulp_puppet.forge.views.metrics.settings')
+    @mock.patch.object(metrics, 'REGISTRY', metrics.Registry())
+    def test_allowed(self, mock_settings):
+        mock_settings.PULP_PUPPET_METRICS_ADDRESSES = ('127.0.0.1', '::1')
+        metrics.increment('pulp_puppet_forge_depdata_lookups_total', {'result': 'found'})
+        request = RequestFactory().get('/pulp_puppet/forge/metrics', REMOTE_ADDR='127.0.0.1')
+
+        response = MetricsView().get(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertTrue('pulp_puppet_forge_depdata_lookups_total{result="found"} 1'
+                        in response.content)
+
+    def test_denied_by_default(self):
+        request = RequestFactory().get('/pulp_puppet/forge/metrics', REMOTE_ADDR='127.0.0.1')
+
+        response = MetricsView().get(request)
+
+        self.assertEqual(response.status_code, 404)
+
+    @mock.patch('pulp_puppet.forge.views.metrics.settings')
+    def test_remote(self, mock_settings):
+        mock_settings.PULP_PUPPET_METRICS_ADDRESSES = ('127.0.0.1', '::1')
+        request = RequestFactory().get('/pulp_puppet/forge/metrics', REMOTE_ADDR='10.0.0.1')
+
+        response = MetricsView().get(request)
+
+        self.assertEqual(response.status_code, 404)
+
+    @mock.patch('pulp_puppet.forge.views.metrics.settings')
+    def test_configured_addresses(self, mock_settings):
+        mock_settings.PULP_PUPPET_METRICS_ADDRESSES = ('10.0.0.1',)
+        request = RequestFactory().get('/pulp_puppet/forge/metrics', REMOTE_ADDR='10.0.0.1')
+
+        response = MetricsView().get(request)
+
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,86 @@
+import base64
+import json
+import unittest
+import urlparse
+
+import mock
+from django.test.client import RequestFactory
+
+from pulp_puppet.forge.views.modules import ModulesView
+
+
+def make_module(name):
+    return {'author': 'foo', 'name': name, 'version': '1.0.0', 'summary': 'the %s module' % name,
+            'tags': ['web'], 'file': '/pulp/puppet/repo1/foo-%s-1.0.0.tar.gz' % name}
+
+
+class TestModulesView(unittest.TestCase):
+    """
+    Tests for ModulesView.
+    """
+
+    @mock.patch('pulp_puppet.forge.modules.view', autospec=True)
+    def test_search(self, mock_view):
+        mock_view.return_value = [make_module('bar')]
+        request = RequestFactory().get('/v3/modules', {'query': 'bar', 'tag': ['web', 'x']})
+
+        response = ModulesView().get(request, resource_type='repository', resource='repo1')
+
+        self.assertEqual(response.status_code, 200)
+        mock_view.assert_called_once_with('.', 'repo1', query='bar', tags=['web', 'x'])
+        content = json.loads(response.content)
+        self.assertEqual(content['pagination']['total'], 1)
+        self.assertEqual(content['pagination']['next'], None)
+        self.assertEqual(content['results'], [{
+            'uri': '/v3/modules/foo-bar',
+            'slug': 'foo-bar',
+            'name': 'bar',
+            'owner': {'username': 'foo', 'slug': 'foo'},
+            'current_release': {
+                'version': '1.0.0',
+                'file_uri': '/pulp/puppet/repo1/foo-bar-1.0.0.tar.gz',
+                'metadata': {'name': 'foo-bar', 'version': '1.0.0', 'summary': 'the bar module',
+                             'tags': ['web']}
+            }
+        }])
+
+    @mock.patch('pulp_puppet.forge.modules.view', autospec=True)
+    def test_basic_auth(self, mock_view):
+        mock_view.return_value = []
+        request = RequestFactory().get('/v3/modules', {'query': 'bar'},
+                                       HTTP_AUTHORIZATION='Basic ' + base64.b64encode('c1:.'))
+
+        response = ModulesView().get(request)
+
+        self.assertEqual(response.status_code, 200)
+        mock_view.assert_called_once_with('c1', '.', query='bar', tags=[])
+
+    def test_missing_auth(self):
+        request = RequestFactory().get('/v3/modules', {'query': 'bar'})
+
+        response = ModulesView().get(request)
+
+        self.assertEqual(response.status_code, 401)
+
+    @mock.patch('pulp_puppet.forge.modules.view', autospec=True)
+    def test_pagination(self, mock_view):
+        mock_view.return_value = [make_module(str(i)) for i in range(5)]
+        request = RequestFactory().get('/v3/modules', {'limit': '2', 'offset': '2'})
+
+        response = ModulesView().get(request, resource_type='repository', resource='repo1')
+
+        content = json.loads(response.content)
+        self.assertEqual([m['name'] for m in content['results']], ['2', '3'])
+        self.assertEqual(content['pagination']['total'], 5)
+        next_query = urlparse.parse_qs(urlparse.urlparse(content['pagination']['next']).query)
+        self.assertEqual(next_query['offset'], ['4'])
+        previous_query = urlparse.parse_qs(
+            urlparse.urlparse(content['pagination']['previous']).query)
+        self.assertEqual(previous_query['offset'], ['0'])
+
+    def test_invalid_pagination(self):
+        request = RequestFactory().get('/v3/modules', {'limit': 'x'})
+
+        response = ModulesView().get(request, resource_type='repository', resource='repo1')
+
+        self.assertEqual(response.status_code, 400)
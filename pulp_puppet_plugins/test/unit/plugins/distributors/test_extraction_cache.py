@@ -0,0 +1,146 @@
+import errno
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import mock
+
+from pulp_puppet.plugins.distributors import extraction_cache
+
+
+def write_file(path, content='x'):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+class TestLinkTree(unittest.TestCase):
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.working_dir, 'source')
+        write_file(os.path.join(self.source, 'manifests', 'init.pp'), 'class foo {}')
+        write_file(os.path.join(self.source, 'metadata.json'), '{}')
+        os.symlink('manifests', os.path.join(self.source, 'link'))
+        self.destination = os.path.join(self.working_dir, 'destination')
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def test_hard_links(self):
+        size = extraction_cache.link_tree(self.source, self.destination)
+
+        self.assertEqual(size, len('class foo {}') + len('{}'))
+        path = os.path.join(self.destination, 'manifests', 'init.pp')
+        self.assertEqual(os.stat(path).st_ino,
+                         os.stat(os.path.join(self.source, 'manifests', 'init.pp')).st_ino)
+        self.assertEqual(os.readlink(os.path.join(self.destination, 'link')), 'manifests')
+
+    @mock.patch('os.link', side_effect=OSError(errno.EXDEV, 'cross-device link'))
+    def test_copies_across_filesystems(self, mock_link):
+        extraction_cache.link_tree(self.source, self.destination)
+
+        path = os.path.join(self.destination, 'manifests', 'init.pp')
+        self.assertEqual(open(path).read(), 'class foo {}')
+        self.assertEqual(os.stat(path).st_nlink, 1)
+
+    @mock.patch('os.link', side_effect=OSError(errno.EACCES, 'permission denied'))
+    def test_other_errors_raised(self, mock_link):
+        self.assertRaises(OSError, extraction_cache.link_tree, self.source, self.destination)
+
+
+class TestExtractionCache(unittest.TestCase):
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.cache = extraction_cache.ExtractionCache(os.path.join(self.working_dir, 'cache'),
+                                                      1024)
+        self.install_path = os.path.join(self.working_dir, 'install')
+        os.mkdir(self.install_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def _install(self, checksum, size=10):
+        module_dir = os.path.join(self.install_path, checksum)
+        write_file(os.path.join(module_dir, 'manifests', 'init.pp'), 'x' * size)
+        self.cache.add(checksum, module_dir)
+        return module_dir
+
+    def test_add_and_materialize(self):
+        self._install('abc')
+        destination = os.path.join(self.working_dir, 'other', 'stdlib')
+        os.mkdir(os.path.dirname(destination))
+
+        ret = self.cache.materialize('abc', destination)
+
+        self.assertTrue(ret)
+        path = os.path.join(destination, 'manifests', 'init.pp')
+        self.assertEqual(os.stat(path).st_nlink, 3)
+        self.assertEqual(open(os.path.join(self.cache.entry_path('abc'),
+                                           extraction_cache.SIZE_FILENAME)).read(), '10')
+
+    def test_materialize_missing(self):
+        destination = os.path.join(self.working_dir, 'stdlib')
+
+        self.assertFalse(self.cache.materialize('abc', destination))
+        self.assertFalse(os.path.exists(destination))
+
+    @mock.patch.object(extraction_cache, 'link_tree')
+    def test_materialize_failure_cleans_up(self, mock_link_tree):
+        os.makedirs(os.path.join(self.cache.entry_path('abc'), extraction_cache.TREE_DIRNAME))
+        destination = os.path.join(self.working_dir, 'stdlib')
+
+        def partial_link_tree(source, dest):
+            # as if the entry was evicted by another process half way through
+            os.mkdir(dest)
+            raise OSError(errno.ENOENT, 'No such file or directory')
+        mock_link_tree.side_effect = partial_link_tree
+
+        self.assertFalse(self.cache.materialize('abc', destination))
+        self.assertFalse(os.path.exists(destination))
+
+    def test_add_existing_entry(self):
+        self._install('abc')
+        module_dir = os.path.join(self.install_path, 'abc')
+
+        self.cache.add('abc', module_dir)
+
+        self.assertEqual(os.listdir(self.cache.path), ['abc'])
+
+    def test_evict_unreferenced_least_recently_used(self):
+        for checksum in ('old', 'new', 'used'):
+            shutil.rmtree(self._install(checksum, 400))
+        now = time.time()
+        os.utime(self.cache.entry_path('old'), (now - 300, now - 300))
+        os.utime(self.cache.entry_path('used'), (now - 200, now - 200))
+        os.utime(self.cache.entry_path('new'), (now - 100, now - 100))
+        # using an entry makes it the most recently used one
+        self.cache.materialize('used', os.path.join(self.install_path, 'used'))
+        shutil.rmtree(os.path.join(self.install_path, 'used'))
+
+        self.cache.evict()
+
+        self.assertEqual(sorted(os.listdir(self.cache.path)), ['new', 'used'])
+
+    def test_evict_keeps_referenced(self):
+        self._install('installed', 800)
+        shutil.rmtree(self._install('removed', 400))
+
+        self.cache.evict()
+
+        # the installed entry is the least recently used one, but it is still referenced
+        self.assertEqual(os.listdir(self.cache.path), ['installed'])
+
+    def test_evict_over_limit_with_only_referenced(self):
+        self._install('a', 800)
+        self._install('b', 800)
+
+        self.cache.evict()
+
+        self.assertEqual(sorted(os.listdir(self.cache.path)), ['a', 'b'])
+
+    def test_evict_missing_cache(self):
+        # does not raise
+        self.cache.evict()
@@ -103,6 +103,82 @@ class RemoveMissingTests(unittest.TestCase):
         self.assertTrue(constants.CONFIG_REMOVE_MISSING in msg)
 
 
+class RetainVersionsTests(unittest.TestCase):
+
+    def test_validate_retain_versions(self):
+        for value in (3, '3'):
+            config = PluginCallConfiguration({constants.CONFIG_RETAIN_VERSIONS: value}, {})
+            result, msg = configuration._validate_retain_versions(config)
+
+            self.assertTrue(result)
+            self.assertTrue(msg is None)
+
+    def test_validate_retain_versions_missing(self):
+        config = PluginCallConfiguration({}, {})
+        result, msg = configuration._validate_retain_versions(config)
+
+        self.assertTrue(result)
+        self.assertTrue(msg is None)
+
+    def test_validate_retain_versions_invalid(self):
+        for value in (0, '-1', 'foo', True, 2.5):
+            config = PluginCallConfiguration({constants.CONFIG_RETAIN_VERSIONS: value}, {})
+            result, msg = configuration._validate_retain_versions(config)
+
+            self.assertTrue(not result)
+            self.assertTrue(constants.CONFIG_RETAIN_VERSIONS in msg)
+
+
+class ModulePatternsTests(unittest.TestCase):
+
+    def test_validate_module_patterns(self):
+        config = PluginCallConfiguration({
+            constants.CONFIG_INCLUDE_MODULES: ['puppetlabs/*'],
+            constants.CONFIG_EXCLUDE_MODULES: ['regex:^puppetlabs/(ntp|java)$']}, {})
+        result, msg = configuration._validate_module_patterns(config)
+
+        self.assertTrue(result)
+        self.assertTrue(msg is None)
+
+    def test_validate_module_patterns_missing(self):
+        config = PluginCallConfiguration({}, {})
+        result, msg = configuration._validate_module_patterns(config)
+
+        self.assertTrue(result)
+        self.assertTrue(msg is None)
+
+    def test_validate_module_patterns_not_list(self):
+        config = PluginCallConfiguration({constants.CONFIG_EXCLUDE_MODULES: 'puppetlabs/*'}, {})
+        result, msg = configuration._validate_module_patterns(config)
+
+        self.assertTrue(not result)
+        self.assertTrue(constants.CONFIG_EXCLUDE_MODULES in msg)
+
+    def test_validate_module_patterns_invalid_regex(self):
+        config = PluginCallConfiguration({constants.CONFIG_INCLUDE_MODULES: ['regex:(']}, {})
+        result, msg = configuration._validate_module_patterns(config)
+
+        self.assertTrue(not result)
+        self.assertTrue(constants.CONFIG_INCLUDE_MODULES in msg)
+
+
+class UploadWorkersTests(unittest.TestCase):
+
+    def test_validate_upload_workers(self):
+        config = PluginCallConfiguration({constants.CONFIG_UPLOAD_WORKERS: 8}, {})
+        result, msg = configuration._validate_upload_workers(config)
+
+        self.assertTrue(result)
+        self.assertTrue(msg is None)
+
+    def test_validate_upload_workers_invalid(self):
+        config = PluginCallConfiguration({constants.CONFIG_UPLOAD_WORKERS: 0}, {})
+        result, msg = configuration._validate_upload_workers(config)
+
+        self.assertTrue(not result)
+        self.assertTrue(constants.CONFIG_UPLOAD_WORKERS in msg)
+
+
 class TestValidate(unittest.TestCase):
     """
     Tests for the validate() function.
@@ -2,26 +2,156 @@ import unittest
 
 import mock
 
+from pulp_puppet.common import constants
 from pulp_puppet.plugins.importers import copier
 
 
+@mock.patch('pulp_puppet.plugins.importers.copier.Module')
+@mock.patch('pulp_puppet.plugins.importers.copier.repo_controller')
+@mock.patch('pulp_puppet.plugins.importers.copier.RepositoryContentUnit')
 class CopierTests(unittest.TestCase):
 
-    def test_copy_units_only_specified(self):
-        # Setup
-        conduit = mock.MagicMock()
-        specified_units = ['a', 'b']
+    def setUp(self):
+        self.conduit = mock.MagicMock()
+        self.conduit.source_repo_id = 'source'
+        self.conduit.dest_repo_id = 'dest'
+        self.repo_unit_ids = {'source': ['a', 'b', 'c'], 'dest': ['b']}
 
-        # Test
-        copier.copy_units(conduit, specified_units)
+    def _mock_associations(self, mock_rcu):
+        def objects(repo_id, unit_type_id):
+            self.assertEqual(unit_type_id, constants.TYPE_PUPPET_MODULE)
+            queryset = mock.MagicMock()
+            queryset.values_list.return_value = self.repo_unit_ids[repo_id]
+            return queryset
+        mock_rcu.objects.side_effect = objects
+        mock_rcu.side_effect = lambda **kwargs: kwargs
 
-        # Verify
-        self.assertEqual(0, conduit.get_source_units.call_count)
+    def _inserted(self, mock_rcu):
+        return [[association['unit_id'] for association in call[0][0]]
+                for call in mock_rcu.objects.insert.call_args_list]
 
-        self.assertEqual(len(specified_units), conduit.associate_unit.call_count)
-        self._assert_associated_units(conduit, specified_units)
+    def test_copy_units_only_specified(self, mock_rcu, mock_repo_controller, mock_module):
+        self._mock_associations(mock_rcu)
+        specified_units = [mock.MagicMock(id='a'), mock.MagicMock(id='b')]
 
-    def _assert_associated_units(self, conduit, units):
-        all_call_args = conduit.associate_unit.call_args_list
-        for unit, call_args in zip(units, all_call_args):
-            self.assertEqual(call_args[0][0], unit)
+        copier.copy_units(self.conduit, specified_units)
+
+        self.assertEqual(self._inserted(mock_rcu), [['a']])
+        association = mock_rcu.objects.insert.call_args[0][0][0]
+        self.assertEqual(association['repo_id'], 'dest')
+        self.assertEqual(association['unit_type_id'], constants.TYPE_PUPPET_MODULE)
+        self.assertEqual(self.conduit.associate_unit.call_count, 0)
+        mock_repo_controller.update_last_unit_added.assert_called_once_with('dest')
+
+    def test_copy_all_units(self, mock_rcu, mock_repo_controller, mock_module):
+        self._mock_associations(mock_rcu)
+        mock_module.objects.return_value.only.return_value = ['unit a', 'unit c']
+
+        result = list(copier.copy_units(self.conduit, None))
+
+        self.assertEqual(self._inserted(mock_rcu), [['a', 'c']])
+        self.assertEqual(result, ['unit a', 'unit c'])
+        mock_module.objects.assert_called_once_with(id__in=['a', 'c'])
+        mock_module.objects.return_value.only.assert_called_once_with(
+            *mock_module.unit_key_fields)
+
+    @mock.patch('pulp_puppet.plugins.importers.copier.BATCH_SIZE', 2)
+    def test_batches(self, mock_rcu, mock_repo_controller, mock_module):
+        self._mock_associations(mock_rcu)
+        self.repo_unit_ids['source'] = ['a', 'b', 'c', 'd', 'e', 'a']
+
+        copier.copy_units(self.conduit, None)
+
+        self.assertEqual(self._inserted(mock_rcu), [['a', 'c'], ['d', 'e']])
+
+    def test_nothing_to_copy(self, mock_rcu, mock_repo_controller, mock_module):
+        self._mock_associations(mock_rcu)
+        self.repo_unit_ids['source'] = ['b']
+
+        result = list(copier.copy_units(self.conduit, None))
+
+        self.assertEqual(result, [])
+        self.assertEqual(mock_rcu.objects.insert.call_count, 0)
+        self.assertEqual(mock_repo_controller.update_last_unit_added.call_count, 0)
+        self.assertEqual(mock_module.objects.call_count, 0)
+
+
+class DependencyGraphTests(unittest.TestCase):
+
+    @mock.patch('pulp_puppet.plugins.importers.copier.Module')
+    @mock.patch('pulp_puppet.plugins.importers.copier.repo_unit_ids')
+    def setUp(self, mock_repo_unit_ids, mock_module):
+        mock_repo_unit_ids.return_value = []
+        self.graph = copier.DependencyGraph('source')
+        self.graph.add('stdlib-3', 'puppetlabs', 'stdlib', '3.2.0', [])
+        self.graph.add('stdlib-4', 'puppetlabs', 'stdlib', '4.1.0', [])
+        self.graph.add('concat-1', 'puppetlabs', 'concat', '1.0.0', [
+            {'name': 'puppetlabs/stdlib', 'version_requirement': '>= 3.0.0'}])
+        self.graph.add('apache-1', 'puppetlabs', 'apache', '1.0.0', [
+            {'name': 'puppetlabs-concat', 'version_requirement': '1.x'},
+            {'name': 'puppetlabs/stdlib', 'version_requirement': '>= 3.0.0 < 4.0.0'}])
+        self.graph.add('java-1', 'puppetlabs', 'java', '1.0.0', [
+            {'name': 'puppetlabs/stdlib'}, {'name': 'puppetlabs/missing'}])
+
+    @mock.patch('pulp_puppet.plugins.importers.copier.Module')
+    @mock.patch('pulp_puppet.plugins.importers.copier.repo_unit_ids')
+    def test_load(self, mock_repo_unit_ids, mock_module):
+        mock_repo_unit_ids.return_value = ['id1']
+        unit = mock.MagicMock(id='id1', author='puppetlabs', version='1.0.0',
+                              dependencies=[{'name': 'puppetlabs/stdlib'}])
+        unit.name = 'java'
+        mock_module.objects.return_value.only.return_value = [unit]
+
+        graph = copier.DependencyGraph('source')
+
+        mock_repo_unit_ids.assert_called_once_with('source')
+        mock_module.objects.assert_called_once_with(id__in=['id1'])
+        self.assertEqual(graph.releases, {'puppetlabs/java': [('1.0.0', 'id1')]})
+        self.assertEqual(graph.dependencies, {'id1': [('puppetlabs/stdlib', None)]})
+
+    def test_newest_satisfying_version(self):
+        self.assertEqual(self.graph.closure(['concat-1']), ['concat-1', 'stdlib-4'])
+
+    def test_transitive(self):
+        closure = self.graph.closure(['apache-1'])
+
+        self.assertEqual(closure, ['apache-1', 'concat-1', 'stdlib-3'])
+
+    def test_selected_release_reused(self):
+        closure = self.graph.closure(['stdlib-3', 'concat-1'])
+
+        self.assertEqual(closure, ['stdlib-3', 'concat-1'])
+
+    def test_unsatisfied_dependency_skipped(self):
+        self.assertEqual(self.graph.closure(['java-1']), ['java-1', 'stdlib-4'])
+
+
+@mock.patch('pulp_puppet.plugins.importers.copier.copied_units')
+@mock.patch('pulp_puppet.plugins.importers.copier.associate_unit_ids')
+@mock.patch('pulp_puppet.plugins.importers.copier.DependencyGraph')
+class RecursiveCopyTests(unittest.TestCase):
+
+    def setUp(self):
+        self.conduit = mock.MagicMock()
+        self.conduit.source_repo_id = 'source'
+        self.conduit.dest_repo_id = 'dest'
+
+    def test_recursive(self, mock_graph, mock_associate, mock_copied):
+        mock_graph.return_value.closure.return_value = ['a', 'b']
+        mock_associate.return_value = ['b']
+
+        result = copier.copy_units(self.conduit, [mock.MagicMock(id='a')], True)
+
+        mock_graph.assert_called_once_with('source')
+        mock_graph.return_value.closure.assert_called_once_with(['a'])
+        mock_associate.assert_called_once_with('dest', ['a', 'b'])
+        mock_copied.assert_called_once_with(['b'])
+        self.assertEqual(result, mock_copied.return_value)
+
+    def test_not_recursive(self, mock_graph, mock_associate, mock_copied):
+        mock_associate.return_value = []
+
+        copier.copy_units(self.conduit, [mock.MagicMock(id='a')])
+
+        self.assertEqual(mock_graph.call_count, 0)
+        self.assertEqual(list(mock_associate.call_args[0][1]), ['a'])
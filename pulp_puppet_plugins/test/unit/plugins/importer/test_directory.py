@@ -273,6 +273,56 @@ class TestSynchronizeWithDirectory(TestCase):
         self.assertTrue(method.report.update_progress.called)
         self.assertEqual(method.report.modules_state, constants.STATE_RUNNING)
 
+    @patch('pulp_puppet.plugins.importers.directory.SynchronizeWithDirectory._download')
+    def test_fetch_modules_patterns(self, mock_download):
+        feed_url = 'http://host/root/'
+        config = {constants.CONFIG_FEED: feed_url,
+                  constants.CONFIG_INCLUDE_MODULES: ['puppetlabs/*'],
+                  constants.CONFIG_EXCLUDE_MODULES: ['*/java']}
+        manifest = [('puppetlabs-apache-1.0.0.tar.gz', 'AA', 10),
+                    ('puppetlabs-java-1.0.0.tar.gz', 'BB', 20),
+                    ('example-php-1.0.0.tar.gz', 'CC', 30),
+                    ('unknown.tar.gz', 'DD', 40)]
+        mock_download.return_value = [], []
+
+        # test
+
+        method = SynchronizeWithDirectory(Mock(), Mock(), config)
+        method.report = Mock()
+        method.tmp_dir = '/tmp/puppet-testing'
+        method._fetch_modules(manifest)
+
+        # validation
+
+        urls = [url for url, destination in mock_download.call_args[0][0]]
+        self.assertEqual(urls, [urljoin(feed_url, manifest[0][0]),
+                                urljoin(feed_url, manifest[3][0])])
+        self.assertEqual(method.report.modules_total_count, 2)
+
+    @patch('pulp_puppet.plugins.importers.directory.SynchronizeWithDirectory._download')
+    def test_fetch_modules_retain_versions(self, mock_download):
+        feed_url = 'http://host/root/'
+        config = {constants.CONFIG_FEED: feed_url,
+                  constants.CONFIG_RETAIN_VERSIONS: 1}
+        manifest = [('puppetlabs-apache-1.0.0.tar.gz', 'AA', 10),
+                    ('puppetlabs-apache-1.1.0.tar.gz', 'BB', 20),
+                    ('example-php-1.0.0.tar.gz', 'CC', 30)]
+        mock_download.return_value = [], []
+
+        # test
+
+        method = SynchronizeWithDirectory(Mock(), Mock(), config)
+        method.report = Mock()
+        method.tmp_dir = '/tmp/puppet-testing'
+        method._fetch_modules(manifest)
+
+        # validation
+
+        urls = [url for url, destination in mock_download.call_args[0][0]]
+        self.assertEqual(urls, [urljoin(feed_url, manifest[1][0]),
+                                urljoin(feed_url, manifest[2][0])])
+        self.assertEqual(method.report.modules_total_count, 2)
+
     @patch('pulp_puppet.plugins.importers.directory.SynchronizeWithDirectory._download')
     def test_fetch_modules_failures(self, mock_download):
         tmp_dir = '/tmp/puppet-testing'
@@ -0,0 +1,74 @@
+import re
+import unittest
+
+from pulp.plugins.config import PluginCallConfiguration
+
+from pulp_puppet.common import constants
+from pulp_puppet.plugins.importers import filters
+
+
+class CompilePatternsTests(unittest.TestCase):
+
+    def test_glob_matches_whole_name(self):
+        pattern = filters.compile_patterns(['puppetlabs/*'])[0]
+
+        self.assertTrue(pattern.search('puppetlabs/apache'))
+        self.assertFalse(pattern.search('notpuppetlabs/apache'))
+
+    def test_regex_searched(self):
+        pattern = filters.compile_patterns(['regex:apache|nginx'])[0]
+
+        self.assertTrue(pattern.search('puppetlabs/apache'))
+        self.assertFalse(pattern.search('puppetlabs/stdlib'))
+
+    def test_invalid_regex(self):
+        self.assertRaises(re.error, filters.compile_patterns, ['regex:('])
+
+
+class FullNameFromFilenameTests(unittest.TestCase):
+
+    def test_full_name(self):
+        self.assertEqual(filters.full_name_from_filename('dir/puppetlabs-apache-1.0.0.tar.gz'),
+                         'puppetlabs/apache')
+        self.assertEqual(filters.full_name_from_filename('example-php_fpm-0.1.tgz'),
+                         'example/php_fpm')
+
+    def test_split_filename(self):
+        self.assertEqual(filters.split_filename('puppetlabs-stdlib-4.1.0-rc1.tar.gz'),
+                         ('puppetlabs', 'stdlib', '4.1.0-rc1'))
+
+    def test_full_name_prerelease(self):
+        self.assertEqual(filters.full_name_from_filename('puppetlabs-stdlib-4.1.0-rc1.tar.gz'),
+                         'puppetlabs/stdlib')
+
+    def test_unknown_format(self):
+        self.assertTrue(filters.full_name_from_filename('apache-1.0.0.tar.gz') is None)
+        self.assertTrue(filters.full_name_from_filename('puppetlabs-apache-1.0.0.zip') is None)
+
+
+class ModuleFilterTests(unittest.TestCase):
+
+    def test_no_patterns(self):
+        module_filter = filters.ModuleFilter.from_config(PluginCallConfiguration({}, {}))
+
+        self.assertFalse(module_filter.active)
+        self.assertTrue(module_filter.matches('puppetlabs', 'apache'))
+
+    def test_include_and_exclude(self):
+        config = PluginCallConfiguration({}, {
+            constants.CONFIG_INCLUDE_MODULES: ['puppetlabs/*', 'example/php'],
+            constants.CONFIG_EXCLUDE_MODULES: ['regex:^puppetlabs/(ntp|java)$']})
+        module_filter = filters.ModuleFilter.from_config(config)
+
+        self.assertTrue(module_filter.active)
+        self.assertTrue(module_filter.matches('puppetlabs', 'apache'))
+        self.assertTrue(module_filter.matches('example', 'php'))
+        self.assertFalse(module_filter.matches('example', 'mysql'))
+        self.assertFalse(module_filter.matches('puppetlabs', 'ntp'))
+
+    def test_matches_filename(self):
+        module_filter = filters.ModuleFilter(exclude=['*/apache'])
+
+        self.assertFalse(module_filter.matches_filename('puppetlabs-apache-1.0.0.tar.gz'))
+        self.assertTrue(module_filter.matches_filename('puppetlabs-stdlib-1.0.0.tar.gz'))
+        self.assertTrue(module_filter.matches_filename('apache.tar.gz'))
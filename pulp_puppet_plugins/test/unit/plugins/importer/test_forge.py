@@ -324,3 +324,37 @@ class TestSynchronizeWithPuppetForge(unittest.TestCase):
 
         # check that no units will be asked to be downloaded
         self.assertEqual([], units_to_download)
+
+    @mock.patch('pulp.plugins.loader.api.get_unit_model_by_id', return_value=Module)
+    @mock.patch('pulp.server.controllers.units.find_units')
+    def test__resolve_new_units_retain_versions(self, mock_find_units, mock_get_model):
+        """
+        Test that releases older than the newest ones to retain are not asked to be downloaded.
+        """
+        self.config.override_config[constants.CONFIG_RETAIN_VERSIONS] = 1
+        older = Module(author='a1', name='n1', version='0.9')
+        wanted = [unit.unit_key_as_named_tuple for unit in self.sample_units + [older]]
+        mock_find_units.return_value = []
+
+        units_to_download = self.method._resolve_new_units([], wanted)
+
+        self.assertEqual(sorted(units_to_download), sorted(wanted[:3]))
+
+    @mock.patch('pulp_puppet.plugins.importers.forge.SynchronizeWithPuppetForge._add_new_module')
+    @mock.patch('pulp_puppet.plugins.importers.forge.SynchronizeWithPuppetForge._resolve_new_units')
+    @mock.patch('pulp_puppet.plugins.importers.forge.SynchronizeWithPuppetForge._create_downloader')
+    @mock.patch('pulp.server.controllers.repository.find_repo_content_units', return_value=[])
+    def test_do_import_modules_patterns(self, mock_find, mock_create, mock_resolve, mock_add):
+        """
+        Test that modules the patterns exclude are not asked to be downloaded.
+        """
+        self.config.override_config[constants.CONFIG_EXCLUDE_MODULES] = ['a2/*']
+        metadata = mock.MagicMock(modules=self.sample_units)
+        mock_resolve.side_effect = lambda existing, wanted: wanted
+
+        self.method._do_import_modules(metadata)
+
+        wanted = mock_resolve.call_args[0][1]
+        self.assertEqual(sorted(wanted), sorted([self.sample_units[0].unit_key_as_named_tuple,
+                                                 self.sample_units[2].unit_key_as_named_tuple]))
+        self.assertEqual(mock_add.call_count, 2)
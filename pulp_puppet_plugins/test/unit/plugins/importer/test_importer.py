@@ -70,5 +70,53 @@ class TestPuppetModuleImporter(unittest.TestCase):
     def testUploadUnit(self, mock_handle_upload):
         module_importer = PuppetModuleImporter()
         mock_handle_upload.return_value = {'success_flag': True, 'summary': '', 'details': {}}
-        report = module_importer.upload_unit(Mock(), Mock(), Mock(), Mock(), Mock(), Mock(), Mock())
+        report = module_importer.upload_unit(Mock(), Mock(), Mock(), {}, Mock(), Mock(), Mock())
         self.assertTrue(report['success_flag'])
+
+    @patch('pulp_puppet.plugins.importers.upload.handle_uploaded_batch')
+    def test_upload_unit_batch(self, mock_handle_batch):
+        module_importer = PuppetModuleImporter()
+        repo = Mock()
+        config = Mock()
+        metadata = {constants.UPLOAD_BATCH_KEY: True}
+
+        report = module_importer.upload_unit(repo, constants.TYPE_PUPPET_MODULE, '', metadata,
+                                             '/tmp/modules.tar', Mock(), config)
+
+        mock_handle_batch.assert_called_once_with(repo, constants.TYPE_PUPPET_MODULE, metadata,
+                                                  '/tmp/modules.tar', config)
+        self.assertEqual(report, mock_handle_batch.return_value)
+
+    @patch('pulp_puppet.plugins.importers.copier.copy_units')
+    def test_import_units(self, mock_copy):
+        module_importer = PuppetModuleImporter()
+        conduit = Mock()
+        units = [Mock()]
+
+        result = module_importer.import_units(Mock(), Mock(), conduit, {}, units)
+
+        mock_copy.assert_called_once_with(conduit, units, constants.DEFAULT_RECURSIVE)
+        self.assertEqual(result, mock_copy.return_value)
+
+    @patch('pulp_puppet.plugins.importers.copier.copy_units')
+    def test_import_units_recursive(self, mock_copy):
+        module_importer = PuppetModuleImporter()
+        conduit = Mock()
+
+        module_importer.import_units(Mock(), Mock(), conduit, {constants.CONFIG_RECURSIVE: True})
+
+        mock_copy.assert_called_once_with(conduit, None, True)
+
+    @patch('pulp_puppet.plugins.importers.retention.prune')
+    @patch('pulp_puppet.plugins.importers.copier.copy_units')
+    def test_import_units_retain_versions(self, mock_copy, mock_prune):
+        module_importer = PuppetModuleImporter()
+        dest_repo = Mock()
+        mock_copy.return_value = iter([Mock(id='id1'), Mock(id='id2')])
+        mock_prune.return_value = ['id1']
+
+        result = module_importer.import_units(Mock(), dest_repo, Mock(),
+                                              {constants.CONFIG_RETAIN_VERSIONS: 2})
+
+        self.assertEqual([unit.id for unit in result], ['id2'])
+        mock_prune.assert_called_once_with(dest_repo.repo_obj, 2)
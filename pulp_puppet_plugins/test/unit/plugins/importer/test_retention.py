@@ -0,0 +1,80 @@
+import unittest
+
+import mock
+from pulp.plugins.config import PluginCallConfiguration
+
+from pulp_puppet.common import constants
+from pulp_puppet.plugins.db.models import Module
+from pulp_puppet.plugins.importers import retention
+
+
+class RetainedVersionsTests(unittest.TestCase):
+
+    def test_set(self):
+        config = PluginCallConfiguration({}, {constants.CONFIG_RETAIN_VERSIONS: '2'})
+
+        self.assertEqual(retention.retained_versions(config), 2)
+
+    def test_unset(self):
+        config = PluginCallConfiguration({}, {})
+
+        self.assertTrue(retention.retained_versions(config) is None)
+
+
+class NewestTests(unittest.TestCase):
+
+    def test_newest(self):
+        units = [Module(author='a', name='n', version='1.10.0'),
+                 Module(author='a', name='n', version='1.2.0'),
+                 Module(author='a', name='n', version='1.9.0'),
+                 Module(author='b', name='n', version='0.1.0')]
+
+        selected = retention.newest(units, 2)
+
+        self.assertEqual(sorted((unit.author, unit.version) for unit in selected),
+                         [('a', '1.10.0'), ('a', '1.9.0'), ('b', '0.1.0')])
+
+
+class NewestInManifestTests(unittest.TestCase):
+
+    def test_newest(self):
+        manifest = [('a-n-1.10.0.tar.gz', 'AA', 10),
+                    ('a-n-1.2.0.tar.gz', 'BB', 20),
+                    ('a-n-2.0.0-rc.1.tar.gz', 'CC', 30),
+                    ('b-n-0.1.0.tar.gz', 'DD', 40),
+                    ('unknown.tar.gz', 'EE', 50)]
+
+        selected = retention.newest_in_manifest(manifest, 2)
+
+        self.assertEqual(selected, [manifest[0], manifest[2], manifest[3], manifest[4]])
+
+
+@mock.patch('pulp_puppet.plugins.importers.retention.repo_controller')
+class PruneTests(unittest.TestCase):
+
+    def setUp(self):
+        self.repo_obj = mock.MagicMock(repo_id='repo1')
+        self.modules = [Module(author='a', name='n', version='1.0.0'),
+                        Module(author='a', name='n', version='2.0.0'),
+                        Module(author='a', name='n', version='3.0.0')]
+        for i, module in enumerate(self.modules):
+            module.id = 'id%d' % i
+
+    def test_prune(self, mock_repo_controller):
+        mock_repo_controller.find_repo_content_units.return_value = iter(self.modules)
+
+        removed = retention.prune(self.repo_obj, 2)
+
+        self.assertEqual(removed, ['id0'])
+        mock_repo_controller.find_repo_content_units.assert_called_once_with(
+            self.repo_obj, unit_fields=Module.unit_key_fields, yield_content_unit=True)
+        mock_repo_controller.disassociate_units.assert_called_once_with(
+            self.repo_obj, self.modules[:1])
+
+    def test_nothing_to_prune(self, mock_repo_controller):
+        mock_repo_controller.find_repo_content_units.return_value = iter(self.modules)
+
+        removed = retention.prune(self.repo_obj, 3)
+
+        self.assertEqual(removed, [])
+        self.assertEqual(mock_repo_controller.disassociate_units.call_count, 0)
@@ -1,5 +1,7 @@
+from contextlib import closing
 import os
 import shutil
+import tarfile
 import tempfile
 import unittest
 
@@ -8,6 +10,7 @@ from pulp.plugins.model import Repository
 from pulp.server.exceptions import PulpCodedException
 
 from pulp_puppet.common import constants
+from pulp_puppet.plugins.importers import metadata as metadata_parser
 from pulp_puppet.plugins.importers import upload
 
 DATA_DIR = os.path.abspath(os.path.dirname(__file__)) + '/../../../data'
@@ -50,6 +53,7 @@ class UploadTests(unittest.TestCase):
         self.conduit.init_unit.return_value = initialized_unit
         mock_uploaded_module = mock_module.from_metadata.return_value
         mock_uploaded_module.puppet_standard_filename.return_value = self.filename
+        mock_module.objects.return_value = []
 
         # Test
         report = upload.handle_uploaded_unit(self.repo, constants.TYPE_PUPPET_MODULE, self.unit_key,
@@ -73,6 +77,7 @@ class UploadTests(unittest.TestCase):
         self.conduit.init_unit.return_value = initialized_unit
         mock_uploaded_module = mock_module.from_metadata.return_value
         mock_uploaded_module.puppet_standard_filename.return_value = self.filename
+        mock_module.objects.return_value = []
 
         # Test
         report = upload.handle_uploaded_unit(self.repo, constants.TYPE_PUPPET_MODULE, {},
@@ -82,14 +87,128 @@ class UploadTests(unittest.TestCase):
 
         self.assertTrue(report['success_flag'])
 
+    @mock.patch(MODULE_STRING + '.Module')
+    @mock.patch(MODULE_STRING + '.repo_controller')
+    @mock.patch('pulp_puppet.plugins.importers.metadata.extract_metadata')
+    def test_handle_uploaded_unit_duplicate(self, mock_metadata, mock_repo_controller,
+                                            mock_module):
+        checksum = metadata_parser.calculate_checksum(self.source_file)
+        existing_module = mock.MagicMock(_storage_path=self.source_file, checksum=checksum)
+        mock_module.objects.return_value = [existing_module]
+
+        report = upload.handle_uploaded_unit(self.repo, constants.TYPE_PUPPET_MODULE,
+                                             self.unit_key, self.unit_metadata,
+                                             self.source_file, self.conduit)
+
+        self.assertTrue(report['success_flag'])
+        mock_module.objects.assert_called_once_with(checksum__in=[checksum],
+                                                    checksum_type=constants.DEFAULT_HASHLIB)
+        mock_repo_controller.associate_single_unit.assert_called_once_with(
+            self.repo.repo_obj, existing_module)
+        self.assertEqual(mock_metadata.call_count, 0)
+        self.assertEqual(mock_module.from_metadata.call_count, 0)
+
+    @mock.patch(MODULE_STRING + '.Module')
+    def test_find_modules_by_checksum_missing_file(self, mock_module):
+        mock_module.objects.return_value = [
+            mock.MagicMock(_storage_path='/no/such/file', checksum='abc'),
+            mock.MagicMock(_storage_path=None, checksum='abc')]
+
+        self.assertEqual(upload.find_modules_by_checksum(['abc']), {})
+
     def test_handle_uploaded_unit_bad_type(self):
         self.assertRaises(NotImplementedError, upload.handle_uploaded_unit, self.repo, 'foo',
                           None, None, None, None)
 
+    @mock.patch(MODULE_STRING + '.find_modules_by_checksum', return_value={})
     @mock.patch('pulp_puppet.plugins.importers.metadata.extract_metadata')
-    def test_handle_uploaded_unit_bad_name(self, mock_metadata):
+    def test_handle_uploaded_unit_bad_name(self, mock_metadata, mock_find):
         mock_metadata.return_value = {'name': 'bad_name'}
         self.assertRaises(PulpCodedException, upload.handle_uploaded_unit,
                           self.repo, constants.TYPE_PUPPET_MODULE,
                           self.unit_key, self.unit_metadata, self.source_file,
                           self.conduit)
+
+
+class BatchUploadTests(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp(prefix='puppet-batch-tests')
+        self.repo = Repository('test-repo', working_dir=self.working_dir)
+        self.module_dir = os.path.join(DATA_DIR, 'good-modules')
+        self.module_files = [
+            os.path.join(self.module_dir, 'jdob-valid', 'pkg', 'jdob-valid-1.0.0.tar.gz'),
+            os.path.join(self.module_dir, 'jdob-valid', 'pkg', 'jdob-valid-1.1.0.tar.gz'),
+        ]
+        self.archive = os.path.join(self.working_dir, 'modules.tar')
+        with closing(tarfile.open(self.archive, 'w')) as archive:
+            for module_file in self.module_files:
+                archive.add(module_file, arcname=os.path.basename(module_file))
+            archive.add(__file__, arcname='not-a-module.py')
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def test_extract_archive(self):
+        destination = tempfile.mkdtemp(dir=self.working_dir)
+
+        paths = upload.extract_archive(self.archive, destination)
+
+        self.assertEqual([os.path.basename(path) for path in paths],
+                         ['0-jdob-valid-1.0.0.tar.gz', '1-jdob-valid-1.1.0.tar.gz'])
+        for path, module_file in zip(paths, self.module_files):
+            self.assertEqual(metadata_parser.calculate_checksum(path),
+                             metadata_parser.calculate_checksum(module_file))
+
+    def test_extract_archive_invalid(self):
+        self.assertRaises(metadata_parser.InvalidTarball, upload.extract_archive,
+                          __file__, self.working_dir)
+
+    @mock.patch(MODULE_STRING + '.copier')
+    @mock.patch(MODULE_STRING + '._store_module')
+    @mock.patch(MODULE_STRING + '.find_modules_by_checksum')
+    def test_handle_uploaded_batch(self, mock_find, mock_store, mock_copier):
+        existing_checksum = metadata_parser.calculate_checksum(self.module_files[0])
+        mock_find.return_value = {existing_checksum: mock.MagicMock(id='existing')}
+        mock_store.side_effect = lambda module, path: mock.MagicMock(id='new')
+        mock_copier.associate_unit_ids.return_value = ['new']
+
+        report = upload.handle_uploaded_batch(
+            self.repo, constants.TYPE_PUPPET_MODULE, {constants.UPLOAD_BATCH_KEY: True},
+            self.archive, {constants.CONFIG_UPLOAD_WORKERS: 2})
+
+        self.assertTrue(report['success_flag'])
+        self.assertEqual(report['summary'],
+                         {'stored': 1, 'duplicates': 1, 'associated': 1, 'errors': 0})
+        self.assertEqual(mock_store.call_count, 1)
+        stored_module = mock_store.call_args[0][0]
+        self.assertEqual(stored_module.version, '1.1.0')
+        self.assertEqual(stored_module.checksum,
+                         metadata_parser.calculate_checksum(self.module_files[1]))
+        mock_copier.associate_unit_ids.assert_called_once_with('test-repo', ['existing', 'new'])
+        # the staging directory is removed
+        self.assertEqual(os.listdir(self.working_dir), ['modules.tar'])
+
+    @mock.patch(MODULE_STRING + '.copier')
+    @mock.patch(MODULE_STRING + '._store_module')
+    @mock.patch(MODULE_STRING + '.find_modules_by_checksum', return_value={})
+    def test_handle_uploaded_batch_errors(self, mock_find, mock_store, mock_copier):
+        with closing(tarfile.open(self.archive, 'w')) as archive:
+            archive.add(self.module_files[1], arcname=os.path.basename(self.module_files[1]))
+            archive.add(__file__, arcname='jdob-broken-1.0.0.tar.gz')
+        mock_store.side_effect = lambda module, path: mock.MagicMock(id='new')
+        mock_copier.associate_unit_ids.return_value = ['new']
+
+        report = upload.handle_uploaded_batch(
+            self.repo, constants.TYPE_PUPPET_MODULE, {constants.UPLOAD_BATCH_KEY: True},
+            self.archive, {})
+
+        self.assertFalse(report['success_flag'])
+        self.assertEqual(report['summary'],
+                         {'stored': 1, 'duplicates': 0, 'associated': 1, 'errors': 1})
+        self.assertEqual([error['file'] for error in report['details']['errors']],
+                         ['1-jdob-broken-1.0.0.tar.gz'])
+
+    def test_handle_uploaded_batch_bad_type(self):
+        self.assertRaises(NotImplementedError, upload.handle_uploaded_batch, self.repo, 'foo',
+                          {}, None, {})
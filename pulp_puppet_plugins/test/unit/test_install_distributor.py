@@ -1,4 +1,3 @@
-from cStringIO import StringIO
 import os
 import tarfile
 import unittest
@@ -14,7 +13,7 @@ from pulp.plugins.model import Repository, PublishReport
 
 from pulp_puppet.common import constants
 from pulp_puppet.plugins.db.models import Module
-from pulp_puppet.plugins.distributors import installdistributor
+from pulp_puppet.plugins.distributors import extraction_cache, installdistributor
 
 
 class TestEntryPoint(unittest.TestCase):
@@ -27,90 +26,90 @@ class TestEntryPoint(unittest.TestCase):
         self.assertEqual(config, {})
 
 
-@mock.patch('tarfile.TarInfo.fromtarfile')
-class TestNormalizingTarInfo(unittest.TestCase):
+class TestValidateConfig(unittest.TestCase):
     def setUp(self):
-        self.tarfile = mock.MagicMock()
-        self.tarinfo = tarfile.TarInfo(name='foo')
-        self.tarinfo.uid = 1000
-        self.tarinfo.gid = 1000
-        self.tarinfo.type = tarfile.REGTYPE
-
-    def test_resets_uid(self, mock_fromtarfile):
-        mock_fromtarfile.return_value = self.tarinfo
-
-        ret = installdistributor.NormalizingTarInfo.fromtarfile(self.tarfile)
+        self.distributor = installdistributor.PuppetModuleInstallDistributor()
+        self.repo = Repository('repo1', '', {})
 
-        self.assertEqual(ret.uid, 0)
+    def test_not_present(self):
+        config = PluginCallConfiguration({}, {})
 
-    def test_resets_gid(self, mock_fromtarfile):
-        mock_fromtarfile.return_value = self.tarinfo
+        result, message = self.distributor.validate_config(self.repo, config, [])
 
-        ret = installdistributor.NormalizingTarInfo.fromtarfile(self.tarfile)
+        self.assertFalse(result)
 
-        self.assertEqual(ret.gid, 0)
+    def test_relative_path(self):
+        config = PluginCallConfiguration({}, {constants.CONFIG_INSTALL_PATH: 'a/b/c'})
 
-    def test_adds_min_file_perms(self, mock_fromtarfile):
-        self.tarinfo.mode = 0
-        mock_fromtarfile.return_value = self.tarinfo
+        result, message = self.distributor.validate_config(self.repo, config, [])
 
-        ret = installdistributor.NormalizingTarInfo.fromtarfile(self.tarfile)
+        self.assertFalse(result)
+        self.assertTrue(len(message) > 0)
 
-        self.assertEqual(ret.mode, int('0644', base=8))
+    def test_with_permission(self):
+        config = PluginCallConfiguration({}, {constants.CONFIG_INSTALL_PATH: '/tmp'})
 
-    def test_preserve_extra_file_perms(self, mock_fromtarfile):
-        self.tarinfo.mode = int('0700', base=8)
-        mock_fromtarfile.return_value = self.tarinfo
+        result, message = self.distributor.validate_config(self.repo, config, [])
 
-        ret = installdistributor.NormalizingTarInfo.fromtarfile(self.tarfile)
+        self.assertTrue(result)
 
-        self.assertEqual(ret.mode, int('0744', base=8))
+    def test_extraction_cache(self):
+        config = PluginCallConfiguration({}, {
+            constants.CONFIG_INSTALL_PATH: '/tmp',
+            constants.CONFIG_EXTRACTION_CACHE_DIR: '/var/cache/pulp/puppet',
+            constants.CONFIG_EXTRACTION_CACHE_MAX_SIZE: '1000000'})
 
-    def test_adds_min_dir_perms(self, mock_fromtarfile):
-        self.tarinfo.mode = 0
-        self.tarinfo.type = tarfile.DIRTYPE
-        mock_fromtarfile.return_value = self.tarinfo
+        result, message = self.distributor.validate_config(self.repo, config, [])
 
-        ret = installdistributor.NormalizingTarInfo.fromtarfile(self.tarfile)
+        self.assertTrue(result)
 
-        self.assertEqual(ret.mode, int('0755', base=8))
+    def test_invalid_extraction_cache(self):
+        for key, value in ((constants.CONFIG_EXTRACTION_CACHE_DIR, 'cache'),
+                           (constants.CONFIG_EXTRACTION_CACHE_MAX_SIZE, '-1'),
+                           (constants.CONFIG_EXTRACTION_CACHE_MAX_SIZE, 'big')):
+            config = PluginCallConfiguration({}, {constants.CONFIG_INSTALL_PATH: '/tmp',
+                                                  key: value})
 
-    def test_preserve_extra_dir_perms(self, mock_fromtarfile):
-        self.tarinfo.mode = int('0770', base=8)
-        self.tarinfo.type = tarfile.DIRTYPE
-        mock_fromtarfile.return_value = self.tarinfo
+            result, message = self.distributor.validate_config(self.repo, config, [])
 
-        ret = installdistributor.NormalizingTarInfo.fromtarfile(self.tarfile)
+            self.assertFalse(result)
+            self.assertTrue(key in message)
 
-        self.assertEqual(ret.mode, int('0775', base=8))
+    def test_install_mode(self):
+        config = PluginCallConfiguration({}, {
+            constants.CONFIG_INSTALL_PATH: '/tmp',
+            constants.CONFIG_INSTALL_MODE: constants.INSTALL_MODE_SYMLINK})
 
+        result, message = self.distributor.validate_config(self.repo, config, [])
 
-class TestValidateConfig(unittest.TestCase):
-    def setUp(self):
-        self.distributor = installdistributor.PuppetModuleInstallDistributor()
-        self.repo = Repository('repo1', '', {})
+        self.assertTrue(result)
 
-    def test_not_present(self):
-        config = PluginCallConfiguration({}, {})
+    def test_invalid_install_mode(self):
+        config = PluginCallConfiguration({}, {constants.CONFIG_INSTALL_PATH: '/tmp',
+                                              constants.CONFIG_INSTALL_MODE: 'copy'})
 
         result, message = self.distributor.validate_config(self.repo, config, [])
 
         self.assertFalse(result)
+        self.assertTrue(constants.CONFIG_INSTALL_MODE in message)
 
-    def test_relative_path(self):
-        config = PluginCallConfiguration({}, {constants.CONFIG_INSTALL_PATH: 'a/b/c'})
+    def test_workers(self):
+        config = PluginCallConfiguration({}, {constants.CONFIG_INSTALL_PATH: '/tmp',
+                                              constants.CONFIG_INSTALL_WORKERS: '8'})
 
         result, message = self.distributor.validate_config(self.repo, config, [])
 
-        self.assertFalse(result)
-        self.assertTrue(len(message) > 0)
+        self.assertTrue(result)
 
-    def test_with_permission(self):
-        config = PluginCallConfiguration({}, {constants.CONFIG_INSTALL_PATH: '/tmp'})
+    def test_invalid_workers(self):
+        for workers in ('0', '-2', 'many'):
+            config = PluginCallConfiguration({}, {constants.CONFIG_INSTALL_PATH: '/tmp',
+                                                  constants.CONFIG_INSTALL_WORKERS: workers})
 
-        result, message = self.distributor.validate_config(self.repo, config, [])
+            result, message = self.distributor.validate_config(self.repo, config, [])
 
-        self.assertTrue(result)
+            self.assertFalse(result)
+            self.assertTrue(constants.CONFIG_INSTALL_WORKERS in message)
 
 
 class TestPublishRepo(unittest.TestCase):
@@ -138,19 +137,17 @@ class TestPublishRepo(unittest.TestCase):
                        '_move_to_destination_directory',
                        return_value=None)
     @mock.patch.object(installdistributor.PuppetModuleInstallDistributor,
-                       '_rename_directory',
+                       '_write_install_state',
                        return_value=None)
-    @mock.patch('tarfile.open', autospec=True)
     @mock.patch.object(installdistributor.PuppetModuleInstallDistributor,
-                       '_clear_destination_directory',
+                       '_extract_unit',
                        return_value=None)
     @mock.patch.object(installdistributor.PuppetModuleInstallDistributor,
-                       '_check_for_unsafe_archive_paths',
+                       '_clear_destination_directory',
                        return_value=None)
-    def test_workflow(self, mock_check_paths, mock_clear, mock_open, mock_rename,
-                      mock_move, mock_create_tmp_dir, mock_mkdir, mock_find_units):
+    def test_workflow(self, mock_clear, mock_extract, mock_write_state, mock_move,
+                      mock_create_tmp_dir, mock_mkdir, mock_find_units):
         config = PluginCallConfiguration({}, {constants.CONFIG_INSTALL_PATH: self.puppet_dir})
-        mock_open.return_value.getnames.return_value = ['a/b', 'a/c']
         mock_find_units.return_value = self.units
 
         report = self.distributor.publish_repo(self.repo, self.conduit, config)
@@ -165,20 +162,16 @@ class TestPublishRepo(unittest.TestCase):
         self.assertTrue(self.uk1 in report.details['success_unit_keys'])
         self.assertTrue(self.uk2 in report.details['success_unit_keys'])
 
-        self.assertEqual(mock_open.call_count, 2)
-        mock_open.assert_any_call(self.units[0]._storage_path,
-                                  tarinfo=installdistributor.NormalizingTarInfo)
-        mock_open.assert_any_call(self.units[1]._storage_path,
-                                  tarinfo=installdistributor.NormalizingTarInfo)
-
-        self.assertEqual(mock_rename.call_count, 2)
+        self.assertEqual(mock_extract.call_count, 2)
+        mock_extract.assert_any_call(self.units[0], mock_create_tmp_dir.return_value)
+        mock_extract.assert_any_call(self.units[1], mock_create_tmp_dir.return_value)
 
         mock_find_units.assert_called_once_with(self.repo.repo_obj, yield_content_unit=True)
         mock_mkdir.assert_called_once_with(self.puppet_dir)
-        mock_clear.assert_called_once_with(self.puppet_dir)
-        mock_check_paths.assert_called_once_with(self.units, self.puppet_dir)
+        mock_clear.assert_called_once_with(self.puppet_dir, set())
 
         self.assertEqual(mock_move.call_count, 1)
+        mock_write_state.assert_called_once_with(self.puppet_dir, self.units)
 
     @mock.patch('pulp.server.controllers.repository.find_repo_content_units', spec_set=True)
     @mock.patch.object(installdistributor, 'mkdir', return_value=None)
@@ -189,20 +182,18 @@ class TestPublishRepo(unittest.TestCase):
                        '_move_to_destination_directory',
                        return_value=None)
     @mock.patch.object(installdistributor.PuppetModuleInstallDistributor,
-                       '_rename_directory',
+                       '_write_install_state',
                        return_value=None)
-    @mock.patch('tarfile.open', autospec=True)
     @mock.patch.object(installdistributor.PuppetModuleInstallDistributor,
-                       '_clear_destination_directory',
+                       '_extract_unit',
                        return_value=None)
     @mock.patch.object(installdistributor.PuppetModuleInstallDistributor,
-                       '_check_for_unsafe_archive_paths',
+                       '_clear_destination_directory',
                        return_value=None)
-    def test_workflow_with_subdir(self, mock_check_paths, mock_clear, mock_open, mock_rename,
-                                  mock_move, mock_create_tmp_dir, mock_mkdir, mock_find_units):
+    def test_workflow_with_subdir(self, mock_clear, mock_extract, mock_write_state, mock_move,
+                                  mock_create_tmp_dir, mock_mkdir, mock_find_units):
         config = PluginCallConfiguration({}, {constants.CONFIG_INSTALL_PATH: self.puppet_dir,
                                               constants.CONFIG_SUBDIR: self.puppet_subdir})
-        mock_open.return_value.getnames.return_value = ['a/b', 'a/c']
         mock_find_units.return_value = self.units
 
         report = self.distributor.publish_repo(self.repo, self.conduit, config)
@@ -219,20 +210,16 @@ class TestPublishRepo(unittest.TestCase):
         self.assertTrue(self.uk1 in report.details['success_unit_keys'])
         self.assertTrue(self.uk2 in report.details['success_unit_keys'])
 
-        self.assertEqual(mock_open.call_count, 2)
-        mock_open.assert_any_call(self.units[0]._storage_path,
-                                  tarinfo=installdistributor.NormalizingTarInfo)
-        mock_open.assert_any_call(self.units[1]._storage_path,
-                                  tarinfo=installdistributor.NormalizingTarInfo)
-
-        self.assertEqual(mock_rename.call_count, 2)
+        self.assertEqual(mock_extract.call_count, 2)
+        mock_extract.assert_any_call(self.units[0], mock_create_tmp_dir.return_value)
+        mock_extract.assert_any_call(self.units[1], mock_create_tmp_dir.return_value)
 
         mock_find_units.assert_called_once_with(self.repo.repo_obj, yield_content_unit=True)
         mock_mkdir.assert_called_once_with(puppet_install_path)
-        mock_clear.assert_called_once_with(puppet_install_path)
-        mock_check_paths.assert_called_once_with(self.units, puppet_install_path)
+        mock_clear.assert_called_once_with(puppet_install_path, set())
 
         self.assertEqual(mock_move.call_count, 1)
+        mock_write_state.assert_called_once_with(puppet_install_path, self.units)
 
     def test_no_destination(self):
         """this one should fail very early since the destination is missing"""
@@ -261,14 +248,18 @@ class TestPublishRepo(unittest.TestCase):
         self.assertTrue(report.summary.find('duplicate') >= 0)
 
     @mock.patch.object(installdistributor.PuppetModuleInstallDistributor,
-                       '_archive_paths_are_safe',
-                       return_value=False)
+                       '_create_temporary_destination_directory',
+                       return_value=None)
+    @mock.patch.object(installdistributor, 'mkdir', return_value=None)
     @mock.patch('pulp.server.controllers.repository.find_repo_content_units', spec_set=True)
-    @mock.patch('tarfile.open', autospec=True)
+    @mock.patch.object(installdistributor.PuppetModuleInstallDistributor,
+                       '_extract_unit',
+                       side_effect=ValueError('unsafe path'))
     @mock.patch.object(installdistributor.PuppetModuleInstallDistributor,
                        '_clear_destination_directory',
                        return_value=None)
-    def test_unsafe_paths(self, mock_clear, mock_open, mock_find_units, mock_safe):
+    def test_unsafe_paths(self, mock_clear, mock_extract, mock_find_units, mock_mkdir,
+                          mock_create_tmp_dir):
         config = PluginCallConfiguration({}, {constants.CONFIG_INSTALL_PATH: self.puppet_dir})
         mock_find_units.return_value = self.units
 
@@ -279,8 +270,10 @@ class TestPublishRepo(unittest.TestCase):
         self.assertEqual(len(report.details['errors']), 2)
         self.assertTrue(report.details['errors'][0][0] in [self.uk1, self.uk2])
         self.assertTrue(report.details['errors'][1][0] in [self.uk1, self.uk2])
+        self.assertEqual(report.details['errors'][0][1], 'unsafe path')
         self.assertEqual(len(report.details['success_unit_keys']), 0)
-        self.assertTrue(mock_safe.call_count > 0)
+        # the live modules are left alone
+        self.assertFalse(mock_clear.called)
 
     @mock.patch.object(installdistributor.PuppetModuleInstallDistributor,
                        '_create_temporary_destination_directory',
@@ -298,6 +291,9 @@ class TestPublishRepo(unittest.TestCase):
         self.assertTrue(isinstance(report.summary, basestring))
         self.assertEqual(len(report.details['success_unit_keys']), 0)
 
+    @mock.patch.object(installdistributor.PuppetModuleInstallDistributor,
+                       '_write_install_state',
+                       return_value=None)
     @mock.patch.object(installdistributor.PuppetModuleInstallDistributor,
                        '_move_to_destination_directory',
                        return_value=None)
@@ -310,7 +306,7 @@ class TestPublishRepo(unittest.TestCase):
                        '_clear_destination_directory',
                        return_value=None)
     def test_no_units(self, mock_clear, mock_get_units, mock_mkdir, mock_create_tmp_dir,
-                      mock_move):
+                      mock_move, mock_write_state):
         config = PluginCallConfiguration({}, {constants.CONFIG_INSTALL_PATH: self.puppet_dir})
         mock_get_units.return_value = []
 
@@ -321,7 +317,7 @@ class TestPublishRepo(unittest.TestCase):
         self.assertEqual(len(report.details['success_unit_keys']), 0)
 
         # we still need to clear the destination
-        mock_clear.assert_called_once_with(self.puppet_dir)
+        mock_clear.assert_called_once_with(self.puppet_dir, set())
         mock_mkdir.assert_called_once_with(self.puppet_dir)
         mock_create_tmp_dir.assert_called_once_with(self.puppet_dir)
         mock_move.assert_called_once_with(mock_create_tmp_dir.return_value, self.puppet_dir)
@@ -331,14 +327,11 @@ class TestPublishRepo(unittest.TestCase):
                        return_value=None)
     @mock.patch.object(installdistributor, 'mkdir', return_value=None)
     @mock.patch('tarfile.open', autospec=True)
-    @mock.patch.object(installdistributor.PuppetModuleInstallDistributor,
-                       '_check_for_unsafe_archive_paths',
-                       return_value=None)
     @mock.patch.object(installdistributor.PuppetModuleInstallDistributor,
                        '_clear_destination_directory',
                        return_value=None)
     @mock.patch('pulp.server.controllers.repository.find_repo_content_units', spec_set=True)
-    def test_cannot_extract_tarballs(self, mock_find_units, mock_clear, mock_check, mock_open,
+    def test_cannot_extract_tarballs(self, mock_find_units, mock_clear, mock_open,
                                      mock_mkdir, mock_create_tmp_dir):
         config = PluginCallConfiguration({}, {constants.CONFIG_INSTALL_PATH: self.puppet_dir})
         mock_find_units.return_value = self.units
@@ -358,14 +351,11 @@ class TestPublishRepo(unittest.TestCase):
                        return_value=None)
     @mock.patch.object(installdistributor, 'mkdir', return_value=None)
     @mock.patch('tarfile.open', autospec=True)
-    @mock.patch.object(installdistributor.PuppetModuleInstallDistributor,
-                       '_check_for_unsafe_archive_paths',
-                       return_value=None)
     @mock.patch.object(installdistributor.PuppetModuleInstallDistributor,
                        '_clear_destination_directory',
                        return_value=None)
     @mock.patch('pulp.server.controllers.repository.find_repo_content_units', spec_set=True)
-    def test_cannot_clear_destination(self, mock_find_units, mock_clear, mock_check, mock_open,
+    def test_cannot_clear_destination(self, mock_find_units, mock_clear, mock_open,
                                       mock_mkdir, mock_create_tmp_dir):
         config = PluginCallConfiguration({}, {constants.CONFIG_INSTALL_PATH: self.puppet_dir})
         mock_find_units.return_value = []
@@ -376,7 +366,7 @@ class TestPublishRepo(unittest.TestCase):
         self.assertFalse(report.success_flag)
         self.assertTrue(isinstance(report.summary, basestring))
         self.assertEqual(len(report.details['success_unit_keys']), 0)
-        mock_clear.assert_called_once_with(self.puppet_dir)
+        mock_clear.assert_called_once_with(self.puppet_dir, set())
 
     @mock.patch.object(installdistributor.PuppetModuleInstallDistributor,
                        '_move_to_destination_directory',
@@ -386,14 +376,11 @@ class TestPublishRepo(unittest.TestCase):
                        return_value=None)
     @mock.patch.object(installdistributor, 'mkdir', return_value=None)
     @mock.patch('tarfile.open', autospec=True)
-    @mock.patch.object(installdistributor.PuppetModuleInstallDistributor,
-                       '_check_for_unsafe_archive_paths',
-                       return_value=None)
     @mock.patch.object(installdistributor.PuppetModuleInstallDistributor,
                        '_clear_destination_directory',
                        return_value=None)
     @mock.patch('pulp.server.controllers.repository.find_repo_content_units', spec_set=True)
-    def test_cannot_move_to_destination(self, mock_find_units, mock_clear, mock_check, mock_open,
+    def test_cannot_move_to_destination(self, mock_find_units, mock_clear, mock_open,
                                         mock_mkdir, mock_create_tmp_dir, mock_move):
         config = PluginCallConfiguration({}, {constants.CONFIG_INSTALL_PATH: self.puppet_dir})
         mock_find_units.return_value = []
@@ -406,6 +393,341 @@ class TestPublishRepo(unittest.TestCase):
         mock_move.assert_called_once_with(mock_create_tmp_dir.return_value, self.puppet_dir)
 
 
+class TestIncrementalPublish(unittest.TestCase):
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.install_path = os.path.join(self.working_dir, 'environment', 'modules')
+        self.distributor = installdistributor.PuppetModuleInstallDistributor()
+        self.repo = Repository('repo1', '', repo_obj=mock.MagicMock())
+        self.conduit = RepoPublishConduit('repo1', self.distributor.metadata()['id'])
+        self.config = PluginCallConfiguration({}, {
+            constants.CONFIG_INSTALL_PATH: self.install_path})
+        self.stdlib = self._make_unit('stdlib', '1.2.0')
+        self.java = self._make_unit('java', '1.3.1')
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def _make_unit(self, name, version):
+        top_dir = 'puppetlabs-%s-%s' % (name, version)
+        source = os.path.join(self.working_dir, 'source', top_dir)
+        touch(os.path.join(source, 'manifests', 'init.pp'))
+        path = os.path.join(self.working_dir, '%s.tar.gz' % top_dir)
+        archive = tarfile.open(path, 'w:gz')
+        archive.add(source, top_dir)
+        archive.close()
+        return Module(_storage_path=path, author='puppetlabs', name=name, version=version,
+                      checksum='%s-%s' % (name, version))
+
+    @mock.patch('pulp.server.controllers.repository.find_repo_content_units', spec_set=True)
+    def _publish(self, units, mock_find_units):
+        mock_find_units.return_value = units
+        self.distributor.detail_report = installdistributor.DetailReport()
+        return self.distributor.publish_repo(self.repo, self.conduit, self.config)
+
+    @mock.patch.object(installdistributor.PuppetModuleInstallDistributor, '_extract_unit',
+                       autospec=True)
+    def test_unchanged_modules_are_kept(self, mock_extract):
+        mock_extract.side_effect = installdistributor.PuppetModuleInstallDistributor._extract_unit
+        self._publish([self.stdlib, self.java])
+        java_dir = os.path.join(self.install_path, 'java')
+        touch(os.path.join(java_dir, 'marker'))
+        mock_extract.reset_mock()
+
+        java = self._make_unit('java', '1.4.0')
+        report = self._publish([self.stdlib, java])
+
+        self.assertTrue(report.success_flag)
+        self.assertEqual(len(report.details['success_unit_keys']), 2)
+        # only the module that changed is extracted and replaced
+        self.assertEqual(mock_extract.call_count, 1)
+        self.assertTrue(mock_extract.call_args[0][1] is java)
+        self.assertFalse(os.path.exists(os.path.join(java_dir, 'marker')))
+        self.assertEqual(self.distributor._read_install_state(self.install_path)['java'],
+                         {'author': 'puppetlabs', 'version': '1.4.0', 'checksum': 'java-1.4.0'})
+
+    def test_removed_modules_are_deleted(self):
+        self._publish([self.stdlib, self.java])
+
+        report = self._publish([self.stdlib])
+
+        self.assertTrue(report.success_flag)
+        self.assertEqual(sorted(os.listdir(self.install_path)),
+                         [constants.INSTALL_STATE_FILENAME, 'stdlib'])
+
+    def test_missing_directory_is_reinstalled(self):
+        self._publish([self.stdlib, self.java])
+        shutil.rmtree(os.path.join(self.install_path, 'java'))
+
+        report = self._publish([self.stdlib, self.java])
+
+        self.assertTrue(report.success_flag)
+        self.assertTrue(os.path.isdir(os.path.join(self.install_path, 'java', 'manifests')))
+
+
+class TestSymlinkPublish(TestIncrementalPublish):
+    """
+    Runs the incremental publish tests again in the symlink install mode.
+    """
+    def setUp(self):
+        super(TestSymlinkPublish, self).setUp()
+        self.config = PluginCallConfiguration({}, {
+            constants.CONFIG_INSTALL_PATH: self.install_path,
+            constants.CONFIG_INSTALL_MODE: constants.INSTALL_MODE_SYMLINK})
+        self.versions = os.path.join(self.working_dir, 'environment', '.modules-versions')
+
+    def test_symlink_to_version(self):
+        report = self._publish([self.stdlib])
+
+        self.assertTrue(report.success_flag)
+        self.assertTrue(os.path.islink(self.install_path))
+        version = os.path.realpath(self.install_path)
+        self.assertEqual(os.path.dirname(version), self.versions)
+        self.assertEqual(os.stat(version).st_mode & 0777, 0755)
+        self.assertEqual(os.listdir(self.versions), [os.path.basename(version)])
+
+    def test_unchanged_modules_are_linked(self):
+        self._publish([self.stdlib, self.java])
+        previous = os.path.realpath(self.install_path)
+        init_path = os.path.join(self.install_path, 'stdlib', 'manifests', 'init.pp')
+        inode = os.stat(init_path).st_ino
+
+        self._publish([self.stdlib, self._make_unit('java', '1.4.0')])
+
+        current = os.path.realpath(self.install_path)
+        self.assertNotEqual(current, previous)
+        self.assertEqual(os.stat(init_path).st_ino, inode)
+        # the previous version is kept for readers that resolved the symlink before the swap
+        self.assertTrue(os.path.isdir(previous))
+
+        self._publish([self.stdlib])
+
+        self.assertFalse(os.path.exists(previous))
+        self.assertTrue(os.path.isdir(current))
+        self.assertEqual(len(os.listdir(self.versions)), 2)
+
+    def test_trailing_slash(self):
+        self.config = PluginCallConfiguration({}, {
+            constants.CONFIG_INSTALL_PATH: self.install_path + '/',
+            constants.CONFIG_INSTALL_MODE: constants.INSTALL_MODE_SYMLINK})
+        self._publish([self.stdlib, self.java])
+        previous = os.path.realpath(self.install_path)
+
+        report = self._publish([self.stdlib, self._make_unit('java', '1.4.0')])
+
+        self.assertTrue(report.success_flag)
+        # the version that was current when the publish started is kept
+        self.assertTrue(os.path.isdir(previous))
+        self.assertTrue(os.path.isdir(os.path.join(self.install_path, 'stdlib', 'manifests')))
+
+    def test_switch_from_in_place(self):
+        symlink_config = self.config
+        self.config = PluginCallConfiguration({}, {
+            constants.CONFIG_INSTALL_PATH: self.install_path})
+        self._publish([self.stdlib])
+        self.config = symlink_config
+
+        report = self._publish([self.stdlib])
+
+        self.assertTrue(report.success_flag)
+        self.assertTrue(os.path.islink(self.install_path))
+        self.assertTrue(os.path.isdir(os.path.join(self.install_path, 'stdlib')))
+        current = os.path.basename(os.path.realpath(self.install_path))
+        names = os.listdir(self.versions)
+        names.remove(current)
+        previous = os.path.join(self.versions, names[0])
+        self.assertTrue(names[0].startswith('in-place-'))
+        self.assertEqual(sorted(os.listdir(previous)),
+                         [constants.INSTALL_STATE_FILENAME, 'stdlib'])
+
+
+class TestVersionCleanup(unittest.TestCase):
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.destination = os.path.join(self.working_dir, 'modules')
+        self.versions = os.path.join(self.working_dir, '.modules-versions')
+        self.distributor = installdistributor.PuppetModuleInstallDistributor()
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def test_remove_old_versions(self):
+        for name in ('a', 'b', 'c'):
+            os.makedirs(os.path.join(self.versions, name))
+        os.symlink(os.path.join('.modules-versions', 'c'), self.destination)
+
+        self.distributor._remove_old_versions(self.destination)
+
+        self.assertEqual(os.listdir(self.versions), ['c'])
+
+    def test_no_versions(self):
+        self.distributor._remove_old_versions(self.destination)
+
+        self.assertFalse(os.path.exists(self.versions))
+
+
+class TestInstallState(unittest.TestCase):
+    def setUp(self):
+        self.destination = tempfile.mkdtemp()
+        self.distributor = installdistributor.PuppetModuleInstallDistributor()
+        self.unit = Module(author='puppetlabs', name='stdlib', version='1.2.0', checksum='abc')
+
+    def tearDown(self):
+        shutil.rmtree(self.destination)
+
+    def test_round_trip(self):
+        self.distributor._write_install_state(self.destination, [self.unit])
+
+        installed = self.distributor._read_install_state(self.destination)
+
+        self.assertEqual(installed, {'stdlib': {'author': 'puppetlabs', 'version': '1.2.0',
+                                                'checksum': 'abc'}})
+        self.assertEqual(os.listdir(self.destination), [constants.INSTALL_STATE_FILENAME])
+
+    def test_missing(self):
+        self.assertTrue(self.distributor._read_install_state(self.destination) is None)
+
+    def test_invalid(self):
+        with open(os.path.join(self.destination, constants.INSTALL_STATE_FILENAME), 'w') as f:
+            f.write('not json')
+
+        self.assertTrue(self.distributor._read_install_state(self.destination) is None)
+
+    def test_remove(self):
+        self.distributor._write_install_state(self.destination, [self.unit])
+
+        self.distributor._remove_install_state(self.destination)
+        # removing a missing record is not an error
+        self.distributor._remove_install_state(self.destination)
+
+        self.assertEqual(os.listdir(self.destination), [])
+
+    def test_changed_units(self):
+        os.mkdir(os.path.join(self.destination, 'stdlib'))
+        installed = {'stdlib': {'author': 'puppetlabs', 'version': '1.2.0', 'checksum': 'abc'}}
+        upgraded = Module(author='puppetlabs', name='stdlib', version='1.3.0', checksum='def')
+
+        find = self.distributor._find_changed_units
+        self.assertEqual(find([self.unit], installed, self.destination), [])
+        self.assertEqual(find([upgraded], installed, self.destination), [upgraded])
+        self.assertEqual(find([self.unit], None, self.destination), [self.unit])
+        os.rmdir(os.path.join(self.destination, 'stdlib'))
+        self.assertEqual(find([self.unit], installed, self.destination), [self.unit])
+
+
+class TestExtractUnits(unittest.TestCase):
+    def setUp(self):
+        self.distributor = installdistributor.PuppetModuleInstallDistributor()
+        self.uk1 = {'author': 'puppetlabs', 'name': 'stdlib', 'version': '1.2.0'}
+        self.uk2 = {'author': 'puppetlabs', 'name': 'java', 'version': '1.3.1'}
+        self.units = [
+            Module(_storage_path='/a/b/x', **self.uk1),
+            Module(_storage_path='/a/b/y', **self.uk2)
+        ]
+
+    @mock.patch.object(installdistributor.PuppetModuleInstallDistributor, '_extract_unit')
+    def test_reports_each_unit(self, mock_extract):
+        mock_extract.side_effect = [None, IOError('corrupt tarball')]
+
+        # a single worker keeps the order of the side effects deterministic
+        self.distributor._extract_units(self.units, '/tmp/foo', 1)
+
+        report = self.distributor.detail_report.report
+        self.assertEqual(report['success_unit_keys'], [self.uk1])
+        self.assertEqual(report['errors'], [(self.uk2, 'corrupt tarball')])
+
+    @mock.patch.object(installdistributor, 'ThreadPool', autospec=True)
+    @mock.patch.object(installdistributor.PuppetModuleInstallDistributor, '_extract_unit')
+    def test_bounded_pool(self, mock_extract, mock_pool):
+        mock_pool.return_value.map.return_value = [None, None]
+
+        self.distributor._extract_units(self.units, '/tmp/foo', 8)
+
+        # never more threads than there are units
+        mock_pool.assert_called_once_with(2)
+        mock_pool.return_value.join.assert_called_once_with()
+        self.assertEqual(len(self.distributor.detail_report.report['success_unit_keys']), 2)
+
+
+class TestExtractUnit(unittest.TestCase):
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.destination = os.path.join(self.working_dir, 'destination')
+        os.mkdir(self.destination)
+        self.distributor = installdistributor.PuppetModuleInstallDistributor()
+        self.tarball_path = os.path.join(self.working_dir, 'puppetlabs-stdlib-1.2.0.tar.gz')
+        self.unit = Module(_storage_path=self.tarball_path, author='puppetlabs', name='stdlib',
+                           version='1.2.0')
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def _make_tarball(self, *top_dirs):
+        archive = tarfile.open(self.tarball_path, 'w:gz')
+        for top_dir in top_dirs:
+            path = os.path.join(self.working_dir, 'source', top_dir)
+            touch(os.path.join(path, 'manifests', 'init.pp'))
+            archive.add(path, top_dir)
+        archive.close()
+
+    def test_extracts_into_place(self):
+        self._make_tarball('puppetlabs-stdlib-1.2.0')
+
+        self.distributor._extract_unit(self.unit, self.destination)
+
+        self.assertEqual(os.listdir(self.destination), ['stdlib'])
+        self.assertTrue(os.path.isfile(os.path.join(self.destination, 'stdlib', 'manifests',
+                                                    'init.pp')))
+
+    def test_staging_removed_on_error(self):
+        self._make_tarball('puppetlabs-stdlib-1.2.0', 'puppetlabs-stdlib-extra')
+
+        self.assertRaises(ValueError, self.distributor._extract_unit, self.unit, self.destination)
+
+        self.assertEqual(os.listdir(self.destination), [])
+
+    def test_extraction_cache(self):
+        self._make_tarball('puppetlabs-stdlib-1.2.0')
+        self.unit.checksum = 'abc'
+        cache_dir = os.path.join(self.working_dir, 'cache')
+        self.distributor.extraction_cache = extraction_cache.ExtractionCache(cache_dir, 1024)
+
+        self.distributor._extract_unit(self.unit, self.destination)
+
+        installed = os.path.join(self.destination, 'stdlib', 'manifests', 'init.pp')
+        self.assertEqual(os.stat(installed).st_nlink, 2)
+        self.assertEqual(os.listdir(cache_dir), ['abc'])
+
+        # a cached module is linked from the cache without reading the tarball
+        os.remove(self.tarball_path)
+        other = os.path.join(self.working_dir, 'other')
+        os.mkdir(other)
+        self.distributor._extract_unit(self.unit, other)
+
+        self.assertEqual(os.stat(os.path.join(other, 'stdlib', 'manifests', 'init.pp')).st_ino,
+                         os.stat(installed).st_ino)
+
+    def test_unsafe_tarball(self):
+        self._make_tarball('puppetlabs-stdlib-1.2.0')
+        archive = tarfile.open(self.tarball_path, 'w:gz')
+        archive.add(os.path.join(self.working_dir, 'source', 'puppetlabs-stdlib-1.2.0'),
+                    'puppetlabs-stdlib-1.2.0')
+        archive.add(os.path.join(self.working_dir, 'source', 'puppetlabs-stdlib-1.2.0'),
+                    'puppetlabs-stdlib-1.2.0/../../escaped')
+        archive.close()
+
+        self.assertRaises(ValueError, self.distributor._extract_unit, self.unit, self.destination)
+
+        self.assertEqual(os.listdir(self.destination), [])
+        self.assertEqual(sorted(os.listdir(self.working_dir)),
+                         ['destination', 'puppetlabs-stdlib-1.2.0.tar.gz', 'source'])
+
+    def test_missing_tarball(self):
+        self.assertRaises(IOError, self.distributor._extract_unit, self.unit, self.destination)
+
+        self.assertEqual(os.listdir(self.destination), [])
+
+
 class TestMoveToDestinationDirectory(unittest.TestCase):
     def setUp(self):
         self.working_dir = tempfile.mkdtemp()
@@ -487,102 +809,6 @@ class TestRenameDirectory(unittest.TestCase):
         self.assertFalse(mock_move.called)
 
 
-class TestCheckForUnsafeArchivePaths(unittest.TestCase):
-    def setUp(self):
-        self.distributor = installdistributor.PuppetModuleInstallDistributor()
-        self.uk1 = {'author': 'puppetlabs', 'name': 'stdlib', 'version': '1.2.0'}
-        self.uk2 = {'author': 'puppetlabs', 'name': 'stdlib', 'version': '1.2.1'}
-        self.units = [
-            Module(_storage_path='/a/b/x', **self.uk1),
-            Module(_storage_path='/a/b/y', **self.uk2)
-        ]
-
-    def test_does_not_exist(self):
-        self.distributor._check_for_unsafe_archive_paths(self.units, '/foo/bar')
-
-        self.assertEqual(len(self.distributor.detail_report.report['errors']), 2)
-        self.assertTrue(self.distributor.detail_report.report['errors'][0][0] in [self.uk1,
-                                                                                  self.uk2])
-        self.assertTrue(isinstance(self.distributor.detail_report.report['errors'][0][1],
-                                   basestring))
-        self.assertTrue(self.distributor.detail_report.report['errors'][1][0] in [self.uk1,
-                                                                                  self.uk2])
-        self.assertTrue(isinstance(self.distributor.detail_report.report['errors'][1][1],
-                                   basestring))
-
-    @mock.patch('tarfile.open', autospec=True)
-    @mock.patch.object(installdistributor.PuppetModuleInstallDistributor, '_archive_paths_are_safe')
-    def test_safe(self, mock_archive_paths_are_safe, mock_open):
-        mock_archive_paths_are_safe.return_value = True
-
-        self.distributor._check_for_unsafe_archive_paths(self.units, '/foo/bar')
-
-        mock_archive_paths_are_safe.assert_any_call('/foo/bar', mock_open.return_value)
-        self.assertEqual(mock_archive_paths_are_safe.call_count, 2)
-        self.assertEqual(len(self.distributor.detail_report.report['errors']), 0)
-
-    @mock.patch('tarfile.open', autospec=True)
-    @mock.patch.object(installdistributor.PuppetModuleInstallDistributor, '_archive_paths_are_safe')
-    def test_unsafe(self, mock_archive_paths_are_safe, mock_open):
-        mock_archive_paths_are_safe.return_value = False
-
-        self.distributor._check_for_unsafe_archive_paths(self.units, '/foo/bar')
-
-        mock_archive_paths_are_safe.assert_any_call('/foo/bar', mock_open.return_value)
-        self.assertEqual(mock_archive_paths_are_safe.call_count, 2)
-        self.assertEqual(len(self.distributor.detail_report.report['errors']), 2)
-
-        self.assertEqual(mock_open.call_count, 2)
-        mock_open.assert_any_call('/a/b/x')
-        mock_open.assert_any_call('/a/b/y')
-
-
-class TestArchivePathsAreSafe(unittest.TestCase):
-    def setUp(self):
-        self.tarball = tarfile.TarFile(fileobj=StringIO(), mode='w')
-        self.tarball.getnames = mock.MagicMock(spec_set=self.tarball.getnames)
-
-    def test_safe_names(self):
-        self.tarball.getnames.return_value = [
-            'a/b/c',
-            'd/e/f',
-            'g/h/../i',
-            '/foo/a/b/',  # this is a terrible thing to have in a tarball, but just in case...
-        ]
-
-        ret = installdistributor.PuppetModuleInstallDistributor._archive_paths_are_safe(
-            '/foo', self.tarball)
-
-        self.assertTrue(ret)
-
-    def test_unsafe_relative_name(self):
-        self.tarball.getnames.return_value = [
-            'a/b/c',
-            'd/e/f',
-            '../i',
-        ]
-
-        ret = installdistributor.PuppetModuleInstallDistributor._archive_paths_are_safe(
-            '/foo', self.tarball)
-
-        self.assertFalse(ret)
-
-    def test_unsafe_absolute_name(self):
-        """
-        I'm not actually sure if this is possible with a tarball
-        """
-        self.tarball.getnames.return_value = [
-            'a/b/c',
-            'd/e/f',
-            '/i',
-        ]
-
-        ret = installdistributor.PuppetModuleInstallDistributor._archive_paths_are_safe(
-            '/foo', self.tarball)
-
-        self.assertFalse(ret)
-
-
 class TestClearDestinationDirectory(unittest.TestCase):
     def setUp(self):
         self.distributor = installdistributor.PuppetModuleInstallDistributor()
@@ -595,11 +821,21 @@ class TestClearDestinationDirectory(unittest.TestCase):
 
         # makes sure it only tries to remove the directories, and not any of the
         # regular files that appear within "destination"
-        self.assertEqual(mock_rmtree.call_count, 3)
+        self.assertEqual(mock_rmtree.call_count, 4)
+        mock_rmtree.assert_any_call(os.path.join(destination, 'benchmark'))
         mock_rmtree.assert_any_call(os.path.join(destination, 'data'))
         mock_rmtree.assert_any_call(os.path.join(destination, 'integration'))
         mock_rmtree.assert_any_call(os.path.join(destination, 'unit'))
 
+    @mock.patch('shutil.rmtree', autospec=True)
+    def test_keep(self, mock_rmtree):
+        destination = os.path.dirname(os.path.dirname(__file__))
+
+        self.distributor._clear_destination_directory(destination,
+                                                      set(['benchmark', 'data', 'integration']))
+
+        mock_rmtree.assert_called_once_with(os.path.join(destination, 'unit'))
+
 
 class TestCreateTemporaryDestinationDirectory(unittest.TestCase):
     def setUp(self):
@@ -688,6 +924,19 @@ class TestDistributorRemoved(unittest.TestCase):
         self.distributor.distributor_removed(self.repo, self.config)
         self.assertEqual(mock_error.call_count, 1)
 
+    def test_symlink(self):
+        working_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, working_dir)
+        path = os.path.join(working_dir, 'modules')
+        version = os.path.join(working_dir, '.modules-versions', '1')
+        os.makedirs(version)
+        os.symlink(version, path)
+        config = PluginCallConfiguration({}, {constants.CONFIG_INSTALL_PATH: path})
+
+        self.distributor.distributor_removed(self.repo, config)
+
+        self.assertEqual(os.listdir(working_dir), [])
+
     @mock.patch('shutil.rmtree', spec_set=True)
     def test_without_configured_path(self, mock_rmtree):
         self.distributor.distributor_removed(self.repo, PluginCallConfiguration({}, {}))
@@ -72,3 +72,142 @@ class TestUpdateUnits(unittest.TestCase):
         _units = profiler.update_units(None, units, options, None, None)
         self.assertEqual(units, _units)
         self.assertTrue(constants.FORGE_HOST in options)
+
+
+STDLIB_RELEASES = ('puppetlabs', 'stdlib',
+                   [{'version': '3.2.0', 'id': 'id1'}, {'version': '3.10.0', 'id': 'id2'}])
+MORE_STDLIB_RELEASES = ('puppetlabs', 'stdlib', [{'version': '3.9.0', 'id': 'id3'}])
+JAVA_RELEASES = ('puppetlabs', 'java', [{'version': '1.0.0', 'id': 'id4'}])
+
+
+class TestInstallWholeRepo(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.dict(wholerepo.WholeRepoProfiler._latest_versions, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.profiler = wholerepo.WholeRepoProfiler()
+        self.consumer = Consumer('consumer1', {})
+        self.options = {constants.REPO_ID_OPTION: 'repo1', constants.WHOLE_REPO_OPTION: True}
+
+    @mock.patch.object(wholerepo.WholeRepoProfiler, '_module_releases')
+    @mock.patch('pulp_puppet.plugins.profilers.wholerepo.Repository')
+    def test_names(self, mock_repo_model, mock_releases):
+        mock_repo_model.objects.only.return_value.get.return_value.repo_id = 'repo1'
+        mock_releases.return_value = [STDLIB_RELEASES, JAVA_RELEASES, MORE_STDLIB_RELEASES]
+
+        result = self.profiler.install_units(self.consumer, [], self.options, {}, None)
+
+        self.assertEqual(result, [
+            {'type_id': constants.TYPE_PUPPET_MODULE,
+             'unit_key': {'author': 'puppetlabs', 'name': 'java'}},
+            {'type_id': constants.TYPE_PUPPET_MODULE,
+             'unit_key': {'author': 'puppetlabs', 'name': 'stdlib'}},
+        ])
+        mock_repo_model.objects.only.return_value.get.assert_called_once_with(repo_id='repo1')
+        mock_releases.assert_called_once_with('repo1')
+
+    @mock.patch.object(wholerepo.WholeRepoProfiler, '_module_releases')
+    @mock.patch('pulp_puppet.plugins.profilers.wholerepo.Repository')
+    def test_pin_latest(self, mock_repo_model, mock_releases):
+        mock_releases.return_value = [STDLIB_RELEASES, JAVA_RELEASES, MORE_STDLIB_RELEASES]
+        self.options[constants.PIN_LATEST_OPTION] = True
+
+        result = self.profiler.install_units(self.consumer, [], self.options, {}, None)
+
+        self.assertEqual([unit['unit_key'] for unit in result], [
+            {'author': 'puppetlabs', 'name': 'java', 'version': '1.0.0'},
+            {'author': 'puppetlabs', 'name': 'stdlib', 'version': '3.10.0'},
+        ])
+
+    @mock.patch('pulp_puppet.plugins.profilers.wholerepo.Module')
+    @mock.patch('pulp_puppet.plugins.profilers.wholerepo.RepositoryContentUnit')
+    @mock.patch('pulp_puppet.plugins.profilers.wholerepo.UNIT_ID_BATCH_SIZE', 2)
+    def test_module_releases(self, mock_rcu, mock_module):
+        mock_rcu.objects.return_value.values_list.return_value = ['id1', 'id2', 'id3']
+        collection = mock_module._get_collection.return_value
+        collection.aggregate.side_effect = [
+            [{'_id': {'author': 'puppetlabs', 'name': 'stdlib'}, 'releases': STDLIB_RELEASES[2]}],
+            [{'_id': {'author': 'puppetlabs', 'name': 'stdlib'},
+              'releases': MORE_STDLIB_RELEASES[2]}],
+        ]
+
+        result = list(wholerepo.WholeRepoProfiler._module_releases('repo1'))
+
+        self.assertEqual(result, [STDLIB_RELEASES, MORE_STDLIB_RELEASES])
+        mock_rcu.objects.assert_called_once_with(repo_id='repo1',
+                                                 unit_type_id=constants.TYPE_PUPPET_MODULE)
+        self.assertEqual(collection.aggregate.call_count, 2)
+        pipeline = collection.aggregate.call_args_list[0][0][0]
+        self.assertEqual(pipeline[0], {'$match': {'_id': {'$in': ['id1', 'id2']}}})
+        self.assertEqual(pipeline[1]['$group']['_id'], {'author': '$author', 'name': '$name'})
+        pipeline = collection.aggregate.call_args_list[1][0][0]
+        self.assertEqual(pipeline[0], {'$match': {'_id': {'$in': ['id3']}}})
+
+
+@mock.patch.object(wholerepo.WholeRepoProfiler, '_module_releases')
+@mock.patch('pulp_puppet.plugins.profilers.wholerepo.Repository')
+class TestCalculateApplicableUnits(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.dict(wholerepo.WholeRepoProfiler._latest_versions, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.profiler = wholerepo.WholeRepoProfiler()
+        self.releases = [STDLIB_RELEASES, JAVA_RELEASES, MORE_STDLIB_RELEASES]
+        self.profile = {'puppetlabs/stdlib': '3.2.0', 'puppetlabs/java': '1.0.0',
+                        'puppetlabs/apache': '0.1.0'}
+
+    @staticmethod
+    def _repo(mock_repo_model, last_unit_added, last_unit_removed=None):
+        repo = mock_repo_model.objects.return_value.only.return_value.first.return_value
+        repo.last_unit_added = last_unit_added
+        repo.last_unit_removed = last_unit_removed
+        return repo
+
+    def test_newer_versions_applicable(self, mock_repo_model, mock_find):
+        self._repo(mock_repo_model, 1)
+        mock_find.return_value = self.releases
+
+        result = self.profiler.calculate_applicable_units(self.profile, 'repo1', {}, None)
+
+        self.assertEqual(result, {constants.TYPE_PUPPET_MODULE: ['id2']})
+        mock_repo_model.objects.assert_called_once_with(repo_id='repo1')
+
+    def test_dash_separated_names(self, mock_repo_model, mock_find):
+        self._repo(mock_repo_model, 1)
+        mock_find.return_value = self.releases
+
+        result = self.profiler.calculate_applicable_units({'puppetlabs-stdlib': '3.9.0'},
+                                                          'repo1', {}, None)
+
+        self.assertEqual(result, {constants.TYPE_PUPPET_MODULE: ['id2']})
+
+    def test_index_reused(self, mock_repo_model, mock_find):
+        self._repo(mock_repo_model, 1)
+        mock_find.return_value = self.releases
+
+        for i in range(3):
+            self.profiler.calculate_applicable_units(self.profile, 'repo1', {}, None)
+
+        self.assertEqual(mock_find.call_count, 1)
+
+    def test_index_rebuilt_after_content_change(self, mock_repo_model, mock_find):
+        self._repo(mock_repo_model, 1)
+        mock_find.return_value = self.releases
+        self.profiler.calculate_applicable_units(self.profile, 'repo1', {}, None)
+
+        self._repo(mock_repo_model, 1, 2)
+        mock_find.return_value = [JAVA_RELEASES, MORE_STDLIB_RELEASES]
+        result = self.profiler.calculate_applicable_units(self.profile, 'repo1', {}, None)
+
+        self.assertEqual(mock_find.call_count, 2)
+        self.assertEqual(result, {constants.TYPE_PUPPET_MODULE: ['id3']})
+
+    def test_missing_repo(self, mock_repo_model, mock_find):
+        mock_repo_model.objects.return_value.only.return_value.first.return_value = None
+
+        result = self.profiler.calculate_applicable_units(self.profile, 'repo1', {}, None)
+
+        self.assertEqual(result, {constants.TYPE_PUPPET_MODULE: []})
+        self.assertEqual(mock_find.call_count, 0)